@@ -1,14 +1,11 @@
 # -*- coding: utf-8 -*-
+"""The dash `app` and the `celery_app` are created on first access, so that the
+simulation modules, for example the batch fitting CLI, are importable without the web
+app or a REDIS_URL."""
 import datetime
 import os
+import threading
 
-import dash_bootstrap_components as dbc
-import dash_core_components as dcc
-import dash_html_components as html
-from celery import Celery
-from dash import Dash
-
-from .head import head_config
 from .utils import slogger
 
 __author__ = "Deepansh J. Srivastava"
@@ -19,27 +16,59 @@ now = datetime.datetime.now()
 year = now.year
 
 
-redis_url = os.environ["REDIS_URL"]
-slogger("tasks.py", f"declare celery_app: redis_url={redis_url}")
-celery_app = Celery("query", backend=redis_url, broker=redis_url)
-slogger("tasks.py", "celery_app declared successfully")
-
-
-# Initialize dash app
-app = Dash(
-    __name__,
-    title="Mrsimulator",
-    external_stylesheets=[dbc.themes.BOOTSTRAP],
-    suppress_callback_exceptions=True,
-    **head_config,
-)
-
-app.layout = html.Div(
-    [
-        dcc.Location(id="url", refresh=False),
-        html.Div(id="page-content"),
-        # html.Div(id="placeholder"),
-        html.A(id="url-search", href=""),
-    ],
-    className="main",
-)
+def create_celery_app():
+    """Return the celery app with the redis backend and broker at REDIS_URL."""
+    from celery import Celery
+
+    redis_url = os.environ["REDIS_URL"]
+    slogger("tasks.py", f"declare celery_app: redis_url={redis_url}")
+    celery_app = Celery(
+        "query", backend=redis_url, broker=redis_url, include=["app.sims.tasks"]
+    )
+    slogger("tasks.py", "celery_app declared successfully")
+    return celery_app
+
+
+def create_dash_app():
+    """Return the dash app with the layout of the main page."""
+    import dash_bootstrap_components as dbc
+    import dash_core_components as dcc
+    import dash_html_components as html
+    from dash import Dash
+
+    # reads the config files of the web app, relative to the working directory.
+    from .head import head_config
+
+    # Initialize dash app
+    app = Dash(
+        __name__,
+        title="Mrsimulator",
+        external_stylesheets=[dbc.themes.BOOTSTRAP],
+        suppress_callback_exceptions=True,
+        **head_config,
+    )
+
+    app.layout = html.Div(
+        [
+            dcc.Location(id="url", refresh=False),
+            html.Div(id="page-content"),
+            # html.Div(id="placeholder"),
+            html.A(id="url-search", href=""),
+        ],
+        className="main",
+    )
+    return app
+
+
+_FACTORIES = {"app": create_dash_app, "celery_app": create_celery_app}
+_FACTORY_LOCK = threading.Lock()
+
+
+def __getattr__(name):
+    """Create the `app` or `celery_app` on first access."""
+    if name not in _FACTORIES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _FACTORY_LOCK:
+        if name not in globals():
+            globals()[name] = _FACTORIES[name]()
+    return globals()[name]
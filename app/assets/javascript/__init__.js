@@ -60,27 +60,6 @@ window.dash_clientside.clientside = {
     _onMethodsLoad();
     _refreshTables();
   },
-
-  downloadSession: function (n, data) {
-    if (n === null) {
-      throw window.dash_clientside.PreventUpdate;
-    }
-    if (data === null) {
-      throw window.dash_clientside.PreventUpdate;
-    }
-
-    // prepare the download.
-    let dataStr = "data:text/json;charset=utf-8,";
-    dataStr += encodeURIComponent(JSON.stringify(data));
-
-    let dlAnchorElem = document.getElementById("download-session-link");
-    dlAnchorElem.setAttribute("href", dataStr);
-    dlAnchorElem.setAttribute("download", "session.mrsim");
-    dlAnchorElem.click();
-
-    dataStr = ndlAnchorElem = null;
-    return "";
-  },
 };
 
 function ctxTriggerID() {
@@ -0,0 +1,100 @@
+/*
+ * Author = "Deepansh J. Srivastava"
+ * Email = "srivastava.89@osu.edu"
+ */
+
+/* jshint esversion: 6 */
+
+/**
+ * Returns the values, a list or a list of lists, scaled by the factor.
+ */
+var _scaleValues = function (values, factor) {
+  return values.map((item) =>
+    Array.isArray(item) ? item.map((v) => v * factor) : item * factor
+  );
+};
+
+/**
+ * Returns the visibility of a trace from its group. The spin system traces, group
+ * `component`, replace the simulation trace when the spectrum is decomposed.
+ */
+var _traceVisible = function (group, decompose, residual) {
+  if (group === "component") return decompose;
+  if (group === "simulation") return !decompose;
+  if (group === "residual") return residual;
+  return true;
+};
+
+// The traces of the last two updates of the plot callback, by token. The previous
+// update is kept for the stubs of a response to a request sent before it.
+var _traceCache = [{}, {}];
+
+// The traces, with the stubs restored, and the layout of the last update.
+var _spectrumTraces = null;
+
+/**
+ * Returns the traces with the stubs, the traces with only a meta, replaced by the
+ * cached trace of the same token. Stubs without a cached trace are dropped.
+ */
+var _restoreTraces = function (data) {
+  const restored = data
+    .map((trace) => {
+      if (trace.type !== undefined || trace.meta == null) return trace;
+      const token = trace.meta.token;
+      const cached = _traceCache[0][token] || _traceCache[1][token];
+      return cached ? Object.assign({}, cached, { meta: trace.meta }) : null;
+    })
+    .filter((trace) => trace !== null);
+
+  const cache = {};
+  restored.forEach((trace) => {
+    if (trace.meta != null && trace.meta.token) cache[trace.meta.token] = trace;
+  });
+  _traceCache = [cache, _traceCache[0]];
+  return restored;
+};
+
+/**
+ * Renders the figure of the spectrum from the traces of the plot callback, and
+ * returns the figure and the tokens of the held traces. Every trace holds its group
+ * and the maximum amplitude of the full resolution data in `meta`, so normalizing,
+ * decomposing, and showing the residual need no server round-trip. The decompose
+ * button only takes effect when the button is clicked, else the traces follow the
+ * decomposition of the simulated data.
+ */
+var _renderSpectrum = function (traces, normalized, decompose, residual) {
+  if (traces == null) throw window.dash_clientside.PreventUpdate;
+
+  const trig_id = ctxTriggerID()[0].split(".")[0];
+  let tokens = window.dash_clientside.no_update;
+  if (trig_id === "nmr-spectrum-traces" || _spectrumTraces === null) {
+    _spectrumTraces = Object.assign({}, traces, {
+      data: _restoreTraces(traces.data),
+    });
+    tokens = Object.keys(_traceCache[0]);
+  }
+
+  const hasComponents = _spectrumTraces.data.some(
+    (trace) => trace.meta != null && trace.meta.group === "component"
+  );
+  const show =
+    hasComponents &&
+    (trig_id === "decompose" ? decompose : _spectrumTraces.decompose);
+
+  const data = _spectrumTraces.data.map((trace) => {
+    const meta = trace.meta || {};
+    const out = Object.assign({}, trace, {
+      visible: _traceVisible(meta.group, show, residual !== false),
+    });
+    if (normalized && meta.maximum) {
+      const key = trace.type === "scatter" ? "y" : "z";
+      out[key] = _scaleValues(trace[key], 1 / meta.maximum);
+    }
+    return out;
+  });
+  return [{ data: data, layout: _spectrumTraces.layout }, tokens];
+};
+
+window.dash_clientside.spectrum = {
+  render: _renderSpectrum,
+};
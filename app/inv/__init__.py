@@ -11,6 +11,7 @@ import numpy as np
 import plotly.graph_objs as go
 from celery.result import AsyncResult
 from dash import callback_context as ctx
+from dash import no_update
 from dash.dependencies import Input
 from dash.dependencies import Output
 from dash.dependencies import State
@@ -21,7 +22,11 @@ from mrinversion.linear_model import TSVDCompression
 from .layout import page
 from .tasks import query
 from app import app
+from app.sims.encoding import csdm_dict
+from app.sims.graph import apply_relayout
+from app.sims.graph import visible_range
 from app.sims.importer import load_csdm
+from app.sims.pyramid import heatmap_window
 from app.utils import slogger
 
 # class Worker:
@@ -75,11 +80,12 @@ mrinv = html.Div(
     Input("INV-upload-from-graph", "contents"),
     Input("INV-transpose", "n_clicks"),
     Input("url-search", "href"),
+    Input("INV-spectrum", "relayoutData"),
     State("INV-spectrum", "figure"),
     State("INV-input-data", "data"),
     prevent_initial_call=True,
 )
-def update_input_graph(contents, tr_val, url, figure, data):
+def update_input_graph(contents, tr_val, url, relayout, figure, data):
     # if contents is None:
     #     raise PreventUpdate
 
@@ -93,7 +99,7 @@ def update_input_graph(contents, tr_val, url, figure, data):
         content = json.loads(response.read())
         exp_data = cp.parse_dict(content)
         pre_figure(exp_data, figure)
-        return [figure, exp_data.real.dict()]
+        return [figure, csdm_dict(exp_data.real)]
 
     if trigger_id == "INV-upload-from-graph":
         content = contents.split(",")[1]
@@ -105,23 +111,73 @@ def update_input_graph(contents, tr_val, url, figure, data):
             raise PreventUpdate
 
         pre_figure(exp_data, figure)
-        return [figure, exp_data.real.dict()]
+        return [figure, csdm_dict(exp_data.real)]
 
     if trigger_id == "INV-transpose":
         if data is None:
             raise PreventUpdate
-        data = cp.parse_dict(data).T
+        data = parse_input_data(data).T
+
+        x, y, z = heatmap_xyz(data)
+        figure["data"][0].update(x=x, y=y, z=z)
+        return [figure, csdm_dict(data)]
+
+    # refine the zoomed region of the heatmap from the multi-resolution pyramid.
+    if trigger_id == "INV-spectrum":
+        axes = ("xaxis.", "yaxis.")
+        if data is None or not any(key.startswith(axes) for key in relayout or {}):
+            raise PreventUpdate
+        layout = apply_relayout(figure["layout"], relayout)
+        ranges = [visible_range(layout["xaxis"]), visible_range(layout["yaxis"])]
+
+        x, y, z = heatmap_xyz(parse_input_data(data), *ranges)
+        figure["data"][0].update(x=x, y=y, z=z)
+        return [figure, no_update]
+
+
+def parse_input_data(data):
+    """Return the CSDM object of the stored input data with the dimensions in ppm, the
+    units of the plotted heatmap. The stored coordinates are in frequency units.
+
+    Args:
+        dict data: The CSDM dict of the input data.
+    """
+    data = cp.parse_dict(data)
+    _ = [item.to("ppm", "nmr_frequency_ratio") for item in data.x]
+    return data
 
-        figure["data"][0]["x"] = data.x[0].coordinates.value
-        figure["data"][0]["y"] = data.x[1].coordinates.value
-        figure["data"][0]["z"] = data.y[0].components[0]
-        return [figure, data.dict()]
+
+def zoom_indices(coordinates, axis_range):
+    """Return the sorted indices of the first and last coordinates within the range,
+    or [0, -1] for all coordinates when the range holds no coordinates.
+
+    Args:
+        ndarray coordinates: The coordinates along the axis.
+        list axis_range: The range of the axis, in either order.
+    """
+    low, high = min(axis_range), max(axis_range)
+    inside = np.where((coordinates >= low) & (coordinates <= high))[0]
+    if inside.size == 0:
+        return [0, -1]
+    return [int(inside[0]), int(inside[-1])]
+
+
+def heatmap_xyz(data, x_range=None, y_range=None):
+    """Return the x, y, and z of the heatmap of the 2D data within the visible ranges,
+    from the multi-resolution pyramid of the data.
+
+    Args:
+        CSDM data: The 2D data.
+        list x_range: The visible x range, or None for the full range.
+        list y_range: The visible y range, or None for the full range.
+    """
+    x, y = [item.coordinates.value for item in data.x]
+    return heatmap_window(x, y, data.y[0].components[0].real, x_range, y_range)
 
 
 def pre_figure(exp_data, figure):
     _ = [item.to("ppm", "nmr_frequency_ratio") for item in exp_data.x]
-    x, y = [item.coordinates.value for item in exp_data.x]
-    z = exp_data.y[0].components[0].real
+    x, y, z = heatmap_xyz(exp_data)
     trace = go.Heatmap(x=x, y=y, z=z, colorscale="jet")
     figure["data"][0] = trace
 
@@ -141,26 +197,24 @@ def pre_figure(exp_data, figure):
 @app.callback(
     Output("INV-data-range", "data"),
     Input("INV-spectrum", "relayoutData"),
-    State("INV-spectrum", "figure"),
+    State("INV-input-data", "data"),
     prevent_initial_call=True,
 )
-def display_relayout_data(relayoutData, fig):
-    if relayoutData is None:
+def display_relayout_data(relayoutData, data):
+    if relayoutData is None or data is None:
         raise PreventUpdate
 
     keys = relayoutData.keys()
+    # the plotted heatmap is downsampled. Use the coordinates of the input data.
+    x, y = [item.coordinates.value for item in parse_input_data(data).x]
 
     if "yaxis.range[0]" in keys:
-        y = np.asarray(fig["data"][0]["y"])
-        index_min = np.where(y > relayoutData["yaxis.range[0]"])[0][0]
-        index_max = np.where(y < relayoutData["yaxis.range[1]"])[0][-1]
-        range_zoom_y = np.sort([index_min, index_max])
+        y_range = [relayoutData["yaxis.range[0]"], relayoutData["yaxis.range[1]"]]
+        range_zoom_y = zoom_indices(y, y_range)
 
     if "xaxis.range[0]" in keys:
-        x = np.asarray(fig["data"][0]["x"])
-        index_min = np.where(x > relayoutData["xaxis.range[0]"])[0][0]
-        index_max = np.where(x < relayoutData["xaxis.range[1]"])[0][-1]
-        range_zoom_x = np.sort([index_min, index_max])
+        x_range = [relayoutData["xaxis.range[0]"], relayoutData["xaxis.range[1]"]]
+        range_zoom_x = zoom_indices(x, x_range)
 
     if "yaxis.range[0]" in keys and "xaxis.range[0]" in keys:
         print(range_zoom_x, range_zoom_y)
@@ -255,7 +309,7 @@ def generate_kernel(
 
     return {
         "kernel": compressed_K,
-        "signal": compressed_s.dict(),
+        "signal": csdm_dict(compressed_s),
         "inverse_dimensions": [item.dict() for item in inverse_dimensions],
     }
 
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import csdmpy as cp
+import numpy as np
+
+from .. import heatmap_xyz
+from .. import parse_input_data
+from .. import zoom_indices
+from app.sims.encoding import csdm_dict
+
+
+def stored_data():
+    dims = [
+        cp.Dimension(
+            type="linear",
+            count=count,
+            increment="100 Hz",
+            coordinates_offset=f"{-50 * count} Hz",
+            origin_offset="100 MHz",
+        )
+        for count in [800, 600]
+    ]
+    z = np.random.rand(600, 800)
+    data = cp.CSDM(dimensions=dims, dependent_variables=[cp.as_dependent_variable(z)])
+    return csdm_dict(data), z
+
+
+def test_parse_input_data_ppm():
+    data, _ = stored_data()
+    x, y = [item.coordinates for item in parse_input_data(data).x]
+    assert str(x.unit) == "ppm" and str(y.unit) == "ppm"
+    assert np.allclose(x.value[[0, -1]], [-400, 399])
+
+
+def test_zoom_stored_data():
+    data, z = stored_data()
+    x_range, y_range = [20, -10], [-5, 5]
+
+    x, y, z_ = heatmap_xyz(parse_input_data(data), x_range, y_range)
+    assert z_.shape == (y.size, x.size)
+    # the window in ppm, with one extra point on either side.
+    assert np.allclose(x[[0, -1]], [-11, 21])
+    assert np.allclose(y[[0, -1]], [-6, 6])
+
+    # the data range of the zoom selects the same window of the input data.
+    x_all, y_all = [item.coordinates.value for item in parse_input_data(data).x]
+    i0, i1 = zoom_indices(x_all, x_range)
+    j0, j1 = zoom_indices(y_all, y_range)
+    assert np.allclose(x_all[[i0, i1]], [-10, 20])
+    assert np.allclose(y_all[[j0, j1]], [-5, 5])
+
+    # the heatmap is the full resolution window of the input data.
+    rows, cols = np.where(np.isin(y_all, y))[0], np.where(np.isin(x_all, x))[0]
+    assert np.array_equal(z_, z[np.ix_(rows, cols)])
+
+
+def test_zoom_indices_outside():
+    assert zoom_indices(np.arange(10.0), [20, 30]) == [0, -1]
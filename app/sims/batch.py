@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Headless batch fitting. Fit the model of a .mrsim file to every .csdf measurement of
+a directory, one sample per process, and write the fitted model and the fit report of
+every sample, and a summary table of the best fit parameters, to an output directory.
+
+    python -m app.sims.batch model.mrsim measurements/ --out results/ --jobs 4
+
+The measurement of a sample is attached to the method at --method, same as uploading
+the measurement in the method tab. The model must include the fit parameters, else the
+default LMFIT parameters of the model are fitted.
+"""
+import argparse
+import copy
+import csv
+import json
+import os
+from concurrent.futures import as_completed
+from concurrent.futures import ProcessPoolExecutor
+
+import csdmpy as cp
+from lmfit import Parameters
+from mrsimulator.utils.spectral_fitting import make_LMFIT_params
+
+from . import engine
+from .fitting import least_squares_fit
+from .io import attach_measurement
+from .io import fix_missing_keys
+from .io import parse_data
+from .parsing import parse
+from app.utils import slogger
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+MEASUREMENT_EXTENSIONS = (".csdf", ".csdfe")
+
+
+def load_model(path):
+    """Load the .mrsim file and return the mrsim json data with the fit parameters.
+
+    Args:
+        str path: Path to the .mrsim file.
+    """
+    with open(path, "r") as f:
+        mrsim_data = parse_data(fix_missing_keys(json.load(f)))
+
+    if mrsim_data["params"] is None:
+        sim, processors, _ = parse(mrsim_data)
+        params = make_LMFIT_params(sim, processors, include={"rotor_frequency"})
+        mrsim_data["params"] = params.dumps()
+    return mrsim_data
+
+
+def measurement_files(data_dir):
+    """Return the sorted list of paths to the measurement files in the directory.
+
+    Args:
+        str data_dir: Path to the directory of measurements.
+    """
+    return sorted(
+        os.path.join(data_dir, name)
+        for name in os.listdir(data_dir)
+        if name.endswith(MEASUREMENT_EXTENSIONS)
+    )
+
+
+def fit_sample(mrsim_data, path, out_dir, method_index=0):
+    """Fit the model to a single measurement and write the fitted model,
+    <sample>.mrsim, and the fit report, <sample>.html, to the output directory. Return
+    a summary row with the sample name, the status, the error message, if any, and the
+    best fit values of the varying parameters.
+
+    Args:
+        dict mrsim_data: The mrsim json data of the model.
+        str path: Path to the measurement file.
+        str out_dir: Path to the output directory.
+        int method_index: Index of the method the measurement is attached to.
+    """
+    sample = os.path.splitext(os.path.basename(path))[0]
+    try:
+        data = copy.deepcopy(mrsim_data)
+        attach_measurement(data, method_index, cp.load(path))
+        fit_data = least_squares_fit(data, data["params"])
+    except Exception as e:
+        return {"sample": sample, "status": "failed", "error": str(e)}
+
+    report = fit_data.pop("report")
+    with open(os.path.join(out_dir, f"{sample}.html"), "w") as f:
+        f.write(report)
+    with open(os.path.join(out_dir, f"{sample}.mrsim"), "w") as f:
+        json.dump(fit_data, f)
+
+    params = Parameters().loads(fit_data["params"])
+    values = {name: par.value for name, par in params.items() if par.vary}
+    return {"sample": sample, "status": "success", "error": "", **values}
+
+
+def fit_directory(model_path, data_dir, out_dir, method_index=0, n_jobs=None):
+    """Fit the model to every measurement of the directory in parallel processes and
+    write the per-sample results and the summary.csv table to the output directory.
+    Return the list of summary rows.
+
+    Args:
+        str model_path: Path to the .mrsim file of the model.
+        str data_dir: Path to the directory of .csdf measurements.
+        str out_dir: Path to the output directory.
+        int method_index: Index of the method the measurements are attached to.
+        int n_jobs: Number of processes. The default is the number of CPUs.
+    """
+    mrsim_data = load_model(model_path)
+    paths = measurement_files(data_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # every sample is fitted serially within its worker process.
+    rows = []
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, mp_context=engine.MP_CONTEXT, initializer=engine.init_worker
+    ) as ex:
+        futures = [
+            ex.submit(fit_sample, mrsim_data, path, out_dir, method_index)
+            for path in paths
+        ]
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            slogger(
+                "batch", f"{len(rows)}/{len(paths)} {row['sample']} {row['status']}"
+            )
+
+    rows.sort(key=lambda row: row["sample"])
+    write_summary(rows, os.path.join(out_dir, "summary.csv"))
+    return rows
+
+
+def write_summary(rows, path):
+    """Write the summary rows to a csv file.
+
+    Args:
+        list rows: List of summary rows returned by `fit_sample`.
+        str path: Path to the csv file.
+    """
+    names = ["sample", "status", "error"]
+    names += sorted({key for row in rows for key in row} - set(names))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=names)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fit a .mrsim model to every .csdf measurement of a directory."
+    )
+    parser.add_argument("model", help="Path to the .mrsim model file.")
+    parser.add_argument("data_dir", help="Directory of the .csdf measurements.")
+    parser.add_argument("--out", default="results", help="Output directory.")
+    parser.add_argument("--jobs", type=int, default=None, help="Number of processes.")
+    parser.add_argument(
+        "--method", type=int, default=0, help="Index of the fitted method."
+    )
+    args = parser.parse_args(argv)
+
+    rows = fit_directory(args.model, args.data_dir, args.out, args.method, args.jobs)
+    failed = [row["sample"] for row in rows if row["status"] != "success"]
+    slogger("batch", f"{len(rows) - len(failed)} fits succeeded, failed: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Server-side, in-process caches shared by the simulation callbacks."""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+
+class LRUCache:
+    """A thread-safe mapping that holds at most `maxsize` items and evicts the least
+    recently used item first. With `maxbytes`, the items are also evicted while the
+    total size of the items, as given by `sizeof`, exceeds `maxbytes`. An item larger
+    than `maxbytes` is not held.
+
+    Args:
+        maxsize: Maximum number of items held by the cache.
+        maxbytes: Optional maximum total size of the items in bytes.
+        sizeof: Callable returning the size of an item in bytes. Required with
+            `maxbytes`.
+    """
+
+    def __init__(self, maxsize=128, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value for `key` and mark it as recently used."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        """Add or replace the value for `key`, evicting old items if full."""
+        size = 0 if self.maxbytes is None else self.sizeof(value)
+        with self._lock:
+            self._remove(key)
+            if self.maxbytes is not None and size > self.maxbytes:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.nbytes += size
+            while len(self._data) > self.maxsize or self.nbytes > self._budget():
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key, default=None):
+        """Remove `key` from the cache and return its value."""
+        with self._lock:
+            return self._remove(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def _budget(self):
+        return float("inf") if self.maxbytes is None else self.maxbytes
+
+    def _remove(self, key, default=None):
+        self.nbytes -= self._sizes.pop(key, 0)
+        return self._data.pop(key, default)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+def content_hash(*objects):
+    """Return a hex digest of the JSON serialization of the given objects. Dict keys
+    are sorted so that two equal python dicts always give the same hash."""
+    serial = json.dumps(objects, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(serial.encode("utf-8")).hexdigest()
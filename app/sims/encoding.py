@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Compact encoding of the spectra in the callback payloads. The dependent variable
+components of a CSDM object are serialized as base64 strings of the little-endian
+binary data instead of JSON number lists. The numeric type of the components and the
+dimension counts, serialized with the CSDM object, give the dtype and the shape of the
+data, so the components are decoded with `cp.parse_dict` without any JSON parsing.
+
+The encoding is opt-in and selected with the MRSIM_COMPACT_SPECTRA environment variable,
+    - none (default): The default encoding of the CSDM object.
+    - float64: base64 encoded double precision components.
+    - float32: base64 encoded single precision components. Halves the payload again.
+"""
+import os
+
+import numpy as np
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+COMPACT_SPECTRA = os.environ.get("MRSIM_COMPACT_SPECTRA", "none").lower()
+
+# only real valued components are encoded. Complex spectra keep the default encoding.
+REAL_TYPES = ["float32", "float64"]
+
+
+def compact_csdm(csdm_obj, encoding=None):
+    """Set the base64 encoding on the internal, real valued dependent variables of the
+    CSDM object, in place, and return the object.
+
+    Args:
+        CSDM csdm_obj: The CSDM object.
+        str encoding: One of 'none', 'float32', or 'float64'. The default is the value
+            of the MRSIM_COMPACT_SPECTRA environment variable.
+    """
+    encoding = COMPACT_SPECTRA if encoding is None else encoding
+    if csdm_obj is None or encoding not in REAL_TYPES:
+        return csdm_obj
+
+    for dv in csdm_obj.y:
+        if dv.type != "internal" or str(dv.numeric_type) not in REAL_TYPES:
+            continue
+        if str(dv.numeric_type) != encoding:
+            dv.components = np.asarray(dv.components, dtype=encoding)
+        dv.encoding = "base64"
+    return csdm_obj
+
+
+def csdm_dict(csdm_obj, encoding=None):
+    """Serialize the CSDM object to a python dict with the compact encoding.
+
+    Args:
+        CSDM csdm_obj: The CSDM object.
+        str encoding: One of 'none', 'float32', or 'float64'. The default is the value
+            of the MRSIM_COMPACT_SPECTRA environment variable.
+    """
+    return compact_csdm(csdm_obj, encoding).to_dict()
+
+
+def compact_simulator(sim, encoding=None):
+    """Set the compact encoding on the simulation and experiment of every method of
+    the simulator object, in place, before serialization with `sim.json()`.
+
+    Args:
+        Simulator sim: The simulator object.
+        str encoding: One of 'none', 'float32', or 'float64'. The default is the value
+            of the MRSIM_COMPACT_SPECTRA environment variable.
+    """
+    for mth in sim.methods:
+        compact_csdm(mth.simulation, encoding)
+        compact_csdm(mth.experiment, encoding)
+    return sim
@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+"""Simulation engine for the app. The engine runs the methods of a Simulator object
+while reusing the spectra of spin systems that were already simulated by an earlier
+callback, so that editing one spin system only simulates that spin system."""
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from mrsimulator import Simulator
+
+from .cache import content_hash
+from .cache import LRUCache
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+# Number of worker processes. With the default of 1, every simulation runs serially in
+# the calling thread.
+N_JOBS = max(int(os.environ.get("MRSIM_N_JOBS", 1)), 1)
+
+# Number of spin systems per job. By default, the spin systems of a method are split
+# evenly over the worker processes.
+SHARD_SIZE = int(os.environ.get("MRSIM_SHARD_SIZE", 0))
+
+# Maximum number of spin systems simulated one by one, for the spectrum cache, when the
+# decomposition is not required. Larger simulations are reduced to a summed spectrum
+# per group of DECOMPOSE_LIMIT spin systems, which avoids holding one spectrum per spin
+# system in memory, and only the groups with a modified spin system are re-simulated.
+DECOMPOSE_LIMIT = int(os.environ.get("MRSIM_DECOMPOSE_LIMIT", 256))
+
+# The worker processes are started from a clean server process. Forking the
+# multi-threaded server process copies the locks held by other threads into the child.
+START_METHOD = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+MP_CONTEXT = mp.get_context(START_METHOD)
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+_IN_WORKER = False
+# Held by the process pool of the running fit or posterior sampling, see `job_pool`.
+_JOB_POOL_LOCK = threading.Lock()
+
+
+def csdm_nbytes(csdm_obj):
+    """Return the size in bytes of the components of a CSDM object."""
+    return sum(dv.components.nbytes for dv in csdm_obj.y)
+
+
+# Raw (unprocessed) spectrum of a single spin system from a single method, keyed by the
+# content hash of the (spin system, method, config) serialization. The cache holds at
+# most MRSIM_SPECTRUM_CACHE_MB megabytes of spectra.
+SPECTRUM_CACHE = LRUCache(
+    maxsize=int(os.environ.get("MRSIM_SPECTRUM_CACHE_SIZE", 2048)),
+    maxbytes=int(os.environ.get("MRSIM_SPECTRUM_CACHE_MB", 512)) * 2 ** 20,
+    sizeof=csdm_nbytes,
+)
+
+# Raw simulation of a method over all spin systems, keyed by the content hash of the
+# (method, spin systems, config) serialization. The cache holds at most
+# MRSIM_SIMULATION_CACHE_MB megabytes of simulations.
+SIMULATION_CACHE = LRUCache(
+    maxsize=int(os.environ.get("MRSIM_SIMULATION_CACHE_SIZE", 64)),
+    maxbytes=int(os.environ.get("MRSIM_SIMULATION_CACHE_MB", 256)) * 2 ** 20,
+    sizeof=csdm_nbytes,
+)
+
+
+# Transition pathways of a spin system topology for a method, keyed by the content hash
+# of the site isotopes and the method channels and transition queries.
+PATHWAY_CACHE = LRUCache(maxsize=int(os.environ.get("MRSIM_PATHWAY_CACHE_SIZE", 1024)))
+
+
+def method_key(method):
+    """Return the part of a serialized method which affects the simulated spectrum.
+
+    Args:
+        dict method: A method serialized with units.
+    """
+    return {k: v for k, v in method.items() if k not in ["simulation", "experiment"]}
+
+
+def config_key(config):
+    """Return the part of a serialized config which affects the spin system spectra.
+
+    Args:
+        dict config: The simulator config serialized with units.
+    """
+    return {k: v for k, v in config.items() if k != "decompose_spectrum"}
+
+
+def spectrum_keys(mrsim_data, index):
+    """Cache keys of the spin system spectra for the method at index `index`.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+        int index: The method index.
+    """
+    mth = method_key(mrsim_data["methods"][index])
+    config = config_key(mrsim_data["config"])
+    return [content_hash(sys, mth, config) for sys in mrsim_data["spin_systems"]]
+
+
+def simulation_key(mrsim_data, index, decompose=True):
+    """Cache key of the raw simulation from the method at index `index`.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+        int index: The method index.
+        bool decompose: If true, the key of the simulation decomposed into spin
+            systems, else, the key of the summed simulation.
+    """
+    mth = method_key(mrsim_data["methods"][index])
+    config = config_key(mrsim_data["config"])
+    return content_hash(mth, mrsim_data["spin_systems"], config, decompose)
+
+
+def needs_decomposition(config, processors):
+    """Return True when the spectra must be kept per spin system, that is, when the
+    decomposition is displayed or a signal processing operation only applies to some of
+    the dependent variables.
+
+    Args:
+        dict config: The simulator config serialized with units.
+        list processors: List of serialized SignalProcessor objects.
+    """
+    if config.get("decompose_spectrum", "none") == "spin_system":
+        return True
+    operations = [op for proc in processors for op in proc.get("operations", [])]
+    return any(op.get("dv_index", None) is not None for op in operations)
+
+
+def triggered_methods(trigger, n_methods):
+    """Return the indexes of the methods touched by the update that triggered the
+    simulation. The `method_index` of the trigger is a list of indexes when only those
+    methods were modified, for example, [] when no method needs a re-simulation and [-1]
+    when a method is appended. Any other value touches every method.
+
+    Args:
+        dict trigger: The trigger dict from the mrsim json data.
+        int n_methods: Total number of methods.
+    """
+    index = None if trigger is None else trigger.get("method_index", None)
+    if not isinstance(index, list):
+        return list(range(n_methods))
+    return [i % n_methods for i in index]
+
+
+def run(sim, mrsim_data, checkpoint=None, decompose=True):
+    """Simulate the methods of the simulator touched by the trigger in `mrsim_data` and
+    restore the previous simulation of the remaining methods from the cache. The
+    simulation of each method is a CSDM object with one dependent variable per spin
+    system, or a single dependent variable when `decompose` is False.
+
+    Args:
+        Simulator sim: The simulator object parsed from `mrsim_data`.
+        dict mrsim_data: The mrsim json data used for generating the cache keys.
+        checkpoint: Optional callable, called before simulating each shard of spin
+            systems. An exception raised by the callable interrupts the run.
+        bool decompose: If False, simulate the summed spectrum of the spin systems.
+    """
+    touched = triggered_methods(mrsim_data.get("trigger", None), len(sim.methods))
+    keys = {}
+    for index, method in enumerate(sim.methods):
+        key = simulation_key(mrsim_data, index, decompose)
+        cached = None if index in touched else SIMULATION_CACHE.get(key)
+
+        if cached is not None:
+            method.simulation = cached.copy()
+            continue
+
+        keys[index] = spectrum_keys(mrsim_data, index)
+
+    if decompose or len(sim.spin_systems) <= DECOMPOSE_LIMIT:
+        simulate_methods(sim, keys, checkpoint, decompose)
+    else:
+        simulate_summed(sim, keys, checkpoint)
+
+    for index in keys:
+        key = simulation_key(mrsim_data, index, decompose)
+        SIMULATION_CACHE.set(key, sim.methods[index].simulation.copy())
+
+
+def simulate_methods(sim, keys, checkpoint=None, decompose=True):
+    """Simulate the methods at the indexes in `keys` by reusing the cached spin system
+    spectra and only simulating the spin systems that are not in the cache. The missing
+    spin systems of every method are split into shards, and the shards of all methods
+    are simulated in parallel over the process pool. The spin system spectra are then
+    stacked, or summed when `decompose` is False.
+
+    Args:
+        Simulator sim: The simulator object.
+        dict keys: A dict of method index to the list of cache keys, one for every spin
+            system in the simulator. Use None in place of the list to simulate every
+            spin system without using the cache.
+        checkpoint: Optional callable, called before simulating each shard.
+        bool decompose: If False, sum the spin system spectra of each method.
+    """
+    n_sys = len(sim.spin_systems)
+    spectra, tasks = {}, []
+    for index, items in keys.items():
+        spectra[index] = (
+            [None] * n_sys if items is None else [SPECTRUM_CACHE.get(k) for k in items]
+        )
+        missing = [i for i, item in enumerate(spectra[index]) if item is None]
+        tasks += (
+            [(index, shard) for shard in shards(missing)] if n_sys else [(index, [])]
+        )
+
+    args = [
+        ([sim.spin_systems[i] for i in shard], bare(sim.methods[index]), sim.config)
+        for index, shard in tasks
+    ]
+    for (index, shard), simulation in zip(tasks, map_jobs(simulate, args, checkpoint)):
+        if n_sys == 0:
+            sim.methods[index].simulation = simulation
+            continue
+
+        for i, datum in zip(shard, simulation.split()):
+            spectra[index][i] = datum
+            if keys[index] is not None:
+                SPECTRUM_CACHE.set(keys[index][i], datum)
+
+    for index, items in spectra.items():
+        if items != []:
+            sim.methods[index].simulation = (
+                stack(items) if decompose else reduce_sum(items)
+            )
+
+
+def simulate_summed(sim, keys, checkpoint=None):
+    """Simulate the methods at the indexes in `keys` as summed spectra. The spin systems
+    are split into groups of MRSIM_DECOMPOSE_LIMIT spin systems, and the summed spectrum
+    of each group is cached under the keys of its spin systems. Only the groups that are
+    not in the cache are simulated, in parallel over the process pool, and the groups
+    are reduced to one spectrum per method. The per spin system spectra are neither held
+    in memory nor cached.
+
+    Args:
+        Simulator sim: The simulator object.
+        dict keys: A dict of method index to the list of cache keys, one for every spin
+            system in the simulator. Use None in place of the list to simulate every
+            group without using the cache.
+        checkpoint: Optional callable, called before simulating each group.
+    """
+    n_sys, size = len(sim.spin_systems), max(DECOMPOSE_LIMIT, 1)
+    groups = [list(range(n_sys))[slice(i, i + size)] for i in range(0, n_sys, size)]
+    groups = groups or [[]]
+
+    spectra, group_keys, tasks = {}, {}, []
+    for index, items in keys.items():
+        group_keys[index] = [
+            None if items is None else content_hash([items[i] for i in group])
+            for group in groups
+        ]
+        spectra[index] = [
+            None if key is None else SPECTRUM_CACHE.get(key)
+            for key in group_keys[index]
+        ]
+        tasks += [(index, j) for j, item in enumerate(spectra[index]) if item is None]
+
+    args = [
+        (
+            [sim.spin_systems[i] for i in groups[j]],
+            bare(sim.methods[index]),
+            sim.config,
+            False,
+        )
+        for index, j in tasks
+    ]
+    for (index, j), simulation in zip(tasks, map_jobs(simulate, args, checkpoint)):
+        spectra[index][j] = simulation
+        if group_keys[index][j] is not None:
+            SPECTRUM_CACHE.set(group_keys[index][j], simulation)
+
+    for index, items in spectra.items():
+        sim.methods[index].simulation = reduce_sum(items)
+
+
+def shards(items):
+    """Split the list into shards of MRSIM_SHARD_SIZE items. By default, the list is
+    split evenly over the worker processes."""
+    size = max(SHARD_SIZE or -(-len(items) // N_JOBS), 1)
+    return [items[slice(start, start + size)] for start in range(0, len(items), size)]
+
+
+def bare(method):
+    """Return a shallow copy of the method without the simulation and experiment, which
+    are not required for the simulation and are expensive to send to the workers."""
+    return method.copy(update={"simulation": None, "experiment": None})
+
+
+def map_jobs(fn, args, checkpoint=None):
+    """Return the list of `fn(*item)` for every item in args. The jobs run in the
+    process pool when MRSIM_N_JOBS is greater than one, otherwise, serially. When a
+    worker process dies, the broken pool is replaced and the jobs are submitted once
+    more to the new pool.
+
+    Args:
+        fn: A picklable function.
+        list args: List of tuples of positional arguments.
+        checkpoint: Optional callable, called before collecting each result.
+    """
+    if len(args) <= 1 or not parallel():
+        results = []
+        for item in args:
+            if checkpoint is not None:
+                checkpoint()
+            results.append(fn(*item))
+        return results
+
+    for attempt in range(2):
+        pool = executor()
+        try:
+            return submit_jobs(pool, fn, args, checkpoint)
+        except BrokenProcessPool:
+            reset_executor(pool)
+            if attempt:
+                raise
+
+
+def submit_jobs(pool, fn, args, checkpoint=None):
+    """Run `fn(*item)` for every item in args in the process pool and return the list
+    of results. The pending jobs are cancelled when collecting a result fails."""
+    futures = []
+    try:
+        futures += [pool.submit(fn, *item) for item in args]
+        results = []
+        for future in futures:
+            if checkpoint is not None:
+                checkpoint()
+            results.append(future.result())
+        return results
+    finally:
+        _ = [future.cancel() for future in futures]
+
+
+def parallel():
+    """Return True when the jobs can run in a process pool. The jobs run serially in
+    the worker processes of the pool, and in daemon processes, such as the prefork
+    workers of celery, which cannot start child processes."""
+    return N_JOBS > 1 and not _IN_WORKER and not mp.current_process().daemon
+
+
+def executor():
+    """Return the process pool of the engine, created on first use."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ProcessPoolExecutor(
+                max_workers=N_JOBS, mp_context=MP_CONTEXT, initializer=init_worker
+            )
+        return _EXECUTOR
+
+
+def reset_executor(pool):
+    """Shut down a broken process pool, that is, a pool with a dead worker process, so
+    that the next call to `executor()` creates a new pool.
+
+    Args:
+        ProcessPoolExecutor pool: The broken pool. The process pool of the engine is
+            only reset when it is still this pool.
+    """
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is pool:
+            _EXECUTOR = None
+    pool.shutdown(wait=False)
+
+
+def job_pool(initializer, initargs=()):
+    """Return a new process pool of MRSIM_N_JOBS workers with the given initializer, for
+    the jobs that keep their own context in the worker processes, or None when the jobs
+    must run serially. Only one such pool exists at a time, so that the server runs at
+    most twice MRSIM_N_JOBS worker processes with the pool of the engine. Release the
+    pool with `release_job_pool`.
+
+    Args:
+        initializer: A picklable function, called in every worker process.
+        tuple initargs: The arguments of the initializer.
+    """
+    if not parallel() or not _JOB_POOL_LOCK.acquire(blocking=False):
+        return None
+    try:
+        return ProcessPoolExecutor(
+            max_workers=N_JOBS,
+            mp_context=MP_CONTEXT,
+            initializer=initializer,
+            initargs=initargs,
+        )
+    except BaseException:
+        _JOB_POOL_LOCK.release()
+        raise
+
+
+def release_job_pool(pool, wait=True):
+    """Shut down the process pool returned by `job_pool`.
+
+    Args:
+        ProcessPoolExecutor pool: The pool, or None.
+        bool wait: If False, do not wait for the running jobs.
+    """
+    if pool is None:
+        return
+    try:
+        pool.shutdown(wait=wait)
+    finally:
+        _JOB_POOL_LOCK.release()
+
+
+def init_worker():
+    """Initializer of the worker processes. The jobs submitted from within a worker
+    process run serially."""
+    global _IN_WORKER
+    _IN_WORKER = True
+
+
+def simulate(spin_systems, method, config, decompose=True):
+    """Simulate a list of spin systems with a single method and return the simulation
+    decomposed into spin systems.
+
+    Args:
+        list spin_systems: List of SpinSystem objects.
+        Method method: The method object.
+        ConfigSimulator config: The simulator config.
+        bool decompose: If False, return the summed spectrum of the spin systems.
+    """
+    sim = Simulator(spin_systems=spin_systems, methods=[method], config=config.copy())
+    sim.config.decompose_spectrum = "spin_system" if decompose else "none"
+
+    # pre-set the transition pathways of every spin system for this method, and restore
+    # the spin systems afterwards, as the pathways are used for every method.
+    previous = [sys.transition_pathways for sys in sim.spin_systems]
+    queries = transition_queries(method)
+    for sys in sim.spin_systems:
+        sys.transition_pathways = transition_pathways(sys, method, queries)
+    try:
+        sim.run()
+    finally:
+        for sys, item in zip(sim.spin_systems, previous):
+            sys.transition_pathways = item
+    return sim.methods[0].simulation
+
+
+def transition_queries(method):
+    """Return the part of the method which selects the transition pathways.
+
+    Args:
+        Method method: The method object.
+    """
+    mth = method.json()
+    events = [
+        [ev.get("transition_query", None) for ev in sd.get("events", [])]
+        for sd in mth["spectral_dimensions"]
+    ]
+    return {"channels": mth["channels"], "events": events}
+
+
+def transition_pathways(sys, method, queries=None):
+    """Return the transition pathways of the spin system for the method, from the cache
+    when a spin system with the same site isotopes was seen before.
+
+    Args:
+        SpinSystem sys: The spin system object.
+        Method method: The method object.
+        dict queries: The transition queries of the method, if known.
+    """
+    queries = transition_queries(method) if queries is None else queries
+    isotopes = [site["isotope"] for site in sys.json().get("sites", [])]
+    key = content_hash(isotopes, queries)
+
+    pathways = PATHWAY_CACHE.get(key)
+    if pathways is None:
+        pathways = method.get_transition_pathways(sys)
+        PATHWAY_CACHE.set(key, pathways)
+    return pathways
+
+
+def stack(spectra):
+    """Stack a list of CSDM objects, each with a single dependent variable, into one
+    CSDM object with multiple dependent variables.
+
+    Args:
+        list spectra: List of CSDM objects sharing the same dimensions.
+    """
+    csdm_obj = spectra[0].copy()
+    for item in spectra[1:]:
+        csdm_obj.add_dependent_variable(item.y[0].copy())
+    return csdm_obj
+
+
+def reduce_sum(spectra):
+    """Sum a list of CSDM objects, each with a single dependent variable, into one CSDM
+    object with a single dependent variable.
+
+    Args:
+        list spectra: List of CSDM objects sharing the same dimensions.
+    """
+    csdm_obj = spectra[0].copy()
+    for item in spectra[1:]:
+        csdm_obj.y[0].components += item.y[0].components
+    return csdm_obj
@@ -5,6 +5,11 @@ import dash_html_components as html
 
 from .fields import features_modal
 from .fields import fields
+from .fit_job import cancel_button
+from .fit_job import posterior_button
+from .fit_job import progress_ui
+from .fit_job import resume_button
+from .fit_job import store as fit_job_store
 from .info_modal import info_modal
 from app.custom_widgets import custom_button
 
@@ -22,6 +27,7 @@ store = [
     # dcc.Store(id="update-vals", storage_type="memory"),
     # # Bool for triggering table update only after fit
     # dcc.Store(id="anticipate-table-update", storage_type="memory", data=False),
+    *fit_job_store,
 ]
 storage_div = html.Div(id="fitting-store", children=store)
 
@@ -43,7 +49,8 @@ def buttons():
         tooltip="Run a least-squared fitting analysis",
         **kwargs
     )
-    return dbc.ButtonGroup([sim, fit])
+    job_buttons = [cancel_button, resume_button, posterior_button]
+    return dbc.ButtonGroup([sim, fit, *[button(**kwargs) for button in job_buttons]])
 
 
 def feature_select():
@@ -93,6 +100,7 @@ def ui():
     page = html.Div(
         [
             features_header(),
+            progress_ui(),
             feature_select(),
             fields,
             info_modal,
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+import dash_bootstrap_components as dbc
+import dash_core_components as dcc
+import dash_html_components as html
+from dash import callback_context as ctx
+from dash import no_update
+from dash.dependencies import Input
+from dash.dependencies import Output
+from dash.dependencies import State
+from dash.exceptions import PreventUpdate
+from lmfit import Parameters
+
+from app import app
+from app.custom_widgets import custom_button
+from app.sims.fitting import check_bounds
+from app.sims.fitting import check_data
+from app.sims.fitting import FitError
+from app.sims.jobs import job_manager
+from app.sims.store import attach_experiments
+from app.sims.store import detach_experiments
+from app.sims.store import session_store
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+# Time in milliseconds between two job status queries.
+POLL_INTERVAL = 1000
+
+store = [
+    # handle to the running fit job, {"id": <id>, "backend": <name>}
+    dcc.Store(id="fit-job", storage_type="memory"),
+    # mrsim data with the best fit parameters from the last fit job
+    dcc.Store(id="fit-job-result", storage_type="memory"),
+    # telemetry of the latest evaluations of the running fit, see fitting.Monitor
+    dcc.Store(id="fit-telemetry", storage_type="memory"),
+    dcc.Interval(id="fit-job-interval", interval=POLL_INTERVAL, disabled=True),
+]
+
+fit_alert = dbc.Alert(
+    id="alert-message-fit",
+    color="danger",
+    dismissable=True,
+    fade=True,
+    is_open=False,
+)
+
+
+def cancel_button(**kwargs):
+    """Button for cancelling the running fit"""
+    return custom_button(
+        text="Stop",
+        icon_classname="fas fa-stop fa-lg",
+        id="fit-cancel-button",
+        tooltip="Cancel the running least-squares fit",
+        disabled=True,
+        **kwargs,
+    )
+
+
+def resume_button(**kwargs):
+    """Button for resuming an interrupted fit from its best parameters"""
+    return custom_button(
+        text="Resume",
+        icon_classname="fas fa-redo fa-lg",
+        id="fit-resume-button",
+        tooltip="Resume the cancelled or interrupted fit from its best parameters",
+        **kwargs,
+    )
+
+
+def posterior_button(**kwargs):
+    """Button for sampling the posterior of the fitted parameters"""
+    return custom_button(
+        text="Posterior",
+        icon_classname="fas fa-chart-area fa-lg",
+        id="fit-posterior-button",
+        tooltip="Estimate the parameter uncertainties by posterior (MCMC) sampling",
+        **kwargs,
+    )
+
+
+def starts_input():
+    """Input for the number of starting points of a multi-start fit"""
+    return dbc.InputGroup(
+        [
+            dbc.InputGroupAddon("Starts", addon_type="prepend"),
+            dbc.Input(id="fit-starts", type="number", min=1, step=1, value=1),
+        ],
+        size="sm",
+        className="input-form",
+    )
+
+
+def progress_ui():
+    """Div for the number of fit starts and the progress of the running fit"""
+    progress = html.Div(id="fit-progress", className="fit-progress")
+    return html.Div([starts_input(), fit_alert, progress])
+
+
+# Callbacks ============================================================================
+@app.callback(
+    Output("fit-job", "data"),
+    Output("fit-job-interval", "disabled"),
+    Output("fit-cancel-button", "disabled"),
+    Output("fit-progress", "children"),
+    Output("fit-job-result", "data"),
+    Output("alert-message-fit", "children"),
+    Output("alert-message-fit", "is_open"),
+    Output("fit-telemetry", "data"),
+    Input("trigger-fit", "data"),
+    Input("fit-job-interval", "n_intervals"),
+    Input("fit-cancel-button", "n_clicks"),
+    Input("fit-resume-button", "n_clicks"),
+    Input("fit-posterior-button", "n_clicks"),
+    State("fit-job", "data"),
+    State("local-mrsim-data", "data"),
+    State("params-data", "data"),
+    State("fit-starts", "value"),
+    State("local-simulator-data", "data"),
+    prevent_initial_call=True,
+)
+def fit_job(*args):
+    """Submit, poll, cancel, or resume the least-squares fit job, or submit the
+    posterior sampling job."""
+    trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
+    return CALLBACKS[trigger_id]()
+
+
+def expand_output(job, progress, result=no_update, alert="", telemetry=no_update):
+    """Callback outputs for the `fit_job` function. The poll interval and the cancel
+    button are only active while a job is running.
+
+    Args:
+        dict job: The job handle, or None when no job is running.
+        progress: The children of the progress div.
+        dict result: The fit result.
+        str alert: The alert message.
+        dict telemetry: The telemetry of the running fit.
+    """
+    running = job is not None
+    return [
+        job,
+        not running,
+        not running,
+        progress,
+        result,
+        alert,
+        alert != "",
+        telemetry,
+    ]
+
+
+def start_fit():
+    """Submit a new fit job, cancelling the running job, if any. With more than one
+    start, submit a multi-start fit."""
+    handle = ctx.states["fit-job.data"]
+    mrsim_data = ctx.states["local-mrsim-data.data"]
+    params_data = ctx.states["params-data.data"]
+    n_starts = ctx.states["fit-starts.value"]
+    session = get_session()
+
+    if mrsim_data is None or params_data is None:
+        raise PreventUpdate
+
+    # the jobs may run in a celery worker, without the session store of this process.
+    try:
+        check_data(mrsim_data)
+        if n_starts is not None and n_starts > 1:
+            check_bounds(Parameters().loads(params_data))
+        mrsim_data = attach_experiments(mrsim_data)
+    except (FitError, ValueError) as e:
+        return expand_output(handle, no_update, alert=str(e))
+
+    if handle is not None:
+        job_manager.cancel(handle)
+
+    if n_starts is not None and n_starts > 1:
+        handle = job_manager.submit(
+            "multi-start", mrsim_data, params_data, n_starts, session=session
+        )
+        return expand_output(
+            handle, f"Multi-start fit with {n_starts} starts submitted."
+        )
+
+    handle = job_manager.submit("fit", mrsim_data, params_data, session=session)
+    return expand_output(handle, "Fit submitted.")
+
+
+def poll_fit():
+    """Query the status of the running fit job."""
+    handle = ctx.states["fit-job.data"]
+    if handle is None:
+        return expand_output(None, no_update)
+
+    status = job_manager.status(handle)
+    state = status["state"]
+
+    # the job is finished, and handled by an earlier query.
+    if state == "RELEASED":
+        return expand_output(None, no_update)
+    if state in ["SUCCESS", "FAILURE", "CANCELLED"]:
+        job_manager.release(handle)
+
+    if state == "SUCCESS":
+        result = detach_experiments(status["result"])
+        return expand_output(None, "Fit complete.", result=result)
+    if state == "FAILURE":
+        return expand_output(None, "", alert=f"FitError: {status['error']}")
+    if state == "CANCELLED":
+        return expand_output(None, "Fit cancelled. Resume to continue the fit.")
+    if state == "CANCELLING":
+        return expand_output(handle, "Cancelling...")
+    if state == "PENDING" or status["progress"] is None:
+        return expand_output(handle, "Waiting for a worker...")
+    info = status["progress"]
+    telemetry = info.get("telemetry", no_update)
+    return expand_output(handle, progress_message(info), telemetry=telemetry)
+
+
+def cancel_fit():
+    """Request the cancellation of the running fit job."""
+    handle = ctx.states["fit-job.data"]
+    if handle is None:
+        raise PreventUpdate
+
+    job_manager.cancel(handle)
+    return expand_output(handle, "Cancelling...")
+
+
+def resume_fit():
+    """Submit a fit job resuming the checkpointed fit of the session."""
+    handle = ctx.states["fit-job.data"]
+    mrsim_data = ctx.states["local-mrsim-data.data"]
+    params_data = ctx.states["params-data.data"]
+    session = get_session()
+
+    if mrsim_data is None or params_data is None:
+        raise PreventUpdate
+
+    checkpoint = session_store.load(session, "fit-checkpoint")
+    if checkpoint is None:
+        return expand_output(handle, no_update, alert="No interrupted fit to resume.")
+
+    try:
+        mrsim_data = attach_experiments(mrsim_data)
+    except ValueError as e:
+        return expand_output(handle, no_update, alert=str(e))
+
+    if handle is not None:
+        job_manager.cancel(handle)
+
+    handle = job_manager.submit(
+        "resume", mrsim_data, params_data, checkpoint, session=session
+    )
+    message = f"Resuming the fit from chi-square {checkpoint['best_chisqr']:.6g}."
+    return expand_output(handle, message)
+
+
+def start_posterior():
+    """Submit a posterior sampling job seeded from the current parameters."""
+    handle = ctx.states["fit-job.data"]
+    mrsim_data = ctx.states["local-mrsim-data.data"]
+    params_data = ctx.states["params-data.data"]
+
+    if mrsim_data is None or params_data is None:
+        raise PreventUpdate
+
+    try:
+        check_data(mrsim_data)
+        mrsim_data = attach_experiments(mrsim_data)
+    except (FitError, ValueError) as e:
+        return expand_output(handle, no_update, alert=str(e))
+
+    if handle is not None:
+        job_manager.cancel(handle)
+
+    handle = job_manager.submit("posterior", mrsim_data, params_data)
+    return expand_output(handle, "Posterior sampling submitted.")
+
+
+def get_session():
+    """Return the session id of the simulator handle, or None."""
+    handle = ctx.states["local-simulator-data.data"]
+    return None if handle is None else handle["session"]
+
+
+def progress_message(info):
+    """Return the progress message of a fit.
+
+    Args:
+        dict info: The progress info from the fit job.
+    """
+    message = (
+        f"{info['stage'].capitalize()} fit: iteration {info['iteration']}, "
+        f"chi-square {info['chisqr']:.6g}, best chi-square {info['best_chisqr']:.6g}"
+    )
+    best = [f"{k} = {v:.6g}" for k, v in info["best_params"].items()]
+    return [html.Div(message), html.Small(", ".join(best))]
+
+
+CALLBACKS = {
+    "trigger-fit": start_fit,
+    "fit-job-interval": poll_fit,
+    "fit-cancel-button": cancel_fit,
+    "fit-resume-button": resume_fit,
+    "fit-posterior-button": start_posterior,
+}
@@ -6,7 +6,9 @@ import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_extensions as de
 import dash_html_components as html
+import numpy as np
 import pdfkit
+import plotly.graph_objs as go
 from dash import callback_context as ctx
 from dash.dependencies import ClientsideFunction
 from dash.dependencies import Input
@@ -16,6 +18,7 @@ from dash.exceptions import PreventUpdate
 from dash_extensions.snippets import send_bytes
 from lmfit import Parameters
 from mrsimulator import __version__ as mrsim_v
+from plotly.subplots import make_subplots
 
 from app import __version__ as mrapp_v
 from app import app
@@ -62,6 +65,57 @@ def report():
     )
 
 
+def convergence():
+    """Graph of the chi-square and the evaluation time of the running fit"""
+    return dcc.Graph(
+        id="fit-convergence-graph",
+        figure=convergence_figure(None),
+        config={"displayModeBar": False, "responsive": True},
+        style={"height": "22em"},
+    )
+
+
+def convergence_figure(telemetry):
+    """Plotly figure of the fit telemetry. The top panel is the chi-square and the
+    bottom panel the wall time of every evaluation, split into the simulation, the
+    processing, and the LMFIT and Jacobian overhead.
+
+    Args:
+        dict telemetry: The fit telemetry from `fitting.Monitor.telemetry`, or None.
+    """
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08)
+    fig.update_layout(
+        template="none",
+        barmode="stack",
+        margin={"l": 60, "b": 45, "t": 30, "r": 10},
+        legend={"orientation": "h", "x": 0, "y": -0.15},
+        title={"text": "Fit convergence", "font": {"size": 14}},
+    )
+    fig.update_yaxes(title_text="chi-square", type="log", row=1, col=1)
+    fig.update_yaxes(title_text="time / s", row=2, col=1)
+    fig.update_xaxes(title_text="evaluation", row=2, col=1)
+    if telemetry is None or telemetry["iteration"] == []:
+        return fig
+
+    x = telemetry["iteration"]
+    simulation = np.asarray(telemetry["simulation"])
+    processing = np.asarray(telemetry["processing"])
+    other = np.maximum(np.asarray(telemetry["total"]) - simulation - processing, 0)
+
+    fig.add_trace(
+        go.Scatter(x=x, y=telemetry["chisqr"], mode="lines", name="chi-square"),
+        row=1,
+        col=1,
+    )
+    for name, y in zip(
+        ["simulation", "processing", "LMFIT + Jacobian"],
+        [simulation, processing, other],
+    ):
+        fig.add_trace(go.Bar(x=x, y=y, name=name), row=2, col=1)
+    fig.update_layout(title_text=f"Fit convergence ({telemetry['stage']} stage)")
+    return fig
+
+
 def download_components():
     """Dash extention compoenets to download fit data"""
     return [
@@ -71,7 +125,15 @@ def download_components():
 
 
 def ui():
-    page = html.Div([header(), report(), *download_components(), homepage_html_store()])
+    page = html.Div(
+        [
+            header(),
+            convergence(),
+            report(),
+            *download_components(),
+            homepage_html_store(),
+        ]
+    )
     return html.Div(className="left-card", children=page, id="fit_report-body")
 
 
@@ -96,6 +158,19 @@ app.clientside_callback(
 )
 
 
+# callback for updating the convergence graph while a fit runs
+@app.callback(
+    Output("fit-convergence-graph", "figure"),
+    Input("fit-telemetry", "data"),
+    prevent_initial_call=True,
+)
+def update_convergence(telemetry):
+    """Update the convergence graph from the telemetry of the running fit"""
+    if telemetry is None:
+        raise PreventUpdate
+    return convergence_figure(telemetry)
+
+
 # callback for downloading param values as a json file
 @app.callback(
     Output("download-fit-values", "data"),
@@ -0,0 +1,715 @@
+# -*- coding: utf-8 -*-
+"""The least-squares analysis. The fit runs outside of the dash callbacks, in a
+background job, and reports its progress through a callable."""
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import as_completed
+from contextlib import contextmanager
+
+import mrsimulator as mrsim
+import numpy as np
+from lmfit import Minimizer
+from lmfit import Parameters
+from lmfit.printfuncs import fitreport_html_table
+from mrsimulator.utils.spectral_fitting import update_mrsim_obj_from_params
+
+from . import engine
+from .encoding import compact_simulator
+from .parsing import parse
+from .store import session_store
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+# Evaluate the columns of the finite-difference Jacobian in parallel over a process
+# pool of MRSIM_N_JOBS workers. On by default when MRSIM_N_JOBS is greater than one.
+PARALLEL_JACOBIAN = os.environ.get("MRSIM_PARALLEL_JACOBIAN", "true") == "true"
+
+# Fitting schedule. With 'coarse-to-fine', the fit first converges at an integration
+# density lower by COARSE_FACTOR and half the number of sidebands, and then re-fits at
+# the session settings from the converged parameters.
+SCHEDULE = os.environ.get("MRSIM_FIT_SCHEDULE", "none")
+COARSE_FACTOR = 4
+
+# Number of the latest residual evaluations held in the telemetry ring buffer of a fit.
+TELEMETRY_SIZE = int(os.environ.get("MRSIM_TELEMETRY_SIZE", 200))
+
+# Minimum time in seconds between two checkpoints of the best fit parameters.
+CHECKPOINT_INTERVAL = 2.0
+
+# Relative step size of the forward differences. Same as the default of leastsq.
+JACOBIAN_STEP = float(np.sqrt(np.finfo(float).eps))
+
+# The parameters, the residual arguments, and the residual function held by a Jacobian
+# or multi-start worker process.
+_WORKER_CONTEXT = None
+
+# Names of the spin system and method parameters. The signal processor parameters are
+# named 'SP_<index>_..'.
+PARAM_NAME = re.compile(r"^(sys|mth|SP)_(\d+)_")
+
+
+class FitError(Exception):
+    """Raised when the least-squares analysis cannot run on the given data."""
+
+
+class Cancelled(Exception):
+    """Raised when a fit is cancelled by the user."""
+
+
+def check_data(mrsim_data):
+    """Raise a FitError if the least-squares analysis cannot run on the mrsim data.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+    """
+    if len(mrsim_data["methods"]) == 0 or len(mrsim_data["spin_systems"]) == 0:
+        raise FitError("LeastSquaresAnalysisError: Nothing to fit.")
+
+    missing = [
+        i for i, mth in enumerate(mrsim_data["methods"]) if not mth.get("experiment")
+    ]
+    if missing != []:
+        raise FitError(
+            "LeastSquaresAnalysisError: Please attach measurement(s) for method(s) at "
+            f"index(es) {missing} before performing the least-squares analysis."
+        )
+
+
+def noise_sigma(sim):
+    """Return the noise standard deviation of the experiment of every method.
+
+    Args:
+        Simulator sim: The simulator object.
+    """
+    sigma = []
+    for mth in sim.methods:
+        csdm_application = mth.experiment.dependent_variables[0].application
+        sigma.append(
+            1
+            if "com.github.DeepanshS.mrsimulator" not in csdm_application
+            else csdm_application["com.github.DeepanshS.mrsimulator"]["sigma"]
+        )
+    return sigma
+
+
+def least_squares_fit(mrsim_data, params_data, progress=None, schedule=None):
+    """Run the least-squares analysis and return the mrsim data updated with the best
+    fit parameters and the html fit report.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+        str params_data: The JSON string of the LMFIT Parameters object.
+        progress: Optional callable, called with a dict of the fit stage, the iteration
+            number, the current and best chi-square, and the best parameter values after
+            every evaluation of the residual. Return True from the callable to cancel
+            the fit.
+        str schedule: The fitting schedule, 'none' or 'coarse-to-fine'. The default is
+            the value of the MRSIM_FIT_SCHEDULE environment variable.
+    """
+    schedule = SCHEDULE if schedule is None else schedule
+    args = residual_args(mrsim_data)
+    params = Parameters().loads(params_data)
+
+    # The coarse stage converges to loose tolerances at low integration density and
+    # fewer sidebands. The full accuracy fit starts from the coarse parameters.
+    if schedule == "coarse-to-fine":
+        with coarse_config(args[0].config):
+            monitor = Monitor(progress, stage="coarse")
+            result = minimize(params, args, monitor, xtol=1e-4, ftol=1e-4)
+        if result.aborted:
+            raise Cancelled
+        params = result.params
+
+    result = minimize(params, args, Monitor(progress, stage="fine"))
+    if result.aborted:
+        raise Cancelled
+
+    return serialize(result, *args[:2])
+
+
+def multi_start_fit(mrsim_data, params_data, progress=None, n_starts=8, seed=None):
+    """Run the least-squares analysis from `n_starts` starting points and return the
+    mrsim data updated with the best fit parameters, the html fit report, and the
+    ranked table of the fits. The first starting point is the given parameters, the
+    others are sampled uniformly within the min and max of every varying parameter
+    with finite bounds. The fits run in parallel over a process pool.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+        str params_data: The JSON string of the LMFIT Parameters object.
+        progress: Optional callable, called with a dict of the number of finished fits,
+            the chi-square of the last fit, and the best chi-square and parameter values
+            after every fit. Return True from the callable to cancel.
+        int n_starts: Number of starting points.
+        int seed: Seed of the random number generator.
+    """
+    args = residual_args(mrsim_data)
+    params = Parameters().loads(params_data)
+    starts = sample_starts(params, n_starts, seed)
+
+    monitor = Monitor(progress, stage="multi-start")
+    fits = []
+    with StartPool(params, args) as pool:
+        for i, fit in enumerate(pool.map(starts)):
+            fits.append(fit)
+            if monitor.update(fit["values"], i + 1, fit["chisqr"]):
+                pool.cancel()
+                raise Cancelled
+
+    # polish the best fit in this process for the covariance and the fit report.
+    fits.sort(key=lambda fit: fit["chisqr"])
+    for name in starts[0]:
+        params[name].value = fits[0]["values"][name]
+    result = minimize(params, args, Monitor(progress, stage="fine"))
+    if result.aborted:
+        raise Cancelled
+
+    fit_data = serialize(result, *args[:2])
+    fit_data["report"] += ranked_table_html(fits)
+    return fit_data
+
+
+def resume_fit(mrsim_data, params_data, checkpoint, progress=None):
+    """Resume an interrupted fit from the best parameters of its checkpoint. A fit
+    interrupted in the coarse stage resumes with the coarse-to-fine schedule, any other
+    fit resumes at full accuracy.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+        str params_data: The JSON string of the LMFIT Parameters object.
+        dict checkpoint: The checkpoint saved by `fit_checkpoint`.
+        progress: Optional callable. Same as in `least_squares_fit`.
+    """
+    # parameters added or fixed since the checkpoint keep their current values.
+    params = Parameters().loads(params_data)
+    for name, value in checkpoint["best_params"].items():
+        if name in params and params[name].vary:
+            params[name].value = value
+
+    schedule = "coarse-to-fine" if checkpoint["stage"] == "coarse" else "none"
+    return least_squares_fit(mrsim_data, params.dumps(), progress, schedule)
+
+
+@contextmanager
+def fit_checkpoint(session, progress=None):
+    """Save the progress info of the fit, with the best parameters so far, as the
+    "fit-checkpoint" entry of the session store within the context. Yield the progress
+    callable for the fit. The checkpoint is saved at most every CHECKPOINT_INTERVAL
+    seconds, and a newer best not saved yet is saved when the fit is cancelled or fails.
+    The checkpoint is removed when the fit completes.
+
+    Args:
+        str session: The session id. No checkpoint is saved when None.
+        progress: Optional callable, the progress callable of the job.
+    """
+    if session is None:
+        yield progress
+        return
+
+    last = {"key": None, "time": 0.0, "pending": None}
+
+    def save(info):
+        now = time.time()
+        session_store.save(session, "fit-checkpoint", dict(info, time=now))
+        last.update(time=now, pending=None)
+
+    def checkpoint(info):
+        key = (info["stage"], info["best_chisqr"])
+        if key != last["key"]:
+            last.update(key=key, pending=dict(info))
+        pending = last["pending"]
+        if pending is not None and time.time() - last["time"] > CHECKPOINT_INTERVAL:
+            save(pending)
+        return False if progress is None else progress(info)
+
+    try:
+        yield checkpoint
+    except BaseException:
+        if last["pending"] is not None:
+            save(last["pending"])
+        raise
+    session_store.discard(session, "fit-checkpoint")
+
+
+def residual_args(mrsim_data):
+    """Parse the mrsim data and return the arguments of the residual function after the
+    parameters, (sim, processors, sigma, decompose).
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+    """
+    check_data(mrsim_data)
+    sim, processors, _ = parse(mrsim_data)
+
+    # Keep only the real part of the data
+    for mth in sim.methods:
+        mth.experiment = mth.experiment.real
+
+    sigma = noise_sigma(sim)
+
+    # the residual only needs the summed spectra, unless a processing operation
+    # applies to selected spin systems.
+    decompose = engine.needs_decomposition({}, mrsim_data["signal_processors"])
+    return sim, processors, sigma, decompose
+
+
+def serialize(result, sim, processors):
+    """Return the mrsim data updated with the best fit parameters and the fit report.
+
+    Args:
+        MinimizerResult result: The LMFIT minimizer result.
+        Simulator sim: The simulator object.
+        list processors: List of SignalProcessor objects.
+    """
+    update_mrsim_obj_from_params(result.params, sim, processors)
+
+    # The simulation callback re-simulates the spectra from the fitted parameters. Do
+    # not send the spectra to the browser with the mrsim data.
+    for mth in sim.methods:
+        mth.simulation = None
+
+    compact_simulator(sim)
+    fit_data = mrsim.dict(sim, processors, result.params)
+    fit_data["report"] = fitreport_html_table(result)
+    return fit_data
+
+
+def check_bounds(params):
+    """Raise a FitError if no varying parameter has a finite min and max, in which case
+    every starting point of a multi-start fit is the same.
+
+    Args:
+        Parameters params: The LMFIT Parameters object.
+    """
+    varying = [par for par in params.values() if par.vary]
+    if not any(np.isfinite([par.min, par.max]).all() for par in varying):
+        raise FitError(
+            "MultiStartError: The starting points are sampled within the min and max "
+            "of the varying parameters. Please set finite bounds on at least one "
+            "varying parameter."
+        )
+
+
+def sample_starts(params, n_starts, seed=None):
+    """Return a list of `n_starts` dicts of starting values of the varying parameters.
+    The first dict holds the current values.
+
+    Args:
+        Parameters params: The LMFIT Parameters object.
+        int n_starts: Number of starting points.
+        int seed: Seed of the random number generator.
+    """
+    if n_starts > 1:
+        check_bounds(params)
+
+    rng = np.random.default_rng(seed)
+    varying = [par for par in params.values() if par.vary]
+    starts = [{par.name: par.value for par in varying}]
+    for _ in range(n_starts - 1):
+        starts.append(
+            {
+                par.name: float(rng.uniform(par.min, par.max))
+                if np.isfinite([par.min, par.max]).all()
+                else par.value
+                for par in varying
+            }
+        )
+    return starts
+
+
+def ranked_table_html(fits):
+    """Return an html table of the fits ranked by the chi-square.
+
+    Args:
+        list fits: List of dicts returned by `fit_start`, sorted by chi-square.
+    """
+    names = list(fits[0]["values"])
+    head = "".join(f"<th>{name}</th>" for name in ["Rank", "Chi-square", *names])
+    rows = [
+        "".join(
+            [
+                f"<td>{rank + 1}</td><td>{fit['chisqr']:.6g}</td>",
+                *[f"<td>{fit['values'][name]:.6g}</td>" for name in names],
+            ]
+        )
+        for rank, fit in enumerate(fits)
+    ]
+    body = "".join(f"<tr>{row}</tr>" for row in rows)
+    return f"<h2>Multi-start fits</h2><table><tr>{head}</tr>{body}</table>"
+
+
+def minimize(params, args, monitor, **kwargs):
+    """Minimize the residual with the leastsq method and return the MinimizerResult.
+
+    Args:
+        Parameters params: The LMFIT Parameters object with the starting values.
+        tuple args: The arguments of the residual function after the parameters.
+        Monitor monitor: The iteration callback.
+        kwargs: Additional keyword arguments of `scipy.optimize.leastsq`.
+    """
+    residual = Residual()
+    monitor.residual = residual
+    minner = Minimizer(residual, params, fcn_args=args, iter_cb=monitor)
+    if PARALLEL_JACOBIAN and engine.parallel():
+        with ParallelJacobian(params, args) as jacobian:
+            if jacobian is not None:
+                return minner.minimize(method="leastsq", Dfun=jacobian, **kwargs)
+    return minner.minimize(method="leastsq", **kwargs)
+
+
+@contextmanager
+def coarse_config(config):
+    """Lower the integration density and the number of sidebands of the simulator
+    config within the context.
+
+    Args:
+        ConfigSimulator config: The simulator config.
+    """
+    density, sidebands = config.integration_density, config.number_of_sidebands
+    config.integration_density = min(max(density // COARSE_FACTOR, 8), density)
+    config.number_of_sidebands = min(max(sidebands // 2, 8), sidebands)
+    try:
+        yield config
+    finally:
+        config.integration_density = density
+        config.number_of_sidebands = sidebands
+
+
+class Monitor:
+    """The LMFIT iteration callback. Tracks the best chi-square and parameters and
+    forwards them to the `progress` callable. The chi-square, the parameter values, and
+    the wall time of the latest TELEMETRY_SIZE evaluations are held in a ring buffer.
+    The wall time of an evaluation is split into the simulation and the processing time
+    of the residual, and the remainder, spent in LMFIT and the Jacobian.
+
+    Args:
+        progress: A callable or None.
+        str stage: Name of the fit stage.
+    """
+
+    def __init__(self, progress=None, stage="fine"):
+        self.progress = progress
+        self.stage = stage
+        self.best_chisqr = np.inf
+        self.best_params = {}
+        # the residual function of the fit, set by `minimize`.
+        self.residual = None
+        self.names = []
+        self.records = deque(maxlen=TELEMETRY_SIZE)
+        self.start = self.last = time.perf_counter()
+
+    def __call__(self, params, iteration, resid, *args, **kwargs):
+        chisqr = float(np.sum(np.square(resid)))
+        return self.update(params.valuesdict(), iteration, chisqr)
+
+    def update(self, values, iteration, chisqr):
+        """Record the chi-square of the parameter values and report the progress.
+        Return True when the fit is cancelled."""
+        if chisqr < self.best_chisqr:
+            self.best_chisqr = chisqr
+            self.best_params = {k: float(v) for k, v in values.items()}
+        self.record(values, iteration, chisqr)
+
+        if self.progress is None:
+            return False
+
+        info = {
+            "stage": self.stage,
+            "iteration": int(iteration),
+            "chisqr": chisqr,
+            "best_chisqr": self.best_chisqr,
+            "best_params": self.best_params,
+            "telemetry": self.telemetry(),
+        }
+        return bool(self.progress(info))
+
+    def record(self, values, iteration, chisqr):
+        """Append the evaluation to the telemetry ring buffer."""
+        now = time.perf_counter()
+        timing = (0.0, 0.0) if self.residual is None else self.residual.timing
+        self.names = list(values)
+        self.records.append(
+            (
+                int(iteration),
+                chisqr,
+                now - self.start,
+                now - self.last,
+                *timing,
+                [float(v) for v in values.values()],
+            )
+        )
+        self.last = now
+
+    def telemetry(self):
+        """Return the telemetry ring buffer as a dict of columns, with keys
+        - stage: Name of the fit stage.
+        - names: Names of the parameters.
+        - iteration: The iteration number of every evaluation.
+        - chisqr: The chi-square.
+        - elapsed: The wall time in seconds since the start of the stage.
+        - total: The wall time in seconds of the evaluation.
+        - simulation: The time in seconds spent simulating the spectra.
+        - processing: The time in seconds spent processing the spectra.
+        - values: The parameter values, one list for every evaluation.
+        """
+        keys = ["iteration", "chisqr", "elapsed", "total", "simulation", "processing"]
+        columns = [list(item) for item in zip(*self.records)] or [[]] * 7
+        telemetry = dict(zip(keys, columns))
+        telemetry.update(stage=self.stage, names=self.names, values=columns[-1])
+        return telemetry
+
+
+class Residual:
+    """The LMFIT minimization function. Same as the `LMFIT_min_function` of
+    mrsimulator, except that only the spin systems whose parameters changed since the
+    previous evaluation are re-simulated, and the methods are simulated with the engine,
+    in parallel over the process pool. When only the signal processor parameters change,
+    the simulation is skipped and the previous spectra are re-processed.
+
+    The raw spectra are cached per group of spin systems. Every spin system is a group
+    when the decomposition is required or the number of spin systems is at most
+    MRSIM_DECOMPOSE_LIMIT, else the spin systems are split into at most
+    MRSIM_DECOMPOSE_LIMIT groups, each holding a summed spectrum.
+    """
+
+    def __init__(self):
+        self.values = {}
+        # method index -> list of raw spectra, one for every group of spin systems.
+        self.spectra = {}
+        # time in seconds spent simulating and processing in the last evaluation.
+        self.timing = (0.0, 0.0)
+
+    def __call__(self, params, sim, processors, sigma, decompose=True):
+        """Return the residual.
+
+        Args:
+            Parameters params: The LMFIT Parameters object.
+            Simulator sim: The simulator object.
+            list processors: List of SignalProcessor objects, one for every method.
+            list sigma: The noise standard deviation, one for every method.
+            bool decompose: If False, simulate the summed spectrum of the spin systems.
+        """
+        start = time.perf_counter()
+        values = params.valuesdict()
+        changed = [k for k, v in values.items() if self.values.get(k, None) != v]
+        self.values = dict(values)
+
+        update_mrsim_obj_from_params(params, sim, processors)
+        self.simulate(sim, changed, decompose)
+        simulated = time.perf_counter()
+
+        diff = []
+        for processor, mth, sigma_ in zip(processors, sim.methods, sigma):
+            processed = processor.apply_operations(data=mth.simulation)
+            datum = np.sum([item.components[0].real for item in processed.y], axis=0)
+            diff.append(((experiment_data(mth) - datum) / sigma_).ravel())
+
+        self.timing = (simulated - start, time.perf_counter() - simulated)
+        return np.concatenate(diff)
+
+    def simulate(self, sim, changed, decompose):
+        """Re-simulate the groups of spin systems affected by the changed parameters
+        and assemble the simulation of every method."""
+        n_sys = len(sim.spin_systems)
+        size = 1 if decompose else max(-(-n_sys // engine.DECOMPOSE_LIMIT), 1)
+        groups = [list(range(n_sys))[i:][:size] for i in range(0, n_sys, size)] or [[]]
+        systems, methods = touched_objects(changed, len(sim.methods))
+
+        tasks = []
+        for index in range(len(sim.methods)):
+            redo_all = methods is None or index in methods or index not in self.spectra
+            tasks += [
+                (index, g)
+                for g, group in enumerate(groups)
+                if redo_all or systems.intersection(group)
+            ]
+
+        args = [
+            (
+                [sim.spin_systems[i] for i in groups[g]],
+                engine.bare(sim.methods[index]),
+                sim.config,
+                False,
+            )
+            for index, g in tasks
+        ]
+        for (index, g), datum in zip(tasks, engine.map_jobs(engine.simulate, args)):
+            self.spectra.setdefault(index, [None] * len(groups))[g] = datum
+
+        for index, mth in enumerate(sim.methods):
+            items = self.spectra[index]
+            mth.simulation = (
+                engine.stack(items) if decompose else engine.reduce_sum(items)
+            )
+
+
+def touched_objects(names, n_methods):
+    """Return the sets of spin system and method indexes touched by the parameters with
+    the given names. The parameters of the signal processors touch neither. A None set
+    means that every object is touched.
+
+    Args:
+        list names: The LMFIT parameter names, for example, 'sys_0_site_0_..'.
+        int n_methods: Number of methods.
+    """
+    systems, methods = set(), set()
+    for name in names:
+        match = PARAM_NAME.match(name)
+        if match is None:
+            return None, None
+        kind, index = match.groups()
+        if kind == "sys":
+            systems.add(int(index))
+        if kind == "mth":
+            methods.add(int(index) % n_methods)
+    return systems, methods
+
+
+def experiment_data(method):
+    """Return the real experiment components of the method ordered along the positive
+    increments of the simulation.
+
+    Args:
+        Method method: The method object with an experiment.
+    """
+    exp = method.experiment
+    y = exp.y[0].components[0].real
+    index = [-i - 1 for i, x in enumerate(exp.x) if x.increment.value < 0]
+    return y if index == [] else np.flip(y, axis=tuple(index))
+
+
+class ParallelJacobian:
+    """The forward-difference Jacobian of the residual for the leastsq method of LMFIT.
+    The residual at the current parameters and at every parameter step are evaluated in
+    parallel over a process pool. Each worker process holds its own copy of the parsed
+    simulator, sent once when the pool starts, and only receives parameter values. The
+    context is None when the process pool is not available, see `engine.job_pool`.
+
+    Args:
+        Parameters params: The LMFIT Parameters object.
+        tuple args: The arguments of the residual function after the parameters.
+    """
+
+    def __init__(self, params, args):
+        self.executor = engine.job_pool(init_fit_worker, (params, args))
+
+    def __enter__(self):
+        return self if self.executor is not None else None
+
+    def __exit__(self, *args):
+        engine.release_job_pool(self.executor)
+
+    def __call__(self, params, *args, **kwargs):
+        """Return the Jacobian, with one column for every varying parameter."""
+        varying = [name for name, par in params.items() if par.vary]
+        values = {name: params[name].value for name in varying}
+        steps = [step_size(params[name]) for name in varying]
+
+        columns = [(None, 0)] + list(zip(varying, steps))
+        futures = [
+            self.executor.submit(jacobian_column, values, name, step)
+            for name, step in columns
+        ]
+        resid = [future.result() for future in futures]
+        return np.asarray([(f - resid[0]) / h for f, h in zip(resid[1:], steps)]).T
+
+
+def step_size(par):
+    """Return the forward-difference step of the parameter. The step is backward when
+    the forward step exceeds the upper bound of the parameter.
+
+    Args:
+        Parameter par: The LMFIT Parameter object.
+    """
+    step = JACOBIAN_STEP * max(abs(par.value), 1.0)
+    return -step if par.value + step > par.max else step
+
+
+class StartPool:
+    """Run the fits from a list of starting points over a process pool. Each worker
+    process holds its own copy of the parsed simulator, sent once when the pool starts.
+    The fits run serially in this process when a process pool is not available.
+
+    Args:
+        Parameters params: The LMFIT Parameters object.
+        tuple args: The arguments of the residual function after the parameters.
+    """
+
+    def __init__(self, params, args):
+        self.context = (params, args)
+        self.executor = engine.job_pool(init_fit_worker, (params, args))
+        self.futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        # on cancellation, do not wait for the running fits.
+        engine.release_job_pool(self.executor, wait=exc_type is None)
+
+    def map(self, starts):
+        """Yield the fit from every starting point, in order of completion."""
+        if self.executor is None:
+            for values in starts:
+                yield fit_start(values, *self.context)
+            return
+
+        self.futures = [self.executor.submit(fit_start, item) for item in starts]
+        for future in as_completed(self.futures):
+            yield future.result()
+
+    def cancel(self):
+        """Cancel the fits that have not started."""
+        _ = [future.cancel() for future in self.futures]
+
+
+def fit_start(values, params=None, args=None):
+    """Fit from the starting values and return a dict of the best fit values, the
+    chi-square, and the number of function evaluations. The parameters and the residual
+    arguments default to those held by the worker process.
+
+    Args:
+        dict values: The starting values of the varying parameters.
+        Parameters params: The LMFIT Parameters object.
+        tuple args: The arguments of the residual function after the parameters.
+    """
+    if params is None:
+        params, args, _ = _WORKER_CONTEXT
+    params = params.copy()
+    for name, value in values.items():
+        params[name].value = value
+
+    result = minimize(params, args, Monitor())
+    return {
+        "values": {k: float(v) for k, v in result.params.valuesdict().items()},
+        "chisqr": float(result.chisqr),
+        "nfev": int(result.nfev),
+    }
+
+
+def init_fit_worker(params, args):
+    """Initializer of the Jacobian and multi-start worker processes."""
+    global _WORKER_CONTEXT
+    engine.init_worker()
+    _WORKER_CONTEXT = (params, args, Residual())
+
+
+def jacobian_column(values, name=None, step=0):
+    """Evaluate the residual in a Jacobian worker process, with the parameter `name`
+    shifted by `step`.
+
+    Args:
+        dict values: The values of the varying parameters.
+        str name: Name of the shifted parameter. None evaluates the residual at values.
+        float step: The step.
+    """
+    params, args, residual = _WORKER_CONTEXT
+    for key, value in values.items():
+        params[key].value = value
+    if name is not None:
+        params[name].value = values[name] + step
+    params.update_constraints()
+    return residual(params, *args)
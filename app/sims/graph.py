@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import os
+
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_extensions as de
 import dash_html_components as html
+import numpy as np
 import plotly.graph_objs as go
 from dash.dependencies import ClientsideFunction
 from dash.dependencies import Input
@@ -11,6 +15,8 @@ from dash.dependencies import State
 
 from .modal.help import simulation_help
 from .modal.spectra_download import download_modal
+from .pyramid import heatmap_window
+from .pyramid import window
 from app import app
 from app.custom_widgets import custom_button
 from app.custom_widgets import custom_switch
@@ -18,6 +24,9 @@ from app.custom_widgets import custom_switch
 __author__ = "Deepansh J. Srivastava"
 __email__ = "srivastava.89@osu.edu"
 
+# Maximum number of points of a 1D trace sent to the browser, about twice the plot
+# width in pixels. Longer traces are decimated to the minimum and maximum of every bin.
+PLOT_POINTS = int(os.environ.get("MRSIM_PLOT_POINTS", 2000))
 
 default_data = go.Scatter(
     x=[-1.2, 0, 1.2],
@@ -122,6 +131,20 @@ def graph_ui():
         [Input("nmr_spectrum", "figure")],
     )
 
+    # The figure is rendered in the browser from the traces of the plot callback, so
+    # that normalizing and toggling the traces do not call the server. The browser
+    # keeps the traces by token and restores the unchanged traces from their stubs.
+    app.clientside_callback(
+        ClientsideFunction(namespace="spectrum", function_name="render"),
+        Output("nmr_spectrum", "figure"),
+        Output("nmr-spectrum-tokens", "data"),
+        Input("nmr-spectrum-traces", "data"),
+        Input("normalize_amp", "active"),
+        Input("decompose", "active"),
+        Input("residual", "active"),
+        prevent_initial_call=True,
+    )
+
     return dcc.Loading(plotly_graph, type="dot")
 
 
@@ -148,7 +171,7 @@ def tools():
         return download_btn
 
     def graph_tool_pack():
-        """Normalize to one and spectral decompose buttons"""
+        """Normalize to one, spectral decompose, and residual buttons"""
         kwargs = dict(
             outline=True,
             color="dark",
@@ -172,7 +195,15 @@ def tools():
             tooltip="Decompose spectrum from individual spin systems.",
             **kwargs,
         )
-        return dbc.ButtonGroup([normalize_button, decompose_button])
+
+        residual_button = custom_switch(
+            icon_classname="fas fa-not-equal",
+            id="residual",
+            tooltip="Show the residual between the experiment and the simulation.",
+            active=True,
+            **kwargs,
+        )
+        return dbc.ButtonGroup([normalize_button, decompose_button, residual_button])
 
     return html.Div([graph_tool_pack(), download_spectra()])
 
@@ -238,25 +269,128 @@ def ui():
 spectrum_body = ui()
 
 
-def one_d_multi_trace(data, x0, dx, maximum, name=None):
+def decimate(x, y, n_points=PLOT_POINTS):
+    """Return the x and y values of the points at the minimum and the maximum of y in
+    every one of `n_points / 2` bins, in order. The first and the last points are always
+    included. Traces with at most `n_points` points are returned unchanged.
+
+    Args:
+        ndarray x: The x coordinates.
+        ndarray y: The y values.
+        int n_points: The maximum number of points.
+    """
+    size = y.size
+    if size <= n_points:
+        return x, y
+
+    bin_size = -(-size // max(n_points // 2, 1))
+    padded = np.pad(y, (0, -size % bin_size), mode="edge").reshape(-1, bin_size)
+    offset = np.arange(padded.shape[0]) * bin_size
+    index = np.concatenate(
+        [[0, size - 1], offset + padded.argmin(axis=1), offset + padded.argmax(axis=1)]
+    )
+    index = np.unique(np.minimum(index, size - 1))
+    return x[index], y[index]
+
+
+def visible(x, y, x_range=None):
+    """Return the x and y values within the x range, with one extra point on either
+    side, so that the lines extend to the edges of the plot.
+
+    Args:
+        ndarray x: The x coordinates, in ascending or descending order.
+        ndarray y: The y values.
+        list x_range: The visible range of x, or None for the full range.
+    """
+    index = window(x, x_range)
+    return x[index], y[index]
+
+
+def visible_range(axis):
+    """Return the visible range of the layout axis, or None when the axis autoranges."""
+    return None if axis.get("autorange") else axis.get("range")
+
+
+def apply_relayout(layout, relayout):
+    """Apply the axis ranges of the relayout data to the figure layout, in place, and
+    return the layout.
+
+    Args:
+        dict layout: The figure layout.
+        dict relayout: The relayout data of the graph, for example,
+            {"xaxis.range[0]": 10, "xaxis.range[1]": -5} or {"xaxis.autorange": True}.
+    """
+    for key, value in relayout.items():
+        axis, _, prop = key.partition(".")
+        if axis not in ["xaxis", "yaxis"]:
+            continue
+        if prop == "autorange":
+            # plotly keeps the direction of a reversed axis when autoranging.
+            axis_range = layout[axis].get("range") or [0, 1]
+            reverse = layout[axis].get("autorange") == "reversed" or (
+                None not in axis_range and axis_range[0] > axis_range[1]
+            )
+            layout[axis]["autorange"] = "reversed" if reverse else value
+        if prop == "range":
+            layout[axis].update(range=list(value), autorange=False)
+        if prop in ["range[0]", "range[1]"]:
+            axis_range = layout[axis].get("range") or [None, None]
+            axis_range[int(prop[-2])] = value
+            layout[axis].update(range=axis_range, autorange=False)
+    return layout
+
+
+def trace_token(trace):
+    """Return a short digest of the type, name, meta, and coordinates of the trace.
+    The token of a previous digest in the meta is ignored."""
+    digest = hashlib.blake2b(digest_size=8)
+    for key in ["type", "name", "meta", "x", "y", "z"]:
+        value = trace[key] if key in trace else None
+        if key == "meta" and value is not None:
+            value = sorted((k, v) for k, v in value.items() if k != "token")
+        if isinstance(value, np.ndarray):
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+
+def partial_traces(traces, tokens=None):
+    """Add the token of every trace to its meta and return the traces. The traces
+    already held by the browser are replaced by stubs with only the meta, so only the
+    changed traces are sent.
+
+    Args:
+        list traces: The traces with a meta dict.
+        list tokens: Tokens of the traces held by the browser.
+    """
+    tokens = set(tokens or [])
+    partial = []
+    for trace in traces:
+        token = trace_token(trace)
+        trace["meta"] = dict(trace["meta"], token=token)
+        partial.append({"meta": trace["meta"]} if token in tokens else trace)
+    return partial
+
+
+def one_d_multi_trace(data, x, maximum, name=None, x_range=None):
     """Use for multi line plots. When decompose is true"""
     return [
         dict(
             type="scatter",
-            x0=x0,
-            dx=dx,
-            y=datum.components[0] / maximum,
+            **line_xy(x, datum.components[0], x_range),
             mode="lines",
             opacity=0.6,
             line={"width": 1},
             fill="tozeroy",
             name=name if datum.name == "" else datum.name,
+            meta={"group": "component", "maximum": maximum},
         )
         for datum in data
     ]
 
 
-def one_d_single_trace(data, x0, dx, maximum, name=""):
+def one_d_single_trace(y, x, maximum, name="", x_range=None):
     """Use for single line plot"""
     line = (
         {"color": "black", "width": 1}
@@ -268,43 +402,74 @@ def one_d_single_trace(data, x0, dx, maximum, name=""):
     return [
         dict(
             type="scatter",
-            x0=x0,
-            dx=dx,
-            y=data[0].components[0] / maximum,
+            **line_xy(x, y, x_range),
             mode="lines",
             line=line,
             name=name,
+            meta={"group": name, "maximum": maximum},
         )
     ]
 
 
-def plot_1D_trace(data, normalized=False, decompose=False, name=""):
-    x = data.x[0].coordinates.value
-    x0 = x[0]
-    dx = x[1] - x[0]
-    maximum = max([yi.components.max() for yi in data.y]) if normalized else 1.0
+def line_xy(x, y, x_range=None):
+    """Return the x and y of the trace, decimated within the visible x range."""
+    x, y = decimate(*visible(x, y, x_range))
+    return {"x": x, "y": y}
 
-    args = (data.y, x0, dx, maximum, name)
-    return one_d_multi_trace(*args) if decompose else one_d_single_trace(*args)
 
+def plot_1D_trace(data, decompose=False, name="", x_range=None):
+    """Return the 1D traces of the data. Every trace is decimated to at most
+    PLOT_POINTS points within the visible x range, and holds its group and the maximum
+    amplitude of the full resolution data in `meta`, for the normalization in the
+    browser.
 
-def plot_2D_trace(data, normalized=False, decompose=False):
+    Args:
+        CSDM data: The data.
+        bool decompose: If True, plot one trace for every dependent variable, followed
+            by the trace of their sum.
+        str name: Name of the trace.
+        list x_range: The visible x range, or None for the full range.
+    """
+    x = data.x[0].coordinates.value
+    maximum = float(max([yi.components.max() for yi in data.y]))
+
+    if not decompose:
+        return one_d_single_trace(data.y[0].components[0], x, maximum, name, x_range)
+
+    total = np.sum([yi.components[0] for yi in data.y], axis=0)
+    plot_trace = one_d_multi_trace(data.y, x, maximum, name, x_range)
+    return plot_trace + one_d_single_trace(total, x, float(total.max()), name, x_range)
+
+
+def plot_2D_trace(data, decompose=False, name="", x_range=None, y_range=None):
+    """Return the 2D traces of the data from the multi-resolution pyramid of the data,
+    with at most PLOT_PIXELS points along every axis within the visible ranges. Every
+    trace holds its group and the maximum amplitude of the full resolution data in
+    `meta`, for the normalization in the browser.
+
+    Args:
+        CSDM data: The data.
+        bool decompose: If True, plot one contour for every dependent variable,
+            followed by the heatmap of their sum.
+        str name: Name of the trace.
+        list x_range: The visible x range, or None for the full range.
+        list y_range: The visible y range, or None for the full range.
+    """
     plot_trace = []
 
     x, y = [item.coordinates.value for item in data.x]
 
     if decompose:
-        maximum = max([yi.components.max() for yi in data.y]) if normalized else 1.0
+        maximum = float(max([yi.components.max() for yi in data.y]))
 
         for datum in data.y:
-            name = None if datum.name == "" else datum.name
+            name_ = None if datum.name == "" else datum.name
+            x_, y_, z_ = heatmap_window(x, y, datum.components[0], x_range, y_range)
             plot_trace.append(
                 go.Contour(
-                    dx=x[1] - x[0],
-                    dy=y[1] - y[0],
-                    x0=x[0],
-                    y0=y[0],
-                    z=datum.components[0] / maximum,
+                    x=x_,
+                    y=y_,
+                    z=z_,
                     fillcolor=False,
                     # type="heatmap",
                     showscale=False,
@@ -313,24 +478,22 @@ def plot_2D_trace(data, normalized=False, decompose=False):
                     colorscale="dense",
                     # line={"width": 1.2},
                     # fill="tozeroy",
-                    name=name,
+                    name=name_,
+                    meta={"group": "component", "maximum": maximum},
                 )
             )
-        return plot_trace
 
     y_data = 0
     for datum in data.split():
         y_data += datum
-    if normalized:
-        y_data /= y_data.max()
+    total = y_data.y[0].components[0]
 
+    x_, y_, z_ = heatmap_window(x, y, total, x_range, y_range)
     plot_trace += [
         dict(
-            dx=x[1] - x[0],
-            dy=y[1] - y[0],
-            x0=x[0],
-            y0=y[0],
-            z=y_data.y[0].components[0],
+            x=x_,
+            y=y_,
+            z=z_,
             type="heatmap",
             showscale=False,
             # line_smoothing=0,
@@ -341,7 +504,8 @@ def plot_2D_trace(data, normalized=False, decompose=False):
             colorscale="dense",
             # "tempo", "curl", "armyrose", "dense",  # "electric_r",
             # zmid=0,
-            name="simulation",
+            name=name,
+            meta={"group": name, "maximum": float(total.max())},
         )
     ]
     return plot_trace
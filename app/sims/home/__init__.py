@@ -4,18 +4,22 @@
 - Method overview
 - Spin system overview
 """
+import json
+
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
+import dash_extensions as de
 import dash_html_components as html
 import numpy as np
-from dash.dependencies import ClientsideFunction
 from dash.dependencies import Input
 from dash.dependencies import Output
 from dash.dependencies import State
+from dash.exceptions import PreventUpdate
 
 from .modal import modal
 from app import app
 from app.custom_widgets import custom_button
+from app.sims.store import session_store
 
 
 def edit_sample_info_button_ui():
@@ -30,7 +34,7 @@ def edit_sample_info_button_ui():
 
 def download_session_ui():
     """Download session"""
-    session_link = html.A(id="download-session-link", style={"display": "none"})
+    session_download = de.Download(id="download-session")
     session_button = custom_button(
         icon_classname="fas fa-file-download fa-lg",
         tooltip="Click to download the session",
@@ -39,15 +43,20 @@ def download_session_ui():
         module="html",
     )
 
-    # callback for downloading session
-    app.clientside_callback(
-        ClientsideFunction(namespace="clientside", function_name="downloadSession"),
-        Output("download-session-link", "href"),
+    # callback for downloading session from the server-side session store
+    @app.callback(
+        Output("download-session", "data"),
         Input("download-session-button", "n_clicks"),
         State("local-simulator-data", "data"),
         prevent_initial_call=True,
     )
-    return html.Div([session_link, session_button])
+    def download_session(n, handle):
+        data = session_store.get(handle, "simulator")
+        if data is None:
+            raise PreventUpdate
+        return dict(content=json.dumps(data), filename="session.mrsim")
+
+    return html.Div([session_download, session_button])
 
 
 def tools():
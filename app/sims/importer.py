@@ -3,7 +3,6 @@ import base64
 import json
 
 import mrsimulator as mrsim
-import numpy as np
 from dash import callback_context as ctx
 from dash import no_update
 from dash.dependencies import ALL
@@ -12,11 +11,7 @@ from dash.dependencies import Input
 from dash.dependencies import Output
 from dash.dependencies import State
 from dash.exceptions import PreventUpdate
-from lmfit import Minimizer
 from lmfit import Parameters
-from lmfit.printfuncs import fitreport_html_table
-from mrsimulator import parse
-from mrsimulator.utils import get_spectral_dimensions
 from mrsimulator.utils import spectral_fitting as sf
 from mrsimulator.utils.spectral_fitting import make_LMFIT_params
 
@@ -26,6 +21,8 @@ from . import method as method_UI
 from . import post_simulation as post_sim_UI
 from . import spin_system as spin_system_UI
 from . import utils as sim_utils
+from .parsing import parse
+from .store import detach_experiments
 from app import app
 from app.utils import load_csdm
 
@@ -87,7 +84,7 @@ __email__ = "srivastava.89@osu.edu"
     Input("select-method", "value"),
     # Input("new-method", "modified_timestamp"),
     # Fitting/Feature triggers
-    Input("trigger-fit", "data"),
+    Input("fit-job-result", "data"),
     Input("trigger-sim", "data"),
     Input("make-lmfit-params", "n_clicks"),
     # State("upload-spin-system-url", "value"),
@@ -146,7 +143,9 @@ def on_decompose_click():
     existing_data = ctx.states["local-mrsim-data.data"]
     print(ctx.inputs["decompose.active"], ctx.states["decompose.n_clicks"])
     decompose = "spin_system" if ctx.inputs["decompose.active"] else "none"
-    existing_data["trigger"] = {"simulate": True, "method_index": False}
+    # The decomposed and summed raw simulations are cached under different keys. The
+    # engine assembles the other one from the cached spin system spectra.
+    existing_data["trigger"] = {"simulate": True, "method_index": []}
     existing_data["config"]["decompose_spectrum"] = decompose
     return prep_valid_data_for_simulation(existing_data)
 
@@ -199,7 +198,7 @@ def save_info_modal():
     existing_data = ctx.states["local-mrsim-data.data"]
     existing_data["name"] = ctx.states["info-name-edit.value"]
     existing_data["description"] = ctx.states["info-description-edit.value"]
-    existing_data["trigger"] = {"simulate": False, "method_index": False}
+    existing_data["trigger"] = {"simulate": False, "method_index": []}
     # Update home overview with the title and description
     home_overview = home_UI.refresh(existing_data)
     out = {
@@ -260,14 +259,14 @@ def on_method_update():
     if new_method["operation"] == "duplicate":
         existing_data["methods"] += [method_data]
         existing_data["signal_processors"] += [{"operations": []}]
-        existing_data["trigger"] = {"simulate": False, "method_index": False}
+        existing_data["trigger"] = {"simulate": False, "method_index": [-1]}
         return generate_outputs(existing_data)
 
     # Delete a method
     if new_method["operation"] == "delete":
         del existing_data["methods"][index]
         del existing_data["signal_processors"][index]
-        existing_data["trigger"] = {"simulate": False, "method_index": False}
+        existing_data["trigger"] = {"simulate": False, "method_index": []}
         return generate_outputs(existing_data, n=0)
 
 
@@ -339,33 +338,14 @@ def add_measurement_to_a_method():
         return sim_utils.on_fail_message(f"FileLoadError: {error_message}")
 
     index = ctx.states["select-method.value"]
-    method = existing_data["methods"][index]
-    method["experiment"] = exp_data.to_dict()
-    spectral_dim = method["spectral_dimensions"]
-
-    mrsim_spectral_dims = get_spectral_dimensions(exp_data, units=True)
-
-    for i, dim in enumerate(mrsim_spectral_dims):
-        spectral_dim[i].update(dim)
+    processor_added = sim_IO.attach_measurement(existing_data, index, exp_data)
+    # the browser only holds a reference to the measurement in the session store.
+    detach_experiments(existing_data)
 
     method_overview = method_UI.refresh(existing_data["methods"])
 
     post_sim_overview = no_update
-    if existing_data["signal_processors"][index] in [None, {"operations": []}]:
-        vector = exp_data.y[0].components[0].real
-        increment = exp_data.x[0].increment.value
-        amp = vector.sum()
-        existing_data["signal_processors"][index]["operations"] = [
-            {"dim_index": [0], "function": "IFFT"},
-            {
-                "dim_index": [0],
-                "FWHM": f"{abs(3*increment)} Hz",
-                "function": "apodization",
-                "type": "Exponential",
-            },
-            {"dim_index": [0], "function": "FFT"},
-            {"factor": abs(amp) / 30, "function": "Scale"},
-        ]
+    if processor_added:
         post_sim_overview = post_sim_UI.refresh(existing_data)
 
     out = {
@@ -405,11 +385,11 @@ def simulate_spectrum():
     if len(mrsim_data["methods"]) == 0 or len(mrsim_data["spin_systems"]) == 0:
         raise PreventUpdate
 
-    sim, processor, saved_params = mrsim.parse(mrsim_data)
+    sim, processor, saved_params = parse(mrsim_data)
     params = Parameters().loads(params_data)
 
     sf.update_mrsim_obj_from_params(params, sim, processor)
-    new_mrsim_data = mrsim.dict(sim, processor, saved_params)
+    new_mrsim_data = detach_experiments(mrsim.dict(sim, processor, saved_params))
     new_mrsim_data["params"] = params.dumps()
 
     out = {
@@ -422,68 +402,13 @@ def simulate_spectrum():
     return sim_utils.expand_output(out)
 
 
-def least_squares_fit():
-    mrsim_data = ctx.states["local-mrsim-data.data"]
-    params_data = ctx.states["params-data.data"]
+def apply_fit_result():
+    """Update the mrsim data with the best fit parameters from a fit job."""
+    fit_data = ctx.inputs["fit-job-result.data"]
 
-    if mrsim_data is None:
-        raise PreventUpdate
-
-    if len(mrsim_data["methods"]) == 0 or len(mrsim_data["spin_systems"]) == 0:
+    if fit_data is None:
         raise PreventUpdate
 
-    # try:
-    sim, processor, _ = mrsim.parse(mrsim_data)
-
-    check_for_exp = np.asarray([mth.experiment is None for mth in sim.methods])
-    check_for_exp = np.where(check_for_exp == 1)[0]
-    if check_for_exp.size != 0:
-        return sim_utils.on_fail_message(
-            "LeastSquaresAnalysisError: Please attach measurement(s) for method(s) at "
-            f"index(es) {check_for_exp} before performing the least-squares analysis."
-        )
-
-    # Keep only the real part of the data
-    for mth in sim.methods:
-        mth.experiment = mth.experiment.real
-
-    # Optimize the script by pre-setting the transition pathways for each spin system
-    # from the method.
-    for sys in sim.spin_systems:
-        sys.transition_pathways = sim.methods[0].get_transition_pathways(sys)
-
-    # noise standard deviation
-    sigma = []
-    for mth in sim.methods:
-        csdm_application = mth.experiment.dependent_variables[0].application
-        sigma.append(
-            1
-            if "com.github.DeepanshS.mrsimulator" not in csdm_application
-            else csdm_application["com.github.DeepanshS.mrsimulator"]["sigma"]
-        )
-    # print("sigma", sigma)
-
-    decompose = sim.config.decompose_spectrum[:]
-    sim.config.decompose_spectrum = "spin_system"
-
-    params = Parameters().loads(params_data)
-
-    minner = Minimizer(sf.LMFIT_min_function, params, fcn_args=(sim, processor, sigma))
-    result = minner.minimize()
-    # print(fit_report(result))
-
-    sim.config.decompose_spectrum = decompose
-    for sys in sim.spin_systems:
-        sys.transition_pathways = None
-
-    if decompose == "none":
-        for mth in sim.methods:
-            mth.simulation = sf.add_csdm_dvs(mth.simulation)
-
-    fit_data = mrsim.dict(sim, processor, result.params)
-
-    fit_data["report"] = fitreport_html_table(result)
-
     spin_system_overview = spin_system_UI.refresh(fit_data["spin_systems"])
     method_overview = method_UI.refresh(fit_data["methods"])
     home_overview = home_UI.refresh(fit_data)
@@ -564,7 +489,7 @@ CALLBACKS = {
     "remove-post_sim-functions": post_sim_UI.on_remove_post_sim_function,
     "select-method": post_sim_UI.on_method_select,
     "trigger-sim": simulate_spectrum,
-    "trigger-fit": least_squares_fit,
+    "fit-job-result": apply_fit_result,
     "make-lmfit-params": make_params,
 }
 
@@ -9,9 +9,10 @@ import mrsimulator as mrsim
 from csdmpy.dependent_variable.download import get_absolute_url_path
 from dash import callback_context as ctx
 from dash.exceptions import PreventUpdate
+from mrsimulator.utils import get_spectral_dimensions
 
-from .utils import assemble_data
-from .utils import on_fail_message
+from .encoding import csdm_dict
+from .store import detach_experiments
 
 __author__ = "Deepansh J. Srivastava"
 __email__ = "srivastava.89@osu.edu"
@@ -57,11 +58,16 @@ def import_mrsim_file():
 
 
 def parse_file_contents(content, spin_sys=False):
+    # the UI modules register callbacks on the dash app. Import them on use, so that
+    # the batch fitting CLI can use this module without the web app.
+    from .utils import assemble_data
+    from .utils import on_fail_message
+
     content = {"spin_systems": content} if spin_sys else content
 
     try:
         data = fix_missing_keys(content)
-        return assemble_data(parse_data(data))
+        return assemble_data(detach_experiments(parse_data(data)))
     except Exception as e:
         message = f"FileReadError: {e}"
         return on_fail_message(message)
@@ -103,3 +109,43 @@ def parse_data(data):
     sim["params"] = params.dumps() if params is not None else None
 
     return sim
+
+
+def attach_measurement(mrsim_data, index, exp_data):
+    """Attach the measurement to the method at `index` of the mrsim data, in place, and
+    update the spectral dimensions of the method from the measurement. When the method
+    has no signal processor operations, add the default apodization and scaling. Return
+    True when the default operations are added.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+        int index: The index of the method.
+        CSDM exp_data: The measurement.
+    """
+    method = mrsim_data["methods"][index]
+    method["experiment"] = csdm_dict(exp_data)
+    spectral_dim = method["spectral_dimensions"]
+
+    mrsim_spectral_dims = get_spectral_dimensions(exp_data, units=True)
+
+    for i, dim in enumerate(mrsim_spectral_dims):
+        spectral_dim[i].update(dim)
+
+    if mrsim_data["signal_processors"][index] not in [None, {"operations": []}]:
+        return False
+
+    vector = exp_data.y[0].components[0].real
+    increment = exp_data.x[0].increment.value
+    amp = vector.sum()
+    mrsim_data["signal_processors"][index]["operations"] = [
+        {"dim_index": [0], "function": "IFFT"},
+        {
+            "dim_index": [0],
+            "FWHM": f"{abs(3*increment)} Hz",
+            "function": "apodization",
+            "type": "Exponential",
+        },
+        {"dim_index": [0], "function": "FFT"},
+        {"factor": abs(amp) / 30, "function": "Scale"},
+    ]
+    return True
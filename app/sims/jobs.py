@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""Background jobs for the long running computations, such as the least-squares fit.
+The jobs run on the celery workers of `celery_app` when a worker is available, and in a
+thread pool of the server process otherwise.
+
+The backend is selected with the MRSIM_JOB_BACKEND environment variable,
+    - auto (default): celery if a worker responds to a ping, else local.
+    - celery: Always submit the jobs to the celery workers.
+    - local: Run the jobs in the server process. Requires a single server process.
+
+The status of a job is a dict with keys
+    - state: One of PENDING, PROGRESS, CANCELLING, SUCCESS, FAILURE, CANCELLED, or
+      RELEASED, the state of a finished job after its status is released with
+      `JobManager.release`. A cancelled job is CANCELLING until it stops at its next
+      progress update, and only then CANCELLED.
+    - progress: The last progress info reported by the job, or None.
+    - result: The return value of the job when the state is SUCCESS, else None.
+    - error: The error message when the state is FAILURE, else None.
+
+Jobs submitted with a session id checkpoint the best fit parameters to the session
+store. With the celery backend, the session store must be shared with the workers, that
+is, MRSIM_SESSION_STORE must be redis, the default with REDIS_URL, or disk.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import states
+from celery.contrib.abortable import AbortableAsyncResult
+
+from .cache import LRUCache
+from .fitting import Cancelled
+from .fitting import fit_checkpoint
+from .tasks import JOBS
+from .tasks import run_job
+from app import celery_app
+from app.utils import slogger
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+# Time in seconds for which the result of a celery worker ping is reused.
+PING_INTERVAL = 60
+
+
+def job_status(state, progress=None, result=None, error=None):
+    return {"state": state, "progress": progress, "result": result, "error": error}
+
+
+class LocalJobs:
+    """Run the jobs in a thread pool of the server process.
+
+    Args:
+        max_workers: Number of jobs running at the same time.
+    """
+
+    name = "local"
+
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job"
+        )
+        # job id -> (status, cancel event)
+        self._jobs = LRUCache(maxsize=1024)
+
+    def submit(self, name, *args, session=None):
+        """Submit the job `name` with the given arguments and return the job id."""
+        job_id = uuid.uuid4().hex
+        self._jobs.set(job_id, (job_status("PENDING"), threading.Event()))
+        self._executor.submit(self._work, job_id, name, args, session)
+        return job_id
+
+    def _work(self, job_id, name, args, session):
+        status, cancel = self._jobs.get(job_id)
+        if cancel.is_set():
+            status.update(state="CANCELLED")
+            return
+
+        def progress(info):
+            status["progress"] = info
+            return cancel.is_set()
+
+        status["state"] = "PROGRESS"
+        try:
+            with fit_checkpoint(session, progress) as progress:
+                result = JOBS[name](*args, progress=progress)
+            status.update(state="SUCCESS", result=result)
+        except Cancelled:
+            status.update(state="CANCELLED")
+        except Exception as e:
+            status.update(state="FAILURE", error=str(e))
+
+    def status(self, job_id):
+        """Return the status of the job."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return job_status("FAILURE", error="Job not found.")
+        status, cancel = job
+        if cancel.is_set() and status["state"] in ["PENDING", "PROGRESS"]:
+            return dict(status, state="CANCELLING")
+        return dict(status)
+
+    def cancel(self, job_id):
+        """Request the cancellation of the job."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job[1].set()
+
+    def release(self, job_id):
+        """Remove the status of the finished job."""
+        self._jobs.pop(job_id)
+
+
+class CeleryJobs:
+    """Run the jobs on the celery workers."""
+
+    name = "celery"
+
+    def submit(self, name, *args, session=None):
+        """Submit the job `name` with the given arguments and return the job id."""
+        return run_job.apply_async(args=[name, *args], kwargs={"session": session}).id
+
+    def status(self, job_id):
+        """Return the status of the job."""
+        task = AbortableAsyncResult(job_id, app=celery_app)
+        state = task.state
+
+        if state == "SUCCESS":
+            output = task.result
+            return job_status(output["state"], result=output["result"])
+        if state == "FAILURE":
+            return job_status(state, error=str(task.result))
+        # the task is still running, until it returns the CANCELLED output.
+        if state == "ABORTED":
+            return job_status("CANCELLING")
+        if state == "PROGRESS":
+            return job_status(state, progress=task.info)
+        return job_status("PENDING")
+
+    def cancel(self, job_id):
+        """Request the cancellation of the job."""
+        task = AbortableAsyncResult(job_id, app=celery_app)
+        # aborting overwrites the result of a finished task.
+        if task.state not in states.READY_STATES:
+            task.abort()
+
+    def release(self, job_id):
+        """Remove the result of the finished job from the result backend."""
+        AbortableAsyncResult(job_id, app=celery_app).forget()
+
+
+class JobManager:
+    """Submit the jobs to the celery workers or the local thread pool.
+
+    Args:
+        str backend: One of 'auto', 'celery', or 'local'.
+        max_workers: Number of jobs running at the same time in the local thread pool.
+    """
+
+    def __init__(self, backend="auto", max_workers=2):
+        self.backend = backend
+        self.backends = {"celery": CeleryJobs(), "local": LocalJobs(max_workers)}
+        self._ping = (0.0, False)
+        # ids of the released jobs, which a forgotten celery task reports as PENDING.
+        self._released = LRUCache(maxsize=1024)
+
+    def celery_available(self):
+        """Return True when a celery worker responds to a ping."""
+        last_ping, available = self._ping
+        if time.time() - last_ping > PING_INTERVAL:
+            try:
+                available = celery_app.control.ping(timeout=0.5) != []
+            except Exception as e:
+                slogger("celery_available", f"ping failed: {e}")
+                available = False
+            self._ping = (time.time(), available)
+        return available
+
+    def submit(self, name, *args, session=None):
+        """Submit the job `name` and return its handle, {"id", "backend"}. The best
+        parameters of the fit are checkpointed for the session, if given."""
+        backend = self.backend
+        if backend == "auto":
+            backend = "celery" if self.celery_available() else "local"
+        job_id = self.backends[backend].submit(name, *args, session=session)
+        return {"id": job_id, "backend": backend}
+
+    def status(self, handle):
+        """Return the status of the job referenced by the handle."""
+        if handle["id"] in self._released:
+            return job_status("RELEASED")
+        return self.backends[handle["backend"]].status(handle["id"])
+
+    def release(self, handle):
+        """Release the status and the result of the finished job referenced by the
+        handle, once the result is handled. Later queries return the RELEASED state."""
+        self._released.set(handle["id"], True)
+        self.backends[handle["backend"]].release(handle["id"])
+
+    def cancel(self, handle):
+        """Request the cancellation of the job referenced by the handle."""
+        self.backends[handle["backend"]].cancel(handle["id"])
+
+
+job_manager = JobManager(
+    backend=os.environ.get("MRSIM_JOB_BACKEND", "auto"),
+    max_workers=int(os.environ.get("MRSIM_JOB_WORKERS", 2)),
+)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
+import csdmpy as cp
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
@@ -18,6 +19,7 @@ from .modal import method_selection_modal
 from app import app
 from app.custom_widgets import custom_button
 from app.sims import post_simulation as ps
+from app.sims.store import session_store
 
 
 __author__ = ["Deepansh J. Srivastava"]
@@ -273,10 +275,14 @@ def sigma_helper(x0, dx, shape_x0, shape_x1, y_values):
     Output("measurement-sigma", "value"),
     Input("calc-sigma-button", "n_clicks"),
     State("nmr_spectrum", "figure"),  # Graph selection and values
+    State("local-simulator-data", "data"),
+    State("select-method", "value"),
     prevent_initial_call=True,
 )
-def calculate_sigma(n1, fig):
-    """Calculates standard deviation of noise on selected part of graph"""
+def calculate_sigma(n1, fig, handle, method_index):
+    """Calculates standard deviation of noise on selected part of graph. The plotted
+    traces are decimated, so the full resolution experiment is read from the session
+    store."""
     print("sigma btn")
     # print(fig)
 
@@ -296,18 +302,28 @@ def calculate_sigma(n1, fig):
         # Display error message "please draw a rect or circle?"
         raise PreventUpdate
 
-    exp = next((item for item in fig["data"] if item["name"] == "experiment"), None)
+    sim_data = session_store.get(handle, "simulator")
+    exp = None
+    if sim_data is not None and method_index is not None:
+        exp = sim_data["methods"][method_index].get("experiment", None)
     if exp is None:
         print("experiment not found in figure")
         # Display error message "experiment not found in figure?"
         raise PreventUpdate
 
+    # same frequency axis as the plotted experiment.
+    exp = cp.parse_dict(exp).real
+    dim = exp.x[0]
+    if dim.origin_offset.value != 0:
+        dim.to("ppm", "nmr_frequency_ratio")
+    x = dim.coordinates.value
+
     return sigma_helper(
-        x0=exp["x0"],
-        dx=exp["dx"],
+        x0=x[0],
+        dx=x[1] - x[0],
         shape_x0=shape["x0"],
         shape_x1=shape["x1"],
-        y_values=exp["y"],
+        y_values=exp.y[0].components[0].tolist(),
     )
 
 
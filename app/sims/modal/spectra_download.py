@@ -10,10 +10,12 @@ from dash.dependencies import ClientsideFunction
 from dash.dependencies import Input
 from dash.dependencies import Output
 from dash.dependencies import State
+from dash.exceptions import PreventUpdate
 from dash_extensions.snippets import send_bytes
 
 from app import app
 from app.custom_widgets import custom_button
+from app.sims.store import session_store
 
 
 __author__ = "Matthew D. Giammar"
@@ -227,7 +229,10 @@ def download_html():
 
 def download_csdf():
     """Download spectrum data as csdf file"""
-    csdf_dict = ctx.states["local-processed-data.data"]
+    handle = ctx.states["local-processed-data.data"]
+    csdf_dict = session_store.get(handle, "processed")
+    if csdf_dict is None:
+        raise PreventUpdate
 
     return dict(content=json.dumps(csdf_dict), filename="spectrum.csdf")
 
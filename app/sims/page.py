@@ -0,0 +1,532 @@
+# -*- coding: utf-8 -*-
+import os
+
+import csdmpy as cp
+import dash_bootstrap_components as dbc
+import dash_core_components as dcc
+import dash_html_components as html
+import numpy as np
+import plotly.graph_objs as go
+from dash import callback_context as ctx
+from dash import no_update
+from dash.dependencies import Input
+from dash.dependencies import Output
+from dash.dependencies import State
+from dash.exceptions import PreventUpdate
+from mrsimulator.utils.spectral_fitting import add_csdm_dvs
+
+from . import engine
+from . import navbar
+from .cache import LRUCache
+from .encoding import compact_simulator
+from .encoding import csdm_dict
+from .features import features_body
+from .fit_report import fit_report_body
+from .graph import apply_relayout
+from .graph import DEFAULT_FIGURE
+from .graph import default_layout
+from .graph import partial_traces
+from .graph import plot_1D_trace
+from .graph import plot_2D_trace
+from .graph import spectrum_body
+from .graph import visible_range
+from .home import home_body
+from .method import method_body
+from .parsing import parse_processor
+from .parsing import parse_simulator
+from .scheduler import simulation_scheduler
+from .scheduler import Superseded
+from .sidebar import sidebar
+from .spin_system import spin_system_body
+from .store import session_store
+from app import app
+from app.utils import slogger
+
+__author__ = ["Deepansh J. Srivastava", "Matthew D. Giammar"]
+__email__ = ["srivastava.89@osu.edu", "giammar.7@osu.edu"]
+
+DEFAULT_MRSIM_DATA = {
+    "name": "",
+    "description": "",
+    "spin_systems": [],
+    "methods": [],
+    "config": {},
+}
+
+# Decoded spectra of the recently plotted methods, keyed by (session, version, method).
+SPECTRA_CACHE = LRUCache(maxsize=int(os.environ.get("MRSIM_SPECTRA_CACHE_SIZE", 16)))
+
+# storage data
+store = [
+    # memory for holding the spin systems data.
+    dcc.Store(id="local-mrsim-data", storage_type="session", data=DEFAULT_MRSIM_DATA),
+    # handle to the simulator data held in the server-side session store.
+    dcc.Store(id="local-simulator-data", storage_type="memory"),
+    # store graph view data.
+    # dcc.Store(id="graph-view-layout", storage_type="memory", data=[]),
+    # memory for storing the experimental data
+    # dcc.Store(id="local-exp-external-data", storage_type="memory"),
+    # memory for storing the local computed data.
+    # dcc.Store(id="local-computed-data", storage_type="memory"),
+    # Serialization of csdmpy object holding sim, exp, and residue spectrum
+    # handle to the computed + processed data held in the server-side session store.
+    # Processing over the computed data is less computationally expensive.
+    dcc.Store(id="local-processed-data", storage_type="memory"),
+    # traces and layout of the spectrum, rendered into the figure in the browser.
+    dcc.Store(id="nmr-spectrum-traces", storage_type="memory"),
+    # tokens of the traces held by the browser.
+    dcc.Store(id="nmr-spectrum-tokens", storage_type="memory"),
+    # memory for holding the method data
+    # dcc.Store(id="local-method-data", storage_type="memory"),
+    dcc.Store(id="new-spin-system", storage_type="memory"),
+    dcc.Store(id="new-method", storage_type="memory"),
+    # store a bool indicating if the data is from an external file
+    dcc.Store(id="config", storage_type="memory"),
+    # method-template data
+    dcc.Store(id="add-method-from-template", storage_type="memory"),
+    dcc.Store(id="user-config", storage_type="local"),
+]
+store_items = html.Div(store)
+
+# alert items
+simulation_alert = dbc.Alert(
+    id="alert-message-simulation",
+    color="danger",
+    dismissable=True,
+    fade=True,
+    is_open=False,
+)
+
+import_alert = dbc.Alert(
+    id="alert-message-import",
+    color="danger",
+    dismissable=True,
+    fade=True,
+    is_open=False,
+)
+
+graph_alert = dbc.Alert(
+    id="alert-message-spectrum",
+    color="danger",
+    dismissable=True,
+    fade=True,
+    is_open=False,
+)
+
+# top and bottom navbar items
+top_nav = html.Div([navbar.navbar_top, simulation_alert, import_alert, graph_alert])
+bottom_nav = navbar.navbar_bottom
+
+# main body items
+body_content = [
+    home_body,
+    spin_system_body,
+    method_body,
+    features_body,
+    fit_report_body,
+    spectrum_body,
+]
+main_body = html.Div(body_content, className="mobile-scroll")
+
+# temp items
+temp = [html.Div(id=f"temp{i}") for i in range(10)]
+
+# content page
+content = html.Div([*temp, main_body, store_items, bottom_nav], className="app-1")
+
+# main app content
+mrsimulator_app = html.Div(
+    [top_nav, html.Div([sidebar, content], className="mrsim-page")]
+)
+
+
+# ==================================================================================== #
+
+
+# Main function. Evaluates the spectrum and update the plot.
+@app.callback(
+    Output("alert-message-simulation", "children"),
+    Output("alert-message-simulation", "is_open"),
+    # Output("local-computed-data", "data"),
+    Output("local-simulator-data", "data"),
+    # Output("graph-view-layout", "data"),
+    Input("local-mrsim-data", "data"),
+    State("local-simulator-data", "data"),
+    # State("graph-view-layout", "data"),
+    prevent_initial_call=True,
+)
+def simulation(*args):
+    """Evaluate the spectrum and update the plot."""
+
+    if not ctx.triggered:
+        slogger("simulation", "simulation stopped, ctx not triggered")
+        raise PreventUpdate
+
+    mrsim_data = ctx.inputs["local-mrsim-data.data"]
+    handle = ctx.states["local-simulator-data.data"]
+
+    if mrsim_data is None:
+        raise PreventUpdate
+
+    # the browser only holds a handle to the data in the server-side session store.
+    session = session_store.new_session() if handle is None else handle["session"]
+
+    # Simulations run in the worker pool of the scheduler, one per session. A newer
+    # update from the same session abandons this one.
+    try:
+        return simulation_scheduler.run(
+            session, one_time_simulation, mrsim_data, session
+        )
+    except Superseded:
+        slogger("simulation", "simulation superseded by a newer update")
+        raise PreventUpdate
+
+
+def one_time_simulation(mrsim_data, session, checkpoint=None):
+    """Simulate the spectra of `mrsim_data` and store the serialized simulator in the
+    session store. Runs outside the request context, so does not use callback_context.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+        str session: The session id.
+        checkpoint: Optional callable, called before simulating each method.
+    """
+    # n_sys = 1 if "spin_systems" not in mrsim_data else len(mrsim_data["spin_systems"])
+
+    if len(mrsim_data["methods"]) == 0:
+        return [
+            no_update,
+            no_update,
+            session_store.put(session, "simulator", mrsim_data),
+        ]
+
+    try:
+        sim = parse_simulator(mrsim_data)
+        decompose = sim.config.decompose_spectrum[:]
+        # spectra are only kept per spin system when the plot or the processing uses
+        # the decomposition.
+        process_data = mrsim_data["signal_processors"]
+        keep = engine.needs_decomposition(mrsim_data["config"], process_data)
+        engine.run(sim, mrsim_data, checkpoint, decompose=keep)
+    except Superseded:
+        raise
+    except Exception as e:
+        return [f"SimulationError: {e}", True, no_update]
+
+    # The engine returns the raw simulation. Signal processing is always applied here,
+    # so processor-only updates skip the simulation and only re-apply the operations.
+    for proc, mth in zip(process_data, sim.methods):
+        processor = parse_processor(proc)
+
+        mth.simulation = processor.apply_operations(data=mth.simulation).real
+
+    if decompose == "none" and keep:
+        for mth in sim.methods:
+            mth.simulation = add_csdm_dvs(mth.simulation)
+
+    # spectra are serialized as base64 binary when MRSIM_COMPACT_SPECTRA is set.
+    compact_simulator(sim)
+    serialize = sim.json(include_methods=True, include_version=True)
+    serialize["signal_processors"] = process_data
+
+    # add parameters to serialization if present
+    if "params" in mrsim_data:
+        serialize["params"] = mrsim_data["params"]
+
+    # layout = ctx.states["graph-view-layout.data"]
+    # for _ in range(len(sim.methods)-len(layout)):
+    #     layout.append(None)
+
+    # for i, mth in enumerate(sim.methods):
+    #     if layout[i] is None:
+    #         if len(mth.simulation.x) == 1:
+    #             x = mth.simulation.x[0].coordinates.value
+    #             y = mth.simulation.y[0].components[0].real
+    #             layout[i] = {
+    #                 'xaxis': {"range": [x.max(), x.min()]},
+    #                 'yaxis': {"range": [y.min(), y.max()]}
+    #             }
+
+    return ["", False, session_store.put(session, "simulator", serialize)]
+
+
+@app.callback(
+    Output("nmr-spectrum-traces", "data"),
+    Output("local-processed-data", "data"),
+    # Output("last-method-index", "data"),
+    # Input("local-computed-data", "modified_timestamp"),
+    Input("local-simulator-data", "data"),
+    Input("select-method", "value"),
+    Input("nmr_spectrum", "relayoutData"),
+    # State("local-computed-data", "data"),
+    # State("graph-view-layout", "data"),
+    State("local-mrsim-data", "data"),
+    State("nmr-spectrum-tokens", "data"),
+    prevent_initial_call=True,
+)
+def plot(*args):
+    """Generate and return the traces and the layout of the plot. The traces are not
+    normalized, and the figure is rendered from the traces in the browser. The traces
+    already held by the browser are sent as stubs, and the figure is never sent to the
+    server."""
+    # time_of_computation = ctx.inputs["local-computed-data.modified_timestamp"]
+    trigger = ctx.triggered[0]["prop_id"]
+    trigger_id = trigger.split(".")[0]
+
+    handle = ctx.inputs["local-simulator-data.data"]
+
+    # sim_data is None when there is no handle or the session data has expired from
+    # the server-side store.
+    sim_data = session_store.get(handle, "simulator")
+
+    if sim_data is None:
+        return [DEFAULT_FIGURE, no_update]
+
+    if sim_data["methods"] == []:
+        return [DEFAULT_FIGURE, no_update]
+
+    method_index = ctx.inputs["select-method.value"]
+
+    if method_index is None:
+        raise PreventUpdate
+
+    mth = sim_data["methods"][method_index]
+
+    # [item["simulation"] for item in sim_data["methods"]]
+
+    # print("inside plot, time of computation", time_of_computation)
+    print("method_index", method_index)
+    # if method_index is None or method_options == []:
+    # return [DEFAULT_FIGURE, no_update]
+
+    # if not ctx.triggered:
+    #     raise PreventUpdate
+
+    # only zooming along the frequency axes of the spectrum re-fetches the traces.
+    relayout = ctx.inputs["nmr_spectrum.relayoutData"]
+    n_dims = len(mth["spectral_dimensions"])
+    if trigger_id == "nmr_spectrum" and not zoomed(relayout, n_dims):
+        raise PreventUpdate
+
+    # Let graph resize ranges if new method has been selected
+    mrsim_data = ctx.states["local-mrsim-data.data"]
+    view = plot_view(handle["session"], trigger_id, relayout, mrsim_data)
+    ranges = [visible_range(view["xaxis"]), visible_range(view["yaxis"])]
+
+    decompose = False
+    if "decompose_spectrum" in sim_data["config"]:
+        decompose = sim_data["config"]["decompose_spectrum"] == "spin_system"
+
+    print("plot trigger, trigger id", trigger, trigger_id)
+
+    spectra = decoded_spectra(handle, method_index, mth)
+    exp_data, sim_data = spectra["experiment"], spectra["simulation"]
+
+    plot_trace = []
+    if exp_data is not None:
+        plot_trace += get_plot_trace(exp_data, name="experiment", ranges=ranges)
+
+    if sim_data is not None:
+        plot_trace += get_plot_trace(
+            sim_data, decompose=decompose, name="simulation", ranges=ranges
+        )
+
+    if spectra["residual"] is not None:
+        plot_trace += get_plot_trace(
+            spectra["residual"], name="residual", ranges=ranges
+        )
+
+    # layout_graph = ctx.states['graph-view-layout.data'][method_index]
+    # layout.update(layout_graph)
+
+    # the browser keeps the zoom state of the graph until the ui revision changes.
+    layout = go.Layout(default_layout)
+    layout.update(xaxis=view["xaxis"], yaxis=view["yaxis"], uirevision=view["revision"])
+
+    # the traces of every spin system are shown when the spectrum is decomposed.
+    tokens = ctx.states["nmr-spectrum-tokens.data"]
+    data_object = {
+        "data": partial_traces(plot_trace, tokens),
+        "layout": layout,
+        "decompose": decompose,
+    }
+
+    if trigger_id in [
+        "local-exp-external-data",
+        "nmr_spectrum",
+    ]:
+        return [data_object, no_update]
+    if sim_data is None:
+        return [data_object, no_update]
+
+    processed = session_store.put(handle["session"], "processed", spectra["processed"])
+    return [data_object, processed]
+
+
+def decoded_spectra(handle, method_index, mth):
+    """Return the decoded spectra of the method from the cache, keyed by the session,
+    the version of the simulator data, and the method index, so that re-plotting or
+    switching between methods parses no JSON. See `decode_spectra`.
+
+    Args:
+        dict handle: The handle to the simulator data in the session store.
+        int method_index: The index of the method.
+        dict mth: The method dict of the simulator data.
+    """
+    key = (handle["session"], handle["version"], method_index)
+    spectra = SPECTRA_CACHE.get(key)
+    if spectra is None:
+        spectra = decode_spectra(mth)
+        SPECTRA_CACHE.set(key, spectra)
+    return spectra
+
+
+def decode_spectra(mth):
+    """Return a dict of the experiment, simulation, and residual CSDM objects of the
+    method, with the dimensionless axes in ppm, and the dict of the processed CSDM
+    object for the session store. The missing spectra are None.
+
+    Args:
+        dict mth: The method dict of the simulator data.
+    """
+    simulation_data = mth.get("simulation")
+    experiment_data = mth.get("experiment")
+    spectra = dict.fromkeys(["experiment", "simulation", "residual", "processed"])
+
+    dim_axes = None
+    if experiment_data is not None:
+        dim_axes = made_dimensionless(experiment_data)
+        spectra["experiment"] = to_ppm(cp.parse_dict(experiment_data).real, dim_axes)
+
+    if simulation_data is None:
+        return spectra
+
+    sim_data = to_ppm(cp.parse_dict(simulation_data).real, dim_axes)
+    spectra["simulation"] = sim_data
+    args = (sim_data,)
+
+    if experiment_data is not None:
+        exp_data = spectra["experiment"]
+        index = [-i - 1 for i, x in enumerate(exp_data.x) if x.increment.value < 0]
+        residue = exp_data.copy()
+        sim_sum = np.asarray([y.components for y in sim_data.y]).sum(axis=0)
+        residue.y[0].components -= np.flip(sim_sum, axis=tuple(index))
+        spectra["residual"] = residue
+        args = (sim_data, exp_data, residue)
+
+    spectra["processed"] = csdm_dict(construct_csdm_object(*args))
+    return spectra
+
+
+def plot_view(session, trigger_id, relayout, mrsim_data):
+    """Return the view of the graph, a dict of the x and y axis ranges and the ui
+    revision. The view is held in the session store, so that the figure is not sent
+    to the server. The ranges of a zoom event are applied to the view. The graph
+    resizes the ranges, with a new ui revision, when a new method is selected, else
+    the view is kept.
+
+    Args:
+        str session: The session id.
+        str trigger_id: The id of the component that triggered the plot callback.
+        dict relayout: The relayout data of the graph.
+        dict mrsim_data: The mrsim json data.
+    """
+    view = session_store.load(session, "view")
+
+    trigger = mrsim_data["trigger"] if "trigger" in mrsim_data else None
+    new_data = trigger is not None and trigger["method_index"] is None
+    reset = trigger_id != "nmr_spectrum" and (new_data or trigger_id == "select-method")
+    if view is None or reset:
+        view = {
+            "xaxis": {"autorange": "reversed"},
+            "yaxis": {"autorange": True},
+            "revision": 0 if view is None else view["revision"] + 1,
+        }
+    if trigger_id == "nmr_spectrum":
+        apply_relayout(view, relayout)
+
+    session_store.save(session, "view", view)
+    return view
+
+
+def zoomed(relayout, n_dims):
+    """Return True when the relayout data changes the range of the frequency axes.
+
+    Args:
+        dict relayout: The relayout data of the graph.
+        int n_dims: Number of spectral dimensions of the plotted method.
+    """
+    axes = ("xaxis.", "yaxis.") if n_dims == 2 else ("xaxis.",)
+    return relayout is not None and any(key.startswith(axes) for key in relayout)
+
+
+def construct_csdm_object(sim, exp=None, residual=None):
+    """Makes sure the increment of the passed csdm object is negative"""
+
+    def add_dv(parrent, to_add):
+        y = to_add.y[0].components
+        index = [-i - 1 for i, x in enumerate(to_add.x) if x.increment.value < 0]
+        parrent.add_y(
+            cp.DependentVariable(
+                type="internal",
+                components=y if index == [] else np.flip(y, axis=tuple(index)),
+                quantity_name="dimensionless",
+                quantity_type="scalar",
+            )
+        )
+
+    csdm_obj = sim.copy()
+
+    # Add experimental data if present
+    if exp is not None:
+        add_dv(csdm_obj, exp)
+
+    # Add residual data if present
+    if residual is not None:
+        add_dv(csdm_obj, residual)
+
+    return csdm_obj
+
+
+def made_dimensionless(exp):
+    return [
+        False
+        if "origin_offset" not in item
+        else cp.ScalarQuantity(item["origin_offset"]).quantity.value != 0
+        for item in exp["csdm"]["dimensions"]
+    ]
+
+
+def to_ppm(data, dimensionless_axes=None):
+    """Convert the dimensionless axes of the CSDM object to ppm in place and return
+    the object.
+
+    Args:
+        CSDM data: The CSDM object.
+        list dimensionless_axes: Flags of the dimensionless axes. The default is all
+            axes.
+    """
+    dimensionless_axes = (
+        dimensionless_axes
+        if dimensionless_axes is not None
+        else [True] * len(data.dimensions)
+    )
+    _ = [
+        dim.to("ppm", "nmr_frequency_ratio")
+        for item, dim in zip(dimensionless_axes, data.dimensions)
+        if item
+    ]
+    return data
+
+
+def get_plot_trace(data, decompose=False, name="", ranges=None):
+    plot_trace = []
+
+    ranges = [None, None] if ranges is None else ranges
+    if len(data.dimensions) == 1:
+        plot_trace += plot_1D_trace(data, decompose, name, ranges[0])
+
+    if len(data.dimensions) == 2:
+        plot_trace += plot_2D_trace(data, decompose, name, *ranges)
+
+    return plot_trace
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Parsing of the mrsim json data with a cache of the parsed objects. Every spin system,
+method, and signal processor is parsed once and cached by the content hash of its
+serialization. An update to one spin system or method only parses that item, and the
+unchanged items are deep copies of the cached objects."""
+import os
+
+import csdmpy as cp
+from lmfit import Parameters
+from mrsimulator import Method
+from mrsimulator import Simulator
+from mrsimulator import SpinSystem
+from mrsimulator.signal_processing import SignalProcessor
+
+from .cache import content_hash
+from .cache import LRUCache
+from .engine import method_key
+from .store import load_experiment
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+PARSE_CACHE = LRUCache(maxsize=int(os.environ.get("MRSIM_PARSE_CACHE_SIZE", 4096)))
+
+
+def parse_item(cls, py_dict):
+    """Return a copy of the object parsed with `cls.parse_dict_with_units(py_dict)`.
+
+    Args:
+        cls: One of SpinSystem, Method, or SignalProcessor class.
+        dict py_dict: The object serialized with units.
+    """
+    key = content_hash(cls.__name__, py_dict)
+    obj = PARSE_CACHE.get(key)
+    if obj is None:
+        obj = cls.parse_dict_with_units(py_dict)
+        PARSE_CACHE.set(key, obj)
+    # callers modify the parsed objects. Never hand out the cached object.
+    return obj.copy(deep=True)
+
+
+def parse_simulator(mrsim_data):
+    """Same as `Simulator.parse_dict_with_units(mrsim_data)`.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+    """
+    py_dict = dict(mrsim_data)
+    if "spin_systems" in py_dict:
+        py_dict["spin_systems"] = [
+            parse_item(SpinSystem, item) for item in py_dict["spin_systems"]
+        ]
+    if "methods" in py_dict:
+        py_dict["methods"] = [parse_method(item) for item in py_dict["methods"]]
+    return Simulator(**py_dict)
+
+
+def parse_method(py_dict):
+    """Same as `Method.parse_dict_with_units(py_dict)`. Only the method without the
+    simulation and experiment is hashed and cached. The large simulation and experiment
+    are parsed on every call and attached to the copy of the cached method. A reference
+    to an experiment in the session store is replaced by the stored experiment.
+
+    Args:
+        dict py_dict: The method serialized with units.
+    """
+    method = parse_item(Method, method_key(py_dict))
+    for name in ["simulation", "experiment"]:
+        item = py_dict.get(name, None)
+        if isinstance(item, dict):
+            item = load_experiment(item) if name == "experiment" else item
+            setattr(method, name, cp.parse_dict(item))
+    return method
+
+
+def parse_processor(py_dict):
+    """Same as `SignalProcessor.parse_dict_with_units(py_dict)`.
+
+    Args:
+        dict py_dict: The signal processor serialized with units.
+    """
+    return parse_item(SignalProcessor, py_dict)
+
+
+def parse(mrsim_data):
+    """Same as `mrsimulator.parse(mrsim_data)`. Return the Simulator object, the list of
+    SignalProcessor objects, and the LMFIT Parameters object, if present.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+    """
+    sim = parse_simulator(mrsim_data)
+
+    processors = mrsim_data.get("signal_processors", None)
+    processors = (
+        [SignalProcessor() for _ in sim.methods]
+        if processors is None
+        else [parse_processor(item) for item in processors]
+    )
+
+    params = mrsim_data.get("params", None)
+    params = None if params is None else Parameters().loads(params)
+    return sim, processors, params
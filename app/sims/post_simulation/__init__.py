@@ -6,13 +6,13 @@ import dash_html_components as html
 from dash import callback_context as ctx
 from dash import no_update
 from dash.exceptions import PreventUpdate
-from mrsimulator import parse
-from mrsimulator import signal_processing as sp
 from mrsimulator.utils.spectral_fitting import make_LMFIT_params
 
 from . import baseline as Baseline
 from . import convolution as Convolution
 from . import scale as Scale
+from app.sims.parsing import parse
+from app.sims.parsing import parse_processor
 from app.sims.utils import expand_output
 from app.sims.utils import update_processor_ui
 
@@ -147,13 +147,13 @@ def on_submit_signal_processor_button():
 
     # refresh lmfit parameters for signal processor processor
     sim, pd, _ = parse(existing_data)
-    processors = [
-        sp.SignalProcessor.parse_dict_with_units(mth_proc)
-        for mth_proc in existing_process_data
-    ]
+    processors = [parse_processor(mth_proc) for mth_proc in existing_process_data]
     params = make_LMFIT_params(sim, processors, include={"rotor_frequency"})
     existing_data["params"] = params.dumps()
-    existing_data["trigger"] = {"simulation": True, "method_index": False}
+
+    # Only the signal processors changed. No method needs a re-simulation, the raw
+    # simulations are restored from the server-side cache and re-processed.
+    existing_data["trigger"] = {"simulation": True, "method_index": []}
 
     out = {
         "alert": ["", False],
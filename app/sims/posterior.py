@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""Posterior sampling of the fit parameters with the affine-invariant ensemble sampler
+of emcee, the sampler behind the 'emcee' method of LMFIT. The walkers start in a small
+ball around the fitted parameters, and their log-probabilities are evaluated over a
+process pool, where every worker holds its own copy of the parsed simulator. The
+posterior summary and the corner plot are appended to the fit report.
+
+When the noise standard deviation of a measurement is not set, the residual is only
+known up to a scale, and the logarithm of the scale of the noise standard deviations is
+sampled as a nuisance parameter, with a uniform prior."""
+import base64
+import io
+
+import emcee
+import numpy as np
+from lmfit import Parameters
+from matplotlib.figure import Figure
+
+from . import engine
+from . import fitting
+from .fitting import Cancelled
+from .fitting import Monitor
+from .fitting import residual_args
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+# The percentiles of the one standard deviation interval of a normal distribution.
+PERCENTILES = [15.87, 50, 84.13]
+
+# Relative spread of the initial walker positions when the parameter has no standard
+# error from the fit.
+START_SPREAD = 1e-4
+
+POSTERIOR_HEADER = "<h2>Posterior</h2>"
+
+# Name of the scale of the noise standard deviations in the posterior summary.
+NOISE_SCALE = "noise_scale"
+
+# Maximum number of parameters of the corner plot. The plot has one panel per parameter
+# pair, and only the summary table is reported for more parameters.
+CORNER_MAX_PARAMETERS = 10
+
+
+def sample_posterior(
+    mrsim_data, params_data, progress=None, steps=500, burn=None, thin=5, seed=None
+):
+    """Sample the posterior distribution of the varying parameters, with uniform priors
+    within the parameter bounds and the chi-square likelihood of the noise weighted
+    residual. Return the mrsim data with the standard errors of the parameters from the
+    posterior, and the fit report with the posterior summary and the corner plot.
+
+    Args:
+        dict mrsim_data: The mrsim json data with the fit report.
+        str params_data: The JSON string of the fitted LMFIT Parameters object.
+        progress: Optional callable, called with a dict of the step number, and the
+            chi-square and parameter values of the best walker after every step.
+            Return True from the callable to cancel.
+        int steps: Number of steps of every walker.
+        int burn: Number of initial steps discarded. The default is a third of steps.
+        int thin: Keep only every `thin` step of the chain.
+        int seed: Seed of the random number generator.
+    """
+    args = residual_args(mrsim_data)
+    params = Parameters().loads(params_data)
+    names = [name for name, par in params.items() if par.vary]
+    burn = steps // 3 if burn is None else burn
+
+    rng = np.random.default_rng(seed)
+    start = initial_positions(params, names, rng)
+    nwalkers = start.shape[0]
+
+    fit_noise = noise_unknown(args[0])
+    if fit_noise:
+        ln_scale = np.log(noise_scale(params, args))
+        start = np.column_stack(
+            [start, ln_scale + 0.01 * rng.standard_normal(nwalkers)]
+        )
+
+    monitor = Monitor(progress, stage="posterior")
+    with WalkerPool(params, args) as pool:
+        # the serial evaluations modify the values of their own copy of the parameters.
+        context = (params.copy(), args) if pool is None else None
+        log_probability = LogProbability(names, params, context, fit_noise)
+        sampler = emcee.EnsembleSampler(
+            nwalkers, start.shape[1], log_probability, pool=pool
+        )
+        if seed is not None:
+            sampler.random_state = np.random.RandomState(seed).get_state()
+
+        for step, state in enumerate(sampler.sample(start, iterations=steps)):
+            best = int(np.argmax(state.log_prob))
+            values = dict(zip(names, state.coords[best]))
+            if monitor.update(values, step + 1, float(-2 * state.log_prob[best])):
+                raise Cancelled
+
+    chain = sampler.get_chain(discard=burn, thin=thin, flat=True)
+    labels = names
+    if fit_noise:
+        chain[:, -1] = np.exp(chain[:, -1])
+        labels = names + [NOISE_SCALE]
+
+    summary = posterior_summary(chain, labels)
+    for name in names:
+        lower, _, upper = summary[name]
+        params[name].stderr = (upper - lower) / 2
+
+    # replace the posterior section of a previous run, if any.
+    report = (mrsim_data.get("report") or "").split(POSTERIOR_HEADER)[0]
+    acceptance = float(np.mean(sampler.acceptance_fraction))
+    report += posterior_html(chain, labels, summary, acceptance)
+    return dict(mrsim_data, params=params.dumps(), report=report)
+
+
+def noise_unknown(sim):
+    """Return True when the noise standard deviation of the measurement of a method is
+    not set, that is, missing or the default of 1 from the method tab.
+
+    Args:
+        Simulator sim: The simulator object with the measurements.
+    """
+    return any(sigma == 1 for sigma in fitting.noise_sigma(sim))
+
+
+def noise_scale(params, args):
+    """Return the root mean square of the noise weighted residual of the parameters,
+    the estimate of the scale of the noise standard deviations.
+
+    Args:
+        Parameters params: The LMFIT Parameters object.
+        tuple args: The arguments of the residual function after the parameters.
+    """
+    resid = fitting.Residual()(params.copy(), *args)
+    return max(float(np.sqrt(np.mean(np.square(resid)))), np.finfo(float).tiny)
+
+
+def initial_positions(params, names, rng):
+    """Return the initial walker positions, a (nwalkers, nvarys) array, in a Gaussian
+    ball around the parameter values, reflected into the parameter bounds. The number
+    of walkers is four times the number of varying parameters, and at least 16.
+
+    Args:
+        Parameters params: The LMFIT Parameters object.
+        list names: Names of the varying parameters.
+        Generator rng: The numpy random number generator.
+    """
+    nwalkers = max(4 * len(names), 16)
+    center = np.asarray([params[name].value for name in names])
+    spread = np.asarray(
+        [
+            params[name].stderr
+            if params[name].stderr
+            else START_SPREAD * max(abs(params[name].value), 1.0)
+            for name in names
+        ]
+    )
+    lower = np.asarray([params[name].min for name in names], dtype=float)
+    upper = np.asarray([params[name].max for name in names], dtype=float)
+    start = center + spread * rng.standard_normal((nwalkers, len(names)))
+    return reflect(start, lower, upper)
+
+
+def reflect(values, lower, upper):
+    """Return the values reflected into the bounds. Clipping would pile the walkers up
+    on the bounds, where they all start from the same position.
+
+    Args:
+        ndarray values: A (nwalkers, nvarys) array.
+        ndarray lower: The lower bounds, possibly -inf.
+        ndarray upper: The upper bounds, possibly inf.
+    """
+    # reflect back and forth between two finite bounds.
+    values = np.array(values, dtype=float)
+    width = upper - lower
+    bounded = np.isfinite(width) & (width > 0)
+    if bounded.any():
+        low, width = lower[bounded], width[bounded]
+        offset = np.mod(values[:, bounded] - low, 2 * width)
+        values[:, bounded] = low + np.where(offset > width, 2 * width - offset, offset)
+
+    # reflect at a single finite bound.
+    values = np.where(values < lower, 2 * lower - values, values)
+    values = np.where(values > upper, 2 * upper - values, values)
+    return np.clip(values, lower, upper)
+
+
+class WalkerPool:
+    """Process pool for the log-probability evaluations of the walkers. Each worker
+    process holds its own copy of the parsed simulator, sent once when the pool starts.
+    The context manager returns None when a process pool is not available, and the
+    walkers are evaluated serially.
+
+    Args:
+        Parameters params: The LMFIT Parameters object.
+        tuple args: The arguments of the residual function after the parameters.
+    """
+
+    def __init__(self, params, args):
+        self.executor = engine.job_pool(fitting.init_fit_worker, (params, args))
+
+    def __enter__(self):
+        return self if self.executor is not None else None
+
+    def __exit__(self, exc_type, *args):
+        # on cancellation, do not wait for the running evaluations.
+        engine.release_job_pool(self.executor, wait=exc_type is None)
+
+    def map(self, fn, iterable):
+        """Same as the map of the process pool, used by emcee."""
+        return self.executor.map(fn, iterable)
+
+
+class LogProbability:
+    """The log-probability of the walker position, with uniform priors within the
+    parameter bounds. Only the parameter names and bounds are sent to the worker
+    processes, which use the parameters and the residual arguments of the worker.
+
+    Args:
+        list names: Names of the varying parameters.
+        Parameters params: The LMFIT Parameters object.
+        tuple context: The parameters and the arguments of the residual function for
+            the serial evaluations. None in the process pool.
+        bool fit_noise: If True, the last coordinate of the walker position is the
+            logarithm of the scale of the noise standard deviations.
+    """
+
+    def __init__(self, names, params, context=None, fit_noise=False):
+        self.names = names
+        self.lower = np.asarray([params[name].min for name in names])
+        self.upper = np.asarray([params[name].max for name in names])
+        self.context = None if context is None else (*context, fitting.Residual())
+        self.fit_noise = fit_noise
+
+    def __getstate__(self):
+        return dict(self.__dict__, context=None)
+
+    def __call__(self, theta):
+        ln_scale = theta[-1] if self.fit_noise else 0.0
+        theta = theta[slice(len(self.names))]
+        if np.any(theta < self.lower) or np.any(theta > self.upper):
+            return -np.inf
+
+        params, args, residual = self.context or fitting._WORKER_CONTEXT
+        for name, value in zip(self.names, theta):
+            params[name].value = value
+        params.update_constraints()
+
+        resid = residual(params, *args)
+        chisqr = float(np.sum(np.square(resid))) * np.exp(-2 * ln_scale)
+        return -0.5 * chisqr - resid.size * ln_scale
+
+
+def posterior_summary(chain, names):
+    """Return a dict of the 15.87, 50, and 84.13 percentiles of every parameter.
+
+    Args:
+        ndarray chain: The flat chain, a (nsamples, nvarys) array.
+        list names: Names of the varying parameters.
+    """
+    percentiles = np.percentile(chain, PERCENTILES, axis=0)
+    return {name: [float(p) for p in percentiles[:, i]] for i, name in enumerate(names)}
+
+
+def posterior_html(chain, names, summary, acceptance):
+    """Return the html of the posterior summary table and the corner plot. The corner
+    plot is skipped above CORNER_MAX_PARAMETERS parameters.
+
+    Args:
+        ndarray chain: The flat chain, a (nsamples, nvarys) array.
+        list names: Names of the varying parameters.
+        dict summary: The percentiles of every parameter from `posterior_summary`.
+        float acceptance: The mean acceptance fraction of the walkers.
+    """
+    head = "".join(f"<th>{name}</th>" for name in ["Parameter", "Median", "-", "+"])
+    rows = "".join(
+        f"<tr><td>{name}</td><td>{median:.6g}</td><td>{median - lower:.3g}</td>"
+        f"<td>{upper - median:.3g}</td></tr>"
+        for name, (lower, median, upper) in summary.items()
+    )
+    html = (
+        f"{POSTERIOR_HEADER}<p>{chain.shape[0]} samples, "
+        f"mean acceptance fraction {acceptance:.3f}</p>"
+        f"<table><tr>{head}</tr>{rows}</table>"
+    )
+    if len(names) > CORNER_MAX_PARAMETERS:
+        return (
+            f"{html}<p>The corner plot is only shown for up to "
+            f"{CORNER_MAX_PARAMETERS} parameters.</p>"
+        )
+    return f'{html}<img src="data:image/png;base64,{corner_png(chain, names)}"/>'
+
+
+def corner_png(chain, names, bins=30):
+    """Return the base64 encoded png of the corner plot of the chain. The diagonal
+    panels are the marginal histograms of the parameters, and the panels below the
+    diagonal are the two-dimensional histograms of the parameter pairs.
+
+    Args:
+        ndarray chain: The flat chain, a (nsamples, nvarys) array.
+        list names: Names of the varying parameters.
+        int bins: Number of histogram bins along every parameter.
+    """
+    n = len(names)
+    fig = Figure(figsize=(2 * n + 1, 2 * n + 1))
+    axes = fig.subplots(n, n, squeeze=False)
+    for i in range(n):
+        for j in range(n):
+            ax = axes[i, j]
+            if j > i:
+                ax.set_axis_off()
+            elif j == i:
+                ax.hist(chain[:, i], bins=bins, histtype="step", color="k")
+                ax.set_yticks([])
+            else:
+                ax.hist2d(chain[:, j], chain[:, i], bins=bins, cmap="Greys")
+            if i == n - 1:
+                ax.set_xlabel(names[j], fontsize=8)
+            if j == 0 and i > 0:
+                ax.set_ylabel(names[i], fontsize=8)
+            ax.tick_params(labelsize=6)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=80)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
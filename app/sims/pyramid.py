@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Multi-resolution pyramid of 2D spectra for the heatmap and contour plots. Every level
+of the pyramid halves the axes longer than MRSIM_PLOT_PIXELS by averaging pairs of
+points, until the coarsest level fits the plot. The figure shows the finest level at
+which the visible window fits within MRSIM_PLOT_PIXELS points along every axis, that
+is, a coarse level for the full spectrum and the full resolution when zoomed in. The
+pyramids are held in an LRU cache, keyed by the content of the spectrum."""
+import hashlib
+import os
+
+import numpy as np
+
+from .cache import LRUCache
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+# Maximum number of points along every axis of a 2D trace sent to the browser.
+PLOT_PIXELS = int(os.environ.get("MRSIM_PLOT_PIXELS", 512))
+
+PYRAMID_CACHE = LRUCache(maxsize=int(os.environ.get("MRSIM_PYRAMID_CACHE_SIZE", 32)))
+
+
+def halve(coordinates, z, axis):
+    """Return the coordinates and the z values averaged over pairs of points along the
+    axis. A trailing odd point is kept as is.
+
+    Args:
+        ndarray coordinates: The coordinates along the axis.
+        ndarray z: The 2D array.
+        int axis: The axis of z along the coordinates.
+    """
+    size = coordinates.size
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (0, size % 2)
+    z = np.pad(z, pad, mode="edge")
+    coordinates = np.pad(coordinates, (0, size % 2), mode="edge")
+
+    if axis == 0:
+        z = z.reshape(-1, 2, z.shape[1]).mean(axis=1)
+    else:
+        z = z.reshape(z.shape[0], -1, 2).mean(axis=2)
+    return coordinates.reshape(-1, 2).mean(axis=1), z
+
+
+def build_pyramid(x, y, z, max_size=PLOT_PIXELS):
+    """Return the list of pyramid levels, (x, y, z) tuples, from the full resolution to
+    the coarsest level, which has at most `max_size` points along every axis.
+
+    Args:
+        ndarray x: The coordinates along the second axis of z.
+        ndarray y: The coordinates along the first axis of z.
+        ndarray z: The 2D array of shape (y.size, x.size).
+        int max_size: The maximum number of points along every axis of the coarsest
+            level.
+    """
+    levels = [(x, y, z)]
+    while max(x.size, y.size) > max_size:
+        if x.size > max_size:
+            x, z = halve(x, z, axis=1)
+        if y.size > max_size:
+            y, z = halve(y, z, axis=0)
+        levels.append((x, y, z))
+    return levels
+
+
+def get_pyramid(x, y, z, max_size=PLOT_PIXELS):
+    """Same as `build_pyramid`, with the pyramids held in the cache."""
+    digest = hashlib.blake2b(digest_size=16)
+    for item in (x, y, z):
+        digest.update(np.ascontiguousarray(item).tobytes())
+    key = (digest.hexdigest(), z.shape, z.dtype.str, max_size)
+
+    levels = PYRAMID_CACHE.get(key)
+    if levels is None:
+        levels = build_pyramid(x, y, z, max_size)
+        PYRAMID_CACHE.set(key, levels)
+    return levels
+
+
+def window(coordinates, visible_range=None):
+    """Return the slice of the coordinates within the visible range, with one extra
+    point on either side. The slice covers all coordinates when the range is None or
+    holds no coordinates.
+
+    Args:
+        ndarray coordinates: The coordinates, in ascending or descending order.
+        list visible_range: The visible range, or None.
+    """
+    if visible_range is None or None in visible_range:
+        return slice(None)
+    low, high = min(visible_range), max(visible_range)
+    inside = np.where((coordinates >= low) & (coordinates <= high))[0]
+    if inside.size == 0:
+        return slice(None)
+    return slice(max(inside[0] - 1, 0), min(inside[-1] + 2, coordinates.size))
+
+
+def heatmap_window(x, y, z, x_range=None, y_range=None, max_size=PLOT_PIXELS):
+    """Return the x, y, and z of the visible window of the 2D array from the finest
+    pyramid level at which the window has at most `max_size` points along every axis.
+
+    Args:
+        ndarray x: The coordinates along the second axis of z.
+        ndarray y: The coordinates along the first axis of z.
+        ndarray z: The 2D array of shape (y.size, x.size).
+        list x_range: The visible range of x, or None for the full range.
+        list y_range: The visible range of y, or None for the full range.
+        int max_size: The maximum number of points along every axis.
+    """
+    for level_x, level_y, level_z in get_pyramid(x, y, z, max_size):
+        x_slice, y_slice = window(level_x, x_range), window(level_y, y_range)
+        if max(level_x[x_slice].size, level_y[y_slice].size) <= max_size:
+            break
+    # the coarsest level always fits.
+    return level_x[x_slice], level_y[y_slice], level_z[y_slice, x_slice]
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Latest-wins scheduler for the simulation callback. Every session runs at most one
+simulation at a time in a shared worker pool. A request arriving while the session is
+busy is queued, replacing any request already queued for the session, and the callbacks
+waiting on the replaced or the running request return at once with a Superseded error.
+The running request is interrupted at the next checkpoint, that is, before simulating
+the next method."""
+import os
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import LRUCache
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+
+class Superseded(Exception):
+    """Raised when a request is replaced by a newer request from the same session."""
+
+
+class SimulationScheduler:
+    """Run one request per session in a worker pool, newest request first.
+
+    Args:
+        max_workers: Number of worker threads shared by all sessions.
+        max_sessions: Maximum number of sessions tracked by the scheduler.
+    """
+
+    def __init__(self, max_workers=None, max_sessions=4096):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="simulation"
+        )
+        self._lock = threading.Lock()
+        self._tickets = LRUCache(maxsize=max_sessions)
+        # session -> future of the running request.
+        self._running = {}
+        # session -> (ticket, fn, args, future) of the queued request.
+        self._pending = {}
+
+    def run(self, session, fn, *args):
+        """Run `fn(*args, checkpoint=checkpoint)` for the session and return the result.
+        The `checkpoint` callable raises Superseded once a newer request is submitted
+        for the same session. Raise Superseded if the request is replaced.
+
+        Args:
+            str session: The session id.
+            fn: The function to run.
+            args: The positional arguments of the function.
+        """
+        return self.submit(session, fn, *args).result()
+
+    def submit(self, session, fn, *args):
+        """Submit a request for the session and return its Future."""
+        future = Future()
+        with self._lock:
+            ticket = self._tickets.get(session, 0) + 1
+            self._tickets.set(session, ticket)
+
+            if session not in self._running:
+                self._start(session, ticket, fn, args, future)
+                return future
+
+            # abandon the running request and coalesce the queued requests.
+            _supersede(self._running[session])
+            if session in self._pending:
+                _supersede(self._pending[session][-1])
+            self._pending[session] = (ticket, fn, args, future)
+        return future
+
+    def is_latest(self, session, ticket):
+        """Return True when `ticket` is the latest request for the session."""
+        return self._tickets.get(session) == ticket
+
+    def _start(self, session, ticket, fn, args, future):
+        self._running[session] = future
+        self._executor.submit(self._work, session, ticket, fn, args, future)
+
+    def _work(self, session, ticket, fn, args, future):
+        def checkpoint():
+            if not self.is_latest(session, ticket):
+                raise Superseded
+
+        try:
+            checkpoint()
+            result = fn(*args, checkpoint=checkpoint)
+            checkpoint()
+        except BaseException as e:
+            _set(future, exception=e)
+        else:
+            _set(future, result=result)
+
+        with self._lock:
+            del self._running[session]
+            if session in self._pending:
+                self._start(session, *self._pending.pop(session))
+
+
+def _supersede(future):
+    _set(future, exception=Superseded())
+
+
+def _set(future, result=None, exception=None):
+    """Resolve the future unless it is already resolved."""
+    if future.done():
+        return
+    try:
+        if exception is None:
+            future.set_result(result)
+        else:
+            future.set_exception(exception)
+    except Exception:  # resolved by another thread in the meantime.
+        pass
+
+
+simulation_scheduler = SimulationScheduler(
+    max_workers=int(os.environ.get("MRSIM_SIMULATION_WORKERS", os.cpu_count() or 1))
+)
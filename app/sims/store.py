@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""Server-side session store. The serialized simulator, holding the simulated and
+experimental spectra of every method, and the processed spectra are kept on the server.
+The browser only holds a handle, {"session": <id>, "version": <int>}, for each entry.
+The measurements in the mrsim data of the browser are replaced by a reference to the
+measurement in the store, see `detach_experiments`.
+
+The backend is selected with the MRSIM_SESSION_STORE environment variable,
+    - redis (default when REDIS_URL is set): Redis database at MRSIM_SESSION_REDIS_URL
+      (defaults to REDIS_URL). Shared between server processes; entries expire after
+      MRSIM_SESSION_EXPIRE seconds.
+    - memory (default otherwise): In-process LRU cache of at most MRSIM_SESSION_SIZE
+      entries and MRSIM_SESSION_MB megabytes. Requires a single server process.
+    - disk: Pickle files in the MRSIM_SESSION_DIR directory.
+
+The measurements, stored with `put_content`, are only referenced by the browser and
+cannot be recreated by the server. They are kept apart from the session entries, in a
+cache that is never evicted, and, with redis, never expire.
+"""
+import os
+import pickle
+import tempfile
+import threading
+import uuid
+
+import redis
+
+from .cache import content_hash
+from .cache import LRUCache
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+# Number of versions of an entry kept per session. The previous version is kept for the
+# callbacks still holding the previous handle.
+KEEP_VERSIONS = 2
+
+
+def pickled_size(value):
+    """Return the size of the pickled value in bytes."""
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class MemoryBackend:
+    """Hold the session data in the memory of the server process.
+
+    Args:
+        maxsize: Maximum number of entries held in memory. None for no limit, that is,
+            the entries are never evicted.
+        maxbytes: Optional maximum total size of the pickled entries in bytes.
+    """
+
+    def __init__(self, maxsize=256, maxbytes=None):
+        maxsize = float("inf") if maxsize is None else maxsize
+        self._cache = LRUCache(maxsize=maxsize, maxbytes=maxbytes, sizeof=pickled_size)
+        # version counters are kept apart so that they outlive the evicted entries.
+        self._counters = LRUCache(maxsize=16 * maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def delete(self, key):
+        self._cache.pop(key)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters.set(key, value)
+        return value
+
+
+class RedisBackend:
+    """Hold the session data as pickled objects in a redis database.
+
+    Args:
+        url: The redis url.
+        expire: Time in seconds after which an unused entry expires. None for entries
+            that never expire.
+    """
+
+    def __init__(self, url, expire=86400):
+        self._redis = redis.Redis.from_url(url)
+        self.expire = expire
+
+    def get(self, key):
+        value = self._redis.get(key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value):
+        self._redis.set(key, pickle.dumps(value), ex=self.expire)
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+    def incr(self, key):
+        value = self._redis.incr(key)
+        if self.expire is not None:
+            self._redis.expire(key, self.expire)
+        return value
+
+
+class DiskBackend:
+    """Hold the session data as pickle files in a directory.
+
+    Args:
+        path: Path to the directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _filename(self, key):
+        return os.path.join(self.path, f"{key.replace('/', '-')}.pkl")
+
+    def get(self, key):
+        try:
+            with open(self._filename(key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        filename = self._filename(key)
+        with open(f"{filename}.tmp", "wb") as f:
+            pickle.dump(value, f)
+        os.replace(f"{filename}.tmp", filename)
+
+    def delete(self, key):
+        try:
+            os.remove(self._filename(key))
+        except FileNotFoundError:
+            pass
+
+    def incr(self, key):
+        with self._lock:
+            value = (self.get(key) or 0) + 1
+            self.set(key, value)
+        return value
+
+
+class SessionStore:
+    """Versioned key-value store for the session data.
+
+    Args:
+        backend: A MemoryBackend, RedisBackend, or DiskBackend object.
+        content: The backend of the entries shared by the sessions, see `put_content`.
+            Its entries must not be evicted. The default is `backend`.
+    """
+
+    def __init__(self, backend, content=None):
+        self.backend = backend
+        self.content = backend if content is None else content
+
+    @staticmethod
+    def new_session():
+        """Return a new session id."""
+        return uuid.uuid4().hex
+
+    def put(self, session, name, data):
+        """Store a new version of the entry `name` and return its handle.
+
+        Args:
+            str session: The session id.
+            str name: Name of the entry, for example, "simulator".
+            data: The data to store.
+        """
+        version = self.backend.incr(f"{session}/{name}/version")
+        self.backend.set(f"{session}/{name}/{version}", data)
+        if version > KEEP_VERSIONS:
+            self.backend.delete(f"{session}/{name}/{version - KEEP_VERSIONS}")
+        return {"session": session, "version": version}
+
+    def get(self, handle, name):
+        """Return the data of the entry `name` referenced by the handle, or None when
+        the entry does not exist or has expired.
+
+        Args:
+            dict handle: The handle returned by the `put` method.
+            str name: Name of the entry.
+        """
+        if handle is None:
+            return None
+        return self.backend.get(f"{handle['session']}/{name}/{handle['version']}")
+
+    def save(self, session, name, data):
+        """Store the unversioned entry `name`, replacing the previous data.
+
+        Args:
+            str session: The session id.
+            str name: Name of the entry, for example, "fit-checkpoint".
+            data: The data to store.
+        """
+        self.backend.set(f"{session}/{name}", data)
+
+    def load(self, session, name):
+        """Return the data of the unversioned entry `name`, or None when the entry does
+        not exist or has expired.
+
+        Args:
+            str session: The session id.
+            str name: Name of the entry.
+        """
+        if session is None:
+            return None
+        return self.backend.get(f"{session}/{name}")
+
+    def discard(self, session, name):
+        """Remove the unversioned entry `name`."""
+        self.backend.delete(f"{session}/{name}")
+
+    def put_content(self, name, data):
+        """Store the data under its content hash and return the key. The entry is
+        shared by all sessions holding the same data.
+
+        Args:
+            str name: Name of the entry, for example, "experiment".
+            data: The JSON serializable data to store.
+        """
+        key = f"{name}/{content_hash(data)}"
+        self.content.set(key, data)
+        return key
+
+    def get_content(self, key):
+        """Return the data stored under the key returned by the `put_content` method, or
+        None when the entry does not exist."""
+        return self.content.get(key)
+
+
+def detach_experiments(mrsim_data):
+    """Move the experiment of every method of the mrsim data, in place, to the session
+    store and leave a reference in its place. The reference holds the application
+    metadata of the first dependent variable, where the browser edits the noise
+    standard deviation of the measurement, as
+    {"reference": <key>, "csdm": {"dependent_variables": [{"application": ...}]}}.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+    """
+    for mth in mrsim_data["methods"]:
+        experiment = mth.get("experiment", None)
+        if experiment is None or "reference" in experiment:
+            continue
+        dv = experiment["csdm"]["dependent_variables"][0]
+        mth["experiment"] = {
+            "reference": session_store.put_content("experiment", experiment),
+            "csdm": {
+                "dependent_variables": [{"application": dv.get("application") or {}}]
+            },
+        }
+    return mrsim_data
+
+
+def load_experiment(experiment):
+    """Return the serialized experiment of a reference from `detach_experiments`, with
+    the application metadata of the reference. Other experiments are returned as is.
+
+    Args:
+        dict experiment: The serialized experiment or a reference.
+    """
+    if "reference" not in experiment:
+        return experiment
+
+    data = session_store.get_content(experiment["reference"])
+    if data is None:
+        raise ValueError(
+            "The measurement has expired from the session store. Please attach the "
+            "measurement again."
+        )
+    # copy the path to the application, the stored data is shared.
+    dvs = [dict(dv) for dv in data["csdm"]["dependent_variables"]]
+    application = experiment["csdm"]["dependent_variables"][0].get("application")
+    dvs[0]["application"] = application or {}
+    return dict(data, csdm=dict(data["csdm"], dependent_variables=dvs))
+
+
+def attach_experiments(mrsim_data):
+    """Return a copy of the mrsim data with the references of `detach_experiments`
+    replaced by the stored experiments.
+
+    Args:
+        dict mrsim_data: The mrsim json data.
+    """
+    methods = [
+        mth
+        if mth.get("experiment", None) is None
+        else dict(mth, experiment=load_experiment(mth["experiment"]))
+        for mth in mrsim_data["methods"]
+    ]
+    return dict(mrsim_data, methods=methods)
+
+
+def store_from_environment():
+    """Return the session store with the backend selected by the environment
+    variables."""
+    default = "redis" if os.environ.get("REDIS_URL") else "memory"
+    backend = os.environ.get("MRSIM_SESSION_STORE", default)
+    expire = int(os.environ.get("MRSIM_SESSION_EXPIRE", 86400))
+
+    if backend == "redis":
+        url = os.environ.get("MRSIM_SESSION_REDIS_URL", os.environ.get("REDIS_URL"))
+        return SessionStore(
+            RedisBackend(url, expire=expire), content=RedisBackend(url, expire=None)
+        )
+
+    if backend == "disk":
+        default = os.path.join(tempfile.gettempdir(), "mrsim-sessions")
+        return SessionStore(DiskBackend(os.environ.get("MRSIM_SESSION_DIR", default)))
+
+    maxsize = int(os.environ.get("MRSIM_SESSION_SIZE", 256))
+    maxbytes = int(float(os.environ.get("MRSIM_SESSION_MB", 512)) * 2 ** 20)
+    return SessionStore(
+        MemoryBackend(maxsize=maxsize, maxbytes=maxbytes),
+        content=MemoryBackend(maxsize=None),
+    )
+
+
+session_store = store_from_environment()
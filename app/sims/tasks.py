@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import time
+
+from celery.contrib.abortable import AbortableTask
+
+from . import fitting
+from . import posterior
+from app import celery_app
+from app.utils import slogger
+
+__author__ = "Deepansh J. Srivastava"
+__email__ = "srivastava.89@osu.edu"
+
+# Functions that run as background jobs. Each function accepts a `progress` keyword
+# argument, a callable that returns True when the job is cancelled.
+JOBS = {
+    "fit": fitting.least_squares_fit,
+    "multi-start": fitting.multi_start_fit,
+    "resume": fitting.resume_fit,
+    "posterior": posterior.sample_posterior,
+}
+
+# Minimum time in seconds between two progress updates written to the result backend.
+PROGRESS_INTERVAL = 0.5
+
+
+@celery_app.task(bind=True, base=AbortableTask)
+def run_job(self, name, *args, session=None):
+    """Run the job `name` on a celery worker. The state of the task is PROGRESS, with
+    the progress info as meta data, while the job runs. The best parameters so far are
+    checkpointed to the session store when the session id is given. Return a dict with
+    the final state of the job, SUCCESS or CANCELLED, and the result."""
+    slogger("run_job", f"job {name} in progress, task_id={self.request.id}")
+    last_update = [0.0]
+
+    def progress(info):
+        if self.is_aborted():
+            return True
+        now = time.time()
+        if now - last_update[0] > PROGRESS_INTERVAL:
+            self.update_state(state="PROGRESS", meta=info)
+            last_update[0] = now
+        return False
+
+    try:
+        with fitting.fit_checkpoint(session, progress) as progress:
+            result = JOBS[name](*args, progress=progress)
+        return {"state": "SUCCESS", "result": result}
+    except fitting.Cancelled:
+        slogger("run_job", f"job {name} cancelled, task_id={self.request.id}")
+        return {"state": "CANCELLED", "result": None}
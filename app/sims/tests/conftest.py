@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+import os
+
+# The celery app is declared on import of the job modules, and the tests run the jobs
+# in the local thread pool, with the in-process session store.
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("MRSIM_SESSION_STORE", "memory")
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import csv
+import json
+import os
+
+from mrsimulator import Simulator
+from mrsimulator import Site
+from mrsimulator import SpinSystem
+from mrsimulator.methods import BlochDecaySpectrum
+
+from ..batch import fit_sample
+from ..batch import load_model
+from ..batch import measurement_files
+from ..batch import write_summary
+
+
+def write_model(path):
+    method = BlochDecaySpectrum(
+        channels=["29Si"],
+        spectral_dimensions=[{"count": 256, "spectral_width": 10000}],
+    )
+    site = Site(isotope="29Si", isotropic_chemical_shift=-80)
+    sim = Simulator(spin_systems=[SpinSystem(sites=[site])], methods=[method])
+    with open(path, "w") as f:
+        json.dump(sim.json(include_methods=True), f)
+
+
+def test_measurement_files(tmp_path):
+    for name in ["b.csdf", "a.csdfe", "notes.txt", "c.mrsim"]:
+        (tmp_path / name).write_text("")
+
+    files = measurement_files(str(tmp_path))
+    assert files == [str(tmp_path / "a.csdfe"), str(tmp_path / "b.csdf")]
+
+
+def test_load_model_adds_fit_parameters(tmp_path):
+    path = str(tmp_path / "model.mrsim")
+    write_model(path)
+
+    mrsim_data = load_model(path)
+    assert mrsim_data["config"]["number_of_sidebands"] == 64
+    assert len(mrsim_data["signal_processors"]) == 1
+    assert "sys_0_site_0_isotropic_chemical_shift" in mrsim_data["params"]
+
+
+def test_fit_sample_failure(tmp_path):
+    path = str(tmp_path / "model.mrsim")
+    write_model(path)
+    mrsim_data = load_model(path)
+
+    missing = str(tmp_path / "missing.csdf")
+    row = fit_sample(mrsim_data, missing, str(tmp_path))
+    assert row["sample"] == "missing"
+    assert row["status"] == "failed"
+    assert row["error"] != ""
+
+    # a failed fit writes no results.
+    assert not os.path.exists(tmp_path / "missing.html")
+    assert not os.path.exists(tmp_path / "missing.mrsim")
+
+
+def test_write_summary(tmp_path):
+    rows = [
+        {"sample": "a", "status": "success", "error": "", "shift": 1.5},
+        {"sample": "b", "status": "failed", "error": "no data"},
+    ]
+    path = str(tmp_path / "summary.csv")
+    write_summary(rows, path)
+
+    with open(path, newline="") as f:
+        read = list(csv.DictReader(f))
+    assert list(read[0]) == ["sample", "status", "error", "shift"]
+    assert read[0]["shift"] == "1.5"
+    assert read[1]["error"] == "no data"
+    assert read[1]["shift"] == ""
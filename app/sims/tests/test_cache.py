@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from ..cache import content_hash
+from ..cache import LRUCache
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is the least recently used item
+    cache.set("c", 3)
+    assert "b" not in cache, "least recently used item not evicted"
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_get_default():
+    cache = LRUCache(maxsize=2)
+    assert cache.get("missing") is None
+    assert cache.get("missing", 0) == 0
+    cache.set("a", 1)
+    assert cache.pop("a") == 1
+    assert "a" not in cache
+
+
+def test_content_hash():
+    sys_1 = {"sites": [{"isotope": "29Si", "isotropic_chemical_shift": "-90.0 ppm"}]}
+    sys_2 = {"sites": [{"isotropic_chemical_shift": "-90.0 ppm", "isotope": "29Si"}]}
+    assert content_hash(sys_1) == content_hash(sys_2), "hash depends on key order"
+
+    sys_2["sites"][0]["isotropic_chemical_shift"] = "-91.0 ppm"
+    assert content_hash(sys_1) != content_hash(sys_2)
+    assert content_hash(sys_1, {}) != content_hash(sys_1)
+
+
+def test_lru_cache_maxbytes():
+    cache = LRUCache(maxsize=8, maxbytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    assert cache.nbytes == 8
+
+    # "a" is evicted to stay within the budget of 10 bytes.
+    cache.set("c", "xxxx")
+    assert "a" not in cache
+    assert cache.nbytes == 8
+
+    # a replaced item frees its size.
+    cache.set("c", "x")
+    assert cache.nbytes == 5
+    assert cache.pop("b") == "xxxx"
+    assert cache.nbytes == 1
+
+    # an item larger than the budget is not held, and does not evict other items.
+    cache.set("d", "x" * 11)
+    assert "d" not in cache
+    assert cache.get("c") == "x"
+    assert cache.nbytes == 1
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import csdmpy as cp
+import numpy as np
+
+from ..encoding import csdm_dict
+
+
+def setup_csdm(components):
+    dims = [
+        cp.LinearDimension(count=count, increment="1 Hz")
+        for count in components.shape[::-1]
+    ]
+    dv = cp.DependentVariable(
+        type="internal", components=components, quantity_type="scalar"
+    )
+    return cp.CSDM(dimensions=dims, dependent_variables=[dv])
+
+
+def test_compact_encoding():
+    components = np.random.rand(3, 4)
+
+    for encoding in ["float32", "float64"]:
+        data = csdm_dict(setup_csdm(components), encoding)
+        dv = data["csdm"]["dependent_variables"][0]
+        assert dv["encoding"] == "base64"
+        assert dv["numeric_type"] == encoding
+
+        decoded = cp.parse_dict(data).y[0].components[0]
+        assert decoded.dtype == encoding
+        np.testing.assert_allclose(decoded, components, rtol=1e-6)
+
+
+def test_complex_components_are_not_encoded():
+    data = csdm_dict(setup_csdm(np.arange(4.0) + 1j), "float32")
+    assert data["csdm"]["dependent_variables"][0]["numeric_type"] == "complex128"
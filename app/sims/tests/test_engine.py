@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+import os
+
+import csdmpy as cp
+import numpy as np
+from mrsimulator import Simulator
+from mrsimulator import Site
+from mrsimulator import SpinSystem
+from mrsimulator.methods import BlochDecaySpectrum
+
+from .. import engine
+from ..cache import LRUCache
+
+
+def setup_sim(n_sys=4):
+    systems = [
+        SpinSystem(
+            sites=[
+                Site(
+                    isotope="13C",
+                    isotropic_chemical_shift=10 * i,
+                    shielding_symmetric={"zeta": 20 + i, "eta": 0.5},
+                )
+            ],
+            abundance=100 / n_sys,
+        )
+        for i in range(n_sys)
+    ]
+    methods = [
+        BlochDecaySpectrum(
+            channels=["13C"],
+            rotor_frequency=rotor_frequency,
+            spectral_dimensions=[{"count": 256, "spectral_width": 20000}],
+        )
+        for rotor_frequency in [0, 5000]
+    ]
+    return Simulator(spin_systems=systems, methods=methods)
+
+
+def reference(sim, decompose):
+    sim = sim.copy(deep=True)
+    sim.config.decompose_spectrum = "spin_system" if decompose else "none"
+    sim.run()
+    return [mth.simulation for mth in sim.methods]
+
+
+def assert_simulation_equal(sim, expected):
+    for mth, ref in zip(sim.methods, expected):
+        assert len(mth.simulation.y) == len(ref.y)
+        for y, y_ref in zip(mth.simulation.y, ref.y):
+            np.testing.assert_allclose(
+                y.components,
+                y_ref.components,
+                atol=1e-10 * np.abs(y_ref.components).max(),
+            )
+
+
+def clear_caches(monkeypatch):
+    for name in ["SPECTRUM_CACHE", "SIMULATION_CACHE", "PATHWAY_CACHE"]:
+        monkeypatch.setattr(engine, name, LRUCache())
+
+
+class CountingCache(LRUCache):
+    """LRUCache counting the cache hits and misses."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hits = self.misses = 0
+
+    def get(self, key, default=None):
+        value = super().get(key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+
+def test_run_equals_simulator_run(monkeypatch):
+    for decompose in [True, False]:
+        clear_caches(monkeypatch)
+        sim = setup_sim()
+        mrsim_data = sim.json(include_methods=True)
+        expected = reference(sim, decompose)
+
+        engine.run(sim, mrsim_data, decompose=decompose)
+        assert_simulation_equal(sim, expected)
+
+        # a run after an edit of one spin system reuses the other spectra.
+        sim.spin_systems[1].sites[0].isotropic_chemical_shift = -40
+        mrsim_data = sim.json(include_methods=True)
+        expected = reference(sim, decompose)
+        engine.run(sim, mrsim_data, decompose=decompose)
+        assert_simulation_equal(sim, expected)
+
+
+def test_shards(monkeypatch):
+    items = list(range(10))
+    monkeypatch.setattr(engine, "N_JOBS", 3)
+    assert engine.shards(items) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert engine.shards([]) == []
+
+    monkeypatch.setattr(engine, "SHARD_SIZE", 3)
+    shards = engine.shards(items)
+    assert [len(shard) for shard in shards] == [3, 3, 3, 1]
+    assert sum(shards, []) == items
+
+
+def test_reduce_sum_and_stack():
+    spectra = [cp.as_csdm(np.arange(8.0) * i) for i in range(1, 4)]
+
+    summed = engine.reduce_sum(spectra)
+    assert len(summed.y) == 1
+    assert np.allclose(summed.y[0].components[0], np.arange(8.0) * 6)
+    # the inputs are not modified.
+    assert np.allclose(spectra[0].y[0].components[0], np.arange(8.0))
+
+    stacked = engine.stack(spectra)
+    assert len(stacked.y) == 3
+    assert np.allclose(stacked.y[2].components[0], np.arange(8.0) * 3)
+
+
+def test_transition_pathway_cache_key(monkeypatch):
+    clear_caches(monkeypatch)
+
+    def system(isotopes, shift=0):
+        sites = [
+            Site(isotope=item, isotropic_chemical_shift=shift) for item in isotopes
+        ]
+        return SpinSystem(sites=sites)
+
+    method_c = BlochDecaySpectrum(channels=["13C"])
+    method_h = BlochDecaySpectrum(channels=["1H"])
+
+    engine.transition_pathways(system(["1H", "13C"]), method_c)
+    # the pathways only depend on the isotopes of the sites.
+    engine.transition_pathways(system(["1H", "13C"], shift=10), method_c)
+    assert len(engine.PATHWAY_CACHE) == 1
+
+    # a different order of isotopes, or a different channel, is another entry.
+    sys_b = system(["13C", "1H"])
+    pathways = engine.transition_pathways(sys_b, method_c)
+    assert len(engine.PATHWAY_CACHE) == 2
+    assert np.array_equal(
+        np.asarray(pathways), np.asarray(method_c.get_transition_pathways(sys_b))
+    )
+
+    engine.transition_pathways(system(["1H", "13C"]), method_h)
+    assert len(engine.PATHWAY_CACHE) == 3
+
+
+def test_run_summed_groups(monkeypatch):
+    clear_caches(monkeypatch)
+    monkeypatch.setattr(engine, "DECOMPOSE_LIMIT", 2)
+    calls = []
+
+    def simulate(spin_systems, *args):
+        calls.append(len(spin_systems))
+        return engine_simulate(spin_systems, *args)
+
+    engine_simulate = engine.simulate
+    monkeypatch.setattr(engine, "simulate", simulate)
+
+    sim = setup_sim(n_sys=5)
+    sim.methods = sim.methods[:1]
+    engine.run(sim, sim.json(include_methods=True), decompose=False)
+    assert_simulation_equal(sim, reference(sim, decompose=False))
+    assert calls == [2, 2, 1]
+
+    # only the group of the modified spin system is simulated again.
+    sim.spin_systems[3].sites[0].isotropic_chemical_shift = -40
+    engine.run(sim, sim.json(include_methods=True), decompose=False)
+    assert_simulation_equal(sim, reference(sim, decompose=False))
+    assert calls == [2, 2, 1, 2]
+
+
+def crash_once(marker, value):
+    """Kill the worker process on the first call, then return the value."""
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return value
+
+
+def test_map_jobs_broken_pool(monkeypatch, tmp_path):
+    monkeypatch.setattr(engine, "N_JOBS", 2)
+    monkeypatch.setattr(engine, "_EXECUTOR", None)
+    broken = engine.executor()
+
+    marker = str(tmp_path / "marker")
+    args = [(marker, i) for i in range(4)]
+    assert engine.map_jobs(crash_once, args) == [0, 1, 2, 3]
+    assert engine._EXECUTOR is not broken
+    engine._EXECUTOR.shutdown()
+
+
+def test_job_pool(monkeypatch):
+    monkeypatch.setattr(engine, "N_JOBS", 2)
+    pool = engine.job_pool(engine.init_worker)
+    assert pool is not None
+
+    # only one job pool at a time, the other jobs run serially.
+    assert engine.job_pool(engine.init_worker) is None
+    assert list(pool.map(abs, [-1, -2])) == [1, 2]
+    engine.release_job_pool(pool)
+
+    pool = engine.job_pool(engine.init_worker)
+    assert pool is not None
+    engine.release_job_pool(pool)
+    engine.release_job_pool(None)
+
+    monkeypatch.setattr(engine, "N_JOBS", 1)
+    assert engine.job_pool(engine.init_worker) is None
+
+
+def test_triggered_methods():
+    assert engine.triggered_methods(None, 3) == [0, 1, 2]
+    assert engine.triggered_methods({"simulation": True}, 3) == [0, 1, 2]
+    assert engine.triggered_methods({"method_index": False}, 3) == [0, 1, 2]
+    assert engine.triggered_methods({"method_index": []}, 3) == []
+    assert engine.triggered_methods({"method_index": [0, 2]}, 3) == [0, 2]
+    assert engine.triggered_methods({"method_index": [-1]}, 3) == [2]
+
+
+def test_run_only_triggered_methods(monkeypatch):
+    clear_caches(monkeypatch)
+    spectra, simulations = CountingCache(), CountingCache()
+    monkeypatch.setattr(engine, "SPECTRUM_CACHE", spectra)
+    monkeypatch.setattr(engine, "SIMULATION_CACHE", simulations)
+
+    calls = []
+
+    def simulate(spin_systems, method, *args):
+        calls.append((len(spin_systems), method.rotor_frequency))
+        return engine_simulate(spin_systems, method, *args)
+
+    engine_simulate = engine.simulate
+    monkeypatch.setattr(engine, "simulate", simulate)
+
+    sim = setup_sim()
+    engine.run(sim, sim.json(include_methods=True))
+    assert calls == [(4, 0), (4, 5000)]
+    assert (spectra.hits, spectra.misses) == (0, 8)
+    assert (simulations.hits, simulations.misses) == (0, 0)
+
+    # a signal processor update touches no method and skips the simulation.
+    mrsim_data = sim.json(include_methods=True)
+    mrsim_data["trigger"] = {"simulation": True, "method_index": []}
+    engine.run(sim, mrsim_data)
+    assert_simulation_equal(sim, reference(sim, decompose=True))
+    assert len(calls) == 2
+    assert (spectra.hits, spectra.misses) == (0, 8)
+    assert (simulations.hits, simulations.misses) == (2, 0)
+
+    # only the triggered method is simulated, the other is restored from the cache.
+    sim.methods[1].spectral_dimensions[0].spectral_width = 25000
+    mrsim_data = sim.json(include_methods=True)
+    mrsim_data["trigger"] = {"simulation": True, "method_index": [1]}
+    engine.run(sim, mrsim_data)
+    assert_simulation_equal(sim, reference(sim, decompose=True))
+    assert calls[slice(2, None)] == [(4, 5000)]
+    assert (spectra.hits, spectra.misses) == (0, 12)
+    assert (simulations.hits, simulations.misses) == (3, 0)
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from lmfit import Parameter
+from lmfit import Parameters
+from mrsimulator import signal_processing as sp
+from mrsimulator import Simulator
+from mrsimulator import Site
+from mrsimulator import SpinSystem
+from mrsimulator.methods import BlochDecaySpectrum
+from mrsimulator.utils.spectral_fitting import LMFIT_min_function
+from mrsimulator.utils.spectral_fitting import make_LMFIT_params
+
+from .. import engine
+from .. import fitting
+from ..fitting import Cancelled
+from ..fitting import coarse_config
+from ..fitting import fit_checkpoint
+from ..fitting import FitError
+from ..fitting import Monitor
+from ..fitting import ParallelJacobian
+from ..fitting import Residual
+from ..fitting import sample_starts
+from ..fitting import step_size
+from ..fitting import touched_objects
+from ..store import MemoryBackend
+from ..store import SessionStore
+
+
+def setup_fit(n_sys=3):
+    systems = [
+        SpinSystem(
+            sites=[Site(isotope="29Si", isotropic_chemical_shift=-80 - 5 * i)],
+            abundance=100 / n_sys,
+        )
+        for i in range(n_sys)
+    ]
+    method = BlochDecaySpectrum(
+        channels=["29Si"],
+        spectral_dimensions=[
+            {"count": 512, "spectral_width": 10000, "reference_offset": -9000}
+        ],
+    )
+    sim = Simulator(spin_systems=systems, methods=[method])
+    processor = sp.SignalProcessor(
+        operations=[sp.IFFT(), sp.apodization.Gaussian(FWHM="100 Hz"), sp.FFT()]
+    )
+    sim.run()
+
+    rng = np.random.default_rng(0)
+    experiment = processor.apply_operations(data=method.simulation).real
+    experiment.y[0].components[0] += rng.normal(0, 1e-3, 512)
+    sim.methods[0].experiment = experiment
+    sim.methods[0].simulation = None
+
+    params = make_LMFIT_params(sim, [processor])
+    params["sys_0_site_0_isotropic_chemical_shift"].value = -78
+    return sim, [processor], params
+
+
+def fit_args(sim, processors, decompose=False):
+    return (
+        sim.copy(deep=True),
+        [p.copy(deep=True) for p in processors],
+        [1.0],
+        decompose,
+    )
+
+
+def test_residual_equals_lmfit_min_function():
+    sim, processors, params = setup_fit()
+    expected = LMFIT_min_function(
+        params, sim.copy(deep=True), [p.copy(deep=True) for p in processors]
+    )
+
+    for decompose in [True, False]:
+        resid = Residual()(params, *fit_args(sim, processors, decompose))
+        np.testing.assert_allclose(resid, expected, atol=1e-8 * np.abs(expected).max())
+
+
+def test_residual_only_simulates_changed_spin_systems(monkeypatch):
+    calls = []
+
+    def simulate(spin_systems, *args):
+        calls.append(len(spin_systems))
+        return engine_simulate(spin_systems, *args)
+
+    engine_simulate = engine.simulate
+    monkeypatch.setattr(engine, "simulate", simulate)
+
+    sim, processors, params = setup_fit()
+    args = fit_args(sim, processors, decompose=True)
+    residual = Residual()
+
+    first = residual(params, *args)
+    assert calls == [1, 1, 1]
+
+    # signal processor parameters only re-process the previous spectra.
+    params["SP_0_operation_1_Gaussian_FWHM"].value *= 2
+    second = residual(params, *args)
+    assert calls == [1, 1, 1]
+    assert not np.allclose(first, second)
+
+    params["sys_1_site_0_isotropic_chemical_shift"].value = -90
+    residual(params, *args)
+    assert calls == [1, 1, 1, 1]
+
+
+def test_touched_objects():
+    names = [
+        "sys_0_site_0_isotropic_chemical_shift",
+        "sys_12_abundance",
+        "mth_3_rotor_frequency",
+        "SP_0_operation_1_Gaussian_FWHM",
+    ]
+    assert touched_objects(names, n_methods=2) == ({0, 12}, {1})
+    assert touched_objects(names[-1:], n_methods=2) == (set(), set())
+    assert touched_objects(["other"], n_methods=2) == (None, None)
+
+
+def test_step_size():
+    assert step_size(Parameter("a", value=2.0)) > 0
+    assert step_size(Parameter("a", value=0.0)) > 0
+    assert step_size(Parameter("a", value=1.0, max=1.0)) < 0
+
+
+def test_parallel_jacobian_equals_serial(monkeypatch):
+    monkeypatch.setattr(engine, "N_JOBS", 2)
+    sim, processors, params = setup_fit()
+    args = fit_args(sim, processors)
+
+    with ParallelJacobian(params, fit_args(sim, processors)) as jacobian:
+        jac = jacobian(params)
+
+    residual = Residual()
+    base = residual(params, *args)
+    varying = [name for name, par in params.items() if par.vary]
+    for column, name in zip(jac.T, varying):
+        step = step_size(params[name])
+        shifted = params.copy()
+        shifted[name].value += step
+        shifted.update_constraints()
+        expected = (residual(shifted, *args) - base) / step
+        np.testing.assert_allclose(column, expected, atol=1e-8 * np.abs(base).max())
+
+
+def test_sample_starts():
+    params = Parameters()
+    params.add("a", value=1, min=0, max=2)
+    params.add("b", value=5)
+    params.add("c", value=3, min=0, max=10, vary=False)
+
+    starts = sample_starts(params, 4, seed=0)
+    assert len(starts) == 4
+    assert starts[0] == {"a": 1, "b": 5}
+    assert all(0 <= start["a"] <= 2 and start["b"] == 5 for start in starts)
+
+    # every start is the same without a bounded varying parameter.
+    params["a"].vary = False
+    assert sample_starts(params, 1) == [{"b": 5}]
+    with pytest.raises(FitError, match="finite bounds"):
+        sample_starts(params, 4)
+
+
+def test_fit_checkpoint(monkeypatch):
+    store = SessionStore(MemoryBackend())
+    monkeypatch.setattr(fitting, "session_store", store)
+    monkeypatch.setattr(fitting, "CHECKPOINT_INTERVAL", 3600)
+
+    def info(chisqr):
+        return {"stage": "fine", "best_chisqr": chisqr, "best_params": {"a": chisqr}}
+
+    with fit_checkpoint("session") as checkpoint:
+        checkpoint(info(10))
+        assert store.load("session", "fit-checkpoint")["best_chisqr"] == 10
+    # the checkpoint is removed when the fit completes.
+    assert store.load("session", "fit-checkpoint") is None
+
+    # the newer best within the interval is saved when the fit is cancelled.
+    with pytest.raises(Cancelled):
+        with fit_checkpoint("session") as checkpoint:
+            checkpoint(info(10))
+            checkpoint(info(5))
+            assert store.load("session", "fit-checkpoint")["best_chisqr"] == 10
+            raise Cancelled
+    assert store.load("session", "fit-checkpoint")["best_chisqr"] == 5
+
+
+def spy_minimize(monkeypatch):
+    """Record the stage, the simulator config, and the starting and best fit values of
+    every minimization."""
+    calls = []
+
+    def minimize(params, args, monitor, **kwargs):
+        config = args[0].config
+        start = params.valuesdict()
+        result = fitting_minimize(params, args, monitor, **kwargs)
+        calls.append(
+            {
+                "stage": monitor.stage,
+                "density": config.integration_density,
+                "sidebands": config.number_of_sidebands,
+                "kwargs": kwargs,
+                "start": start,
+                "best": result.params.valuesdict(),
+            }
+        )
+        return result
+
+    fitting_minimize = fitting.minimize
+    monkeypatch.setattr(fitting, "minimize", minimize)
+    return calls
+
+
+def test_coarse_config():
+    config = Simulator().config
+    config.integration_density, config.number_of_sidebands = 70, 64
+    with coarse_config(config):
+        assert config.integration_density == 17
+        assert config.number_of_sidebands == 32
+    assert config.integration_density == 70
+    assert config.number_of_sidebands == 64
+
+    # the settings are never raised, and are restored when the fit fails.
+    config.integration_density, config.number_of_sidebands = 10, 4
+    with pytest.raises(Cancelled):
+        with coarse_config(config):
+            assert config.integration_density == 8
+            assert config.number_of_sidebands == 4
+            raise Cancelled
+    assert config.integration_density == 10
+
+
+def test_least_squares_fit_coarse_to_fine(monkeypatch):
+    sim, processors, params = setup_fit()
+    monkeypatch.setattr(
+        fitting, "residual_args", lambda data: fit_args(sim, processors)
+    )
+    calls = spy_minimize(monkeypatch)
+    stages = []
+
+    def progress(info):
+        stages.append(info["stage"])
+
+    fit_data = fitting.least_squares_fit({}, params.dumps(), progress, "coarse-to-fine")
+    coarse, fine = calls
+    assert coarse["stage"] == "coarse"
+    assert (coarse["density"], coarse["sidebands"]) == (17, 32)
+    assert coarse["kwargs"] == {"xtol": 1e-4, "ftol": 1e-4}
+
+    # the fine stage starts from the coarse result at the session settings.
+    assert fine["stage"] == "fine"
+    assert (fine["density"], fine["sidebands"]) == (70, 64)
+    assert fine["start"] == coarse["best"]
+    assert stages == sorted(stages), "progress stages out of order"
+    assert set(stages) == {"coarse", "fine"}
+
+    best = Parameters().loads(fit_data["params"])
+    shift = best["sys_0_site_0_isotropic_chemical_shift"].value
+    assert shift == pytest.approx(-80, abs=0.1)
+
+
+def test_resume_fit(monkeypatch):
+    store = SessionStore(MemoryBackend())
+    monkeypatch.setattr(fitting, "session_store", store)
+    sim, processors, params = setup_fit()
+    monkeypatch.setattr(
+        fitting, "residual_args", lambda data: fit_args(sim, processors)
+    )
+    calls = spy_minimize(monkeypatch)
+    name = "sys_0_site_0_isotropic_chemical_shift"
+
+    for stage, stages in [("coarse", ["coarse", "fine"]), ("fine", ["fine"])]:
+        # interrupt the fit after a few evaluations of the stage.
+        def cancel(info):
+            return info["stage"] == stage and info["iteration"] >= 3
+
+        with pytest.raises(Cancelled):
+            with fit_checkpoint("session", cancel) as progress:
+                fitting.least_squares_fit(
+                    {}, params.dumps(), progress, "coarse-to-fine"
+                )
+        checkpoint = store.load("session", "fit-checkpoint")
+        assert checkpoint["stage"] == stage
+
+        n_calls = len(calls)
+        fit_data = fitting.resume_fit({}, params.dumps(), checkpoint)
+        resumed = calls[slice(n_calls, None)]
+
+        # the fit resumes in the interrupted stage from the best parameters.
+        assert [call["stage"] for call in resumed] == stages
+        assert resumed[0]["start"][name] == checkpoint["best_params"][name]
+        best = Parameters().loads(fit_data["params"])[name].value
+        assert best == pytest.approx(-80, abs=0.1)
+
+
+def test_monitor_telemetry(monkeypatch):
+    monkeypatch.setattr(fitting, "TELEMETRY_SIZE", 3)
+    infos = []
+    monitor = Monitor(infos.append, stage="coarse")
+    assert monitor.telemetry()["iteration"] == []
+    assert monitor.telemetry()["values"] == []
+
+    monitor.residual = SimpleNamespace(timing=(0.5, 0.25))
+    for i in range(1, 6):
+        assert not monitor.update({"a": float(i), "b": 2.0}, i, 10.0 - i)
+
+    # only the latest evaluations are held.
+    telemetry = monitor.telemetry()
+    assert telemetry["stage"] == "coarse"
+    assert telemetry["names"] == ["a", "b"]
+    assert telemetry["iteration"] == [3, 4, 5]
+    assert telemetry["chisqr"] == [7.0, 6.0, 5.0]
+    assert telemetry["values"] == [[3.0, 2.0], [4.0, 2.0], [5.0, 2.0]]
+    assert telemetry["simulation"] == [0.5] * 3
+    assert telemetry["processing"] == [0.25] * 3
+    assert all(total >= 0 for total in telemetry["total"])
+    assert telemetry["elapsed"] == sorted(telemetry["elapsed"])
+
+    # the progress info holds the telemetry at the time of the evaluation.
+    info = infos[-1]
+    assert info["stage"] == "coarse"
+    assert info["best_chisqr"] == 5.0
+    assert info["best_params"] == {"a": 5.0, "b": 2.0}
+    assert info["telemetry"] == telemetry
+    assert len(infos[0]["telemetry"]["iteration"]) == 1
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import csdmpy as cp
+import numpy as np
+
+from ..graph import decimate
+from ..graph import partial_traces
+from ..graph import plot_1D_trace
+from ..graph import plot_2D_trace
+from ..graph import visible
+
+
+def test_decimate_keeps_extrema():
+    x = np.linspace(100, -100, 65536)
+    y = np.sin(x)
+    y[12345], y[40000] = 50, -50
+
+    x_dec, y_dec = decimate(x, y, n_points=2000)
+    assert y_dec.size <= 2002
+    assert y_dec.max() == 50 and y_dec.min() == -50, "extrema not kept"
+    assert x_dec[0] == x[0] and x_dec[-1] == x[-1], "end points not kept"
+    assert np.all(np.diff(x_dec) < 0), "points out of order"
+
+
+def test_decimate_short_trace():
+    x, y = np.arange(10.0), np.arange(10.0)
+    x_dec, y_dec = decimate(x, y, n_points=2000)
+    assert np.array_equal(x_dec, x) and np.array_equal(y_dec, y)
+
+
+def test_visible():
+    x = np.arange(100.0, 0, -1)
+    y = x * 2
+
+    x_vis, y_vis = visible(x, y, [40, 60.5])
+    assert x_vis[0] == 61 and x_vis[-1] == 39
+    assert np.array_equal(y_vis, 2 * x_vis)
+
+    x_vis, _ = visible(x, y, None)
+    assert x_vis.size == 100
+
+    # nothing visible
+    x_vis, _ = visible(x, y, [200, 300])
+    assert x_vis.size == 100
+
+
+def test_partial_traces():
+    x = np.arange(10.0)
+    traces = [
+        dict(type="scatter", x=x, y=x * 2, name="experiment", meta={"group": "a"}),
+        dict(type="scatter", x=x, y=x * 3, name="simulation", meta={"group": "b"}),
+    ]
+    full = partial_traces(traces)
+    tokens = [trace["meta"]["token"] for trace in full]
+    assert len(set(tokens)) == 2 and full[0]["y"] is traces[0]["y"]
+
+    # the traces held by the browser are sent as stubs with only the meta.
+    traces[1]["y"] = x * 4
+    partial = partial_traces(traces, tokens)
+    assert partial[0] == {"meta": {"group": "a", "token": tokens[0]}}
+    assert partial[1]["meta"]["token"] != tokens[1]
+    assert partial[1]["y"] is traces[1]["y"]
+
+
+def spectrum(counts, components, names):
+    dims = [cp.LinearDimension(count=n, increment="100 Hz") for n in counts]
+    dvs = [
+        {
+            "type": "internal",
+            "quantity_type": "scalar",
+            "components": [item.ravel()],
+            "name": name,
+        }
+        for item, name in zip(components, names)
+    ]
+    return cp.CSDM(dimensions=dims, dependent_variables=dvs)
+
+
+def test_plot_1D_trace_meta():
+    a, b = np.arange(64.0), np.full(64, 2.0)
+    traces = plot_1D_trace(spectrum([64], [a], [""]), name="experiment")
+    assert len(traces) == 1
+    assert traces[0]["meta"] == {"group": "experiment", "maximum": 63.0}
+
+    # one trace per spin system, followed by the trace of their sum.
+    data = spectrum([64], [a, b], ["sys 0", "sys 1"])
+    traces = plot_1D_trace(data, decompose=True, name="simulation")
+    assert [trace["name"] for trace in traces] == ["sys 0", "sys 1", "simulation"]
+    assert traces[0]["meta"] == {"group": "component", "maximum": 63.0}
+    assert traces[1]["meta"] == {"group": "component", "maximum": 63.0}
+    assert traces[2]["meta"] == {"group": "simulation", "maximum": 65.0}
+    assert np.allclose(traces[2]["y"], a + b)
+
+
+def test_plot_2D_trace_meta():
+    a = np.arange(48.0).reshape(6, 8)
+    b = np.ones((6, 8))
+    traces = plot_2D_trace(spectrum([8, 6], [a], [""]), name="experiment")
+    assert len(traces) == 1
+    assert traces[0]["type"] == "heatmap"
+    assert traces[0]["meta"] == {"group": "experiment", "maximum": 47.0}
+
+    # one contour per spin system, followed by the heatmap of their sum.
+    data = spectrum([8, 6], [a, b], ["sys 0", "sys 1"])
+    traces = plot_2D_trace(data, decompose=True, name="simulation")
+    assert len(traces) == 3
+    assert [trace.name for trace in traces[:2]] == ["sys 0", "sys 1"]
+    assert traces[0].meta == {"group": "component", "maximum": 47.0}
+    assert traces[2]["meta"] == {"group": "simulation", "maximum": 48.0}
+    assert np.allclose(traces[2]["z"], a + b)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from dash import no_update
+
+from .. import store as store_module
+from ..features import fit_job
+from ..fitting import Cancelled
+from ..jobs import JobManager
+from ..store import MemoryBackend
+from ..store import SessionStore
+from ..tasks import JOBS
+
+FINAL_STATES = ["SUCCESS", "FAILURE", "CANCELLED"]
+
+
+def double(value, progress=None):
+    progress({"iteration": 1})
+    return {"methods": [], "value": 2 * value}
+
+
+def fail(progress=None):
+    raise ValueError("bad data")
+
+
+class Blocking:
+    """Job that waits for `proceed` before its first progress update."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.proceed = threading.Event()
+
+    def __call__(self, progress=None):
+        self.started.set()
+        self.proceed.wait(timeout=5)
+        while not progress({"iteration": 1}):
+            time.sleep(0.01)
+        raise Cancelled
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setitem(JOBS, "double", double)
+    monkeypatch.setitem(JOBS, "fail", fail)
+    monkeypatch.setattr(
+        store_module, "session_store", SessionStore(MemoryBackend(maxsize=16))
+    )
+    manager = JobManager(backend="local", max_workers=1)
+    monkeypatch.setattr(fit_job, "job_manager", manager)
+    return manager
+
+
+def wait(manager, handle, timeout=5):
+    end = time.time() + timeout
+    status = manager.status(handle)
+    while status["state"] not in FINAL_STATES and time.time() < end:
+        time.sleep(0.01)
+        status = manager.status(handle)
+    return status
+
+
+def poll(monkeypatch, handle):
+    monkeypatch.setattr(
+        fit_job, "ctx", SimpleNamespace(states={"fit-job.data": handle})
+    )
+    job, _, _, progress, result, alert, _, _ = fit_job.poll_fit()
+    return job, progress, result, alert
+
+
+def test_job_success(manager, monkeypatch):
+    handle = manager.submit("double", 2)
+    assert handle["backend"] == "local"
+    status = wait(manager, handle)
+    assert status["state"] == "SUCCESS"
+    assert status["progress"] == {"iteration": 1}
+    assert status["result"]["value"] == 4
+
+    job, progress, result, alert = poll(monkeypatch, handle)
+    assert job is None
+    assert progress == "Fit complete."
+    assert result["value"] == 4
+    assert alert == ""
+
+    # the finished job is released after the first query.
+    assert manager.status(handle)["state"] == "RELEASED"
+    job, progress, result, _ = poll(monkeypatch, handle)
+    assert job is None
+    assert progress is no_update
+    assert result is no_update
+
+
+def test_job_failure(manager, monkeypatch):
+    handle = manager.submit("fail")
+    status = wait(manager, handle)
+    assert status["state"] == "FAILURE"
+    assert status["error"] == "bad data"
+
+    job, _, result, alert = poll(monkeypatch, handle)
+    assert job is None
+    assert result is no_update
+    assert alert == "FitError: bad data"
+    assert manager.status(handle)["state"] == "RELEASED"
+
+
+def test_job_cancellation(manager, monkeypatch):
+    blocking = Blocking()
+    monkeypatch.setitem(JOBS, "blocking", blocking)
+    handle = manager.submit("blocking")
+    assert blocking.started.wait(timeout=5)
+
+    # the job keeps running until its next progress update.
+    manager.cancel(handle)
+    assert manager.status(handle)["state"] == "CANCELLING"
+    job, progress, _, _ = poll(monkeypatch, handle)
+    assert job == handle
+    assert progress == "Cancelling..."
+
+    blocking.proceed.set()
+    assert wait(manager, handle)["state"] == "CANCELLED"
+    job, progress, _, _ = poll(monkeypatch, handle)
+    assert job is None
+    assert progress.startswith("Fit cancelled.")
+    assert manager.status(handle)["state"] == "RELEASED"
+
+
+def test_pending_job_cancellation(manager, monkeypatch):
+    blocking = Blocking()
+    monkeypatch.setitem(JOBS, "blocking", blocking)
+    running = manager.submit("blocking")
+    assert blocking.started.wait(timeout=5)
+    pending = manager.submit("double", 1)
+    manager.cancel(pending)
+    assert manager.status(pending)["state"] == "CANCELLING"
+
+    # the cancelled job stops before it starts.
+    manager.cancel(running)
+    blocking.proceed.set()
+    status = wait(manager, pending)
+    assert status["state"] == "CANCELLED"
+    assert status["progress"] is None
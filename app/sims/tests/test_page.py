@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import csdmpy as cp
+import numpy as np
+
+from .. import page
+from ..cache import LRUCache
+from ..encoding import csdm_dict
+from ..page import decode_spectra
+from ..page import decoded_spectra
+from ..page import to_ppm
+
+
+def spectrum(values):
+    dim = cp.LinearDimension(
+        count=values.size,
+        increment="100 Hz",
+        coordinates_offset="-3200 Hz",
+        origin_offset="100 MHz",
+    )
+    return cp.CSDM(
+        dimensions=[dim], dependent_variables=[cp.as_dependent_variable(values)]
+    )
+
+
+def test_to_ppm():
+    data = to_ppm(spectrum(np.arange(64.0)))
+    coordinates = data.x[0].coordinates
+    assert str(coordinates.unit) == "ppm"
+    assert np.allclose(coordinates.value[[0, -1]], [-32, 31])
+
+    # only the dimensionless axes are converted.
+    data = to_ppm(spectrum(np.arange(64.0)), [False])
+    assert str(data.x[0].coordinates.unit) == "Hz"
+
+
+def test_decode_spectra():
+    experiment, simulation = np.arange(64.0), np.ones(64)
+    mth = {
+        "experiment": csdm_dict(spectrum(experiment)),
+        "simulation": csdm_dict(spectrum(simulation)),
+    }
+
+    spectra = decode_spectra(mth)
+    assert str(spectra["experiment"].x[0].coordinates.unit) == "ppm"
+    assert str(spectra["simulation"].x[0].coordinates.unit) == "ppm"
+    residual = spectra["residual"].y[0].components[0]
+    assert np.allclose(residual, experiment - simulation)
+    assert spectra["processed"] is not None
+
+    # the missing spectra are None.
+    spectra = decode_spectra({"simulation": mth["simulation"], "experiment": None})
+    assert spectra["experiment"] is None and spectra["residual"] is None
+    assert spectra["simulation"] is not None
+    assert decode_spectra({"simulation": None, "experiment": None}) == dict.fromkeys(
+        ["experiment", "simulation", "residual", "processed"]
+    )
+
+
+def test_decoded_spectra_cache(monkeypatch):
+    monkeypatch.setattr(page, "SPECTRA_CACHE", LRUCache())
+    calls = []
+
+    def decode(mth):
+        calls.append(mth)
+        return {"simulation": len(calls)}
+
+    monkeypatch.setattr(page, "decode_spectra", decode)
+    mth = {"simulation": None}
+    handle = {"session": "a", "version": 1}
+
+    # a re-plot of the same version of the method parses no JSON.
+    assert decoded_spectra(handle, 0, mth) == {"simulation": 1}
+    assert decoded_spectra(handle, 0, mth) == {"simulation": 1}
+    assert len(calls) == 1
+
+    # a new version, another method, or another session is decoded.
+    decoded_spectra({"session": "a", "version": 2}, 0, mth)
+    decoded_spectra(handle, 1, mth)
+    decoded_spectra({"session": "b", "version": 1}, 0, mth)
+    assert len(calls) == 4
+    assert decoded_spectra(handle, 1, mth) == {"simulation": 3}
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import csdmpy as cp
+import numpy as np
+from mrsimulator.methods import BlochDecaySpectrum
+
+from .. import parsing
+from ..cache import content_hash
+from ..cache import LRUCache
+from ..engine import method_key
+
+
+def test_parse_method_without_experiment_in_cache(monkeypatch):
+    monkeypatch.setattr(parsing, "PARSE_CACHE", LRUCache())
+    method = BlochDecaySpectrum(
+        channels=["13C"], spectral_dimensions=[{"count": 64, "spectral_width": 1000}]
+    )
+    py_dict = method.json()
+
+    for i in range(1, 4):
+        experiment = cp.as_csdm(np.arange(64.0) * i)
+        py_dict["experiment"] = experiment.to_dict()
+        parsed = parsing.parse_method(py_dict)
+        assert np.allclose(parsed.experiment.y[0].components[0], np.arange(64.0) * i)
+
+    # the methods only differ by the experiment and share one cache entry.
+    assert len(parsing.PARSE_CACHE) == 1
+    cached = parsing.PARSE_CACHE.get(content_hash("Method", method_key(py_dict)))
+    assert cached.experiment is None
+
+    py_dict.pop("experiment")
+    assert parsing.parse_method(py_dict).experiment is None
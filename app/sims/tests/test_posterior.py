@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from lmfit import Parameters
+
+from .. import posterior
+from ..posterior import initial_positions
+from ..posterior import LogProbability
+from ..posterior import posterior_html
+from ..posterior import posterior_summary
+from ..posterior import reflect
+
+
+def log_probability(resid, fit_noise):
+    params = Parameters()
+    params.add("a", value=1, min=0, max=2)
+    log_prob = LogProbability(["a"], params, fit_noise=fit_noise)
+    log_prob.context = (params, (), lambda params: resid)
+    return log_prob
+
+
+def test_log_probability():
+    resid = np.array([3.0, 4.0])
+    log_prob = log_probability(resid, fit_noise=False)
+    assert log_prob(np.array([1.0])) == pytest.approx(-12.5)
+    assert log_prob(np.array([3.0])) == -np.inf
+
+
+def test_log_probability_noise_scale():
+    resid = np.array([3.0, 4.0])
+    log_prob = log_probability(resid, fit_noise=True)
+    assert log_prob(np.array([1.0, 0.0])) == pytest.approx(-12.5)
+
+    ln_scale = np.log(2)
+    expected = -0.5 * 25 / 4 - 2 * ln_scale
+    assert log_prob(np.array([1.0, ln_scale])) == pytest.approx(expected)
+
+    # the most probable scale is the root mean square of the residual.
+    ln_scales = np.linspace(-1, 3, 4001)
+    values = [log_prob(np.array([1.0, item])) for item in ln_scales]
+    rms = np.sqrt(np.mean(np.square(resid)))
+    assert np.exp(ln_scales[np.argmax(values)]) == pytest.approx(rms, rel=1e-3)
+
+
+def test_reflect():
+    values = np.array([[-0.5, 5.0, -3.0], [2.5, -1.0, 13.0], [4.5, 0.0, 5.0]])
+    lower = np.array([0.0, -np.inf, 0.0])
+    upper = np.array([2.0, np.inf, np.inf])
+    expected = [[0.5, 5.0, 3.0], [1.5, -1.0, 13.0], [0.5, 0.0, 5.0]]
+    assert np.allclose(reflect(values, lower, upper), expected)
+
+
+def test_initial_positions_within_bounds():
+    params = Parameters()
+    params.add("a", value=1.0, min=0.99, max=2)
+    params.add("b", value=-5.0, max=0)
+    params["a"].stderr = 0.5
+    start = initial_positions(params, ["a", "b"], np.random.default_rng(0))
+
+    assert start.shape == (16, 2)
+    assert np.all(start[:, 0] >= 0.99) and np.all(start[:, 0] <= 2)
+    assert np.all(start[:, 1] <= 0)
+    # the walkers outside the bounds are not piled up on the bounds.
+    assert len(np.unique(start[:, 0])) == 16
+
+
+def test_posterior_html_corner_plot_limit(monkeypatch):
+    names = ["a", "b", "c"]
+    chain = np.random.default_rng(0).normal(size=(200, 3))
+    summary = posterior_summary(chain, names)
+
+    html = posterior_html(chain, names, summary, 0.3)
+    assert "<td>c</td>" in html
+    assert "<img" in html
+
+    monkeypatch.setattr(posterior, "CORNER_MAX_PARAMETERS", 2)
+    html = posterior_html(chain, names, summary, 0.3)
+    assert "<td>c</td>" in html
+    assert "<img" not in html
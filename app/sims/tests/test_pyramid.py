@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from ..pyramid import build_pyramid
+from ..pyramid import get_pyramid
+from ..pyramid import heatmap_window
+from ..pyramid import PYRAMID_CACHE
+
+
+def setup_data(nx=1000, ny=300):
+    x = np.linspace(100, -100, nx)
+    y = np.linspace(-50, 50, ny)
+    z = np.random.rand(ny, nx)
+    return x, y, z
+
+
+def test_build_pyramid():
+    x, y, z = setup_data()
+    levels = build_pyramid(x, y, z, max_size=256)
+
+    # only the axes longer than max_size are halved.
+    assert [level[2].shape for level in levels] == [(300, 1000), (150, 500), (150, 250)]
+    for level_x, level_y, level_z in levels:
+        assert level_z.shape == (level_y.size, level_x.size)
+
+    # averaging preserves the mean and the end points of the coordinates
+    assert np.allclose(levels[1][2].mean(), z.mean())
+    assert np.allclose(levels[1][0][[0, -1]], [99.9, -99.9], atol=0.1)
+
+
+def test_build_pyramid_odd_size():
+    x, y, z = setup_data(nx=9, ny=3)
+    levels = build_pyramid(x, y, z, max_size=4)
+    assert levels[1][2].shape == (3, 5)
+    assert np.allclose(levels[1][2][:, -1], z[:, -1])
+
+
+def test_get_pyramid_cache():
+    x, y, z = setup_data()
+    assert get_pyramid(x, y, z, 256) is get_pyramid(x, y, z.copy(), 256)
+    assert len(PYRAMID_CACHE) > 0
+
+
+def test_heatmap_window():
+    x, y, z = setup_data()
+
+    # full view from the coarse level
+    x_, y_, z_ = heatmap_window(x, y, z, max_size=256)
+    assert z_.shape == (150, 250)
+
+    # zoomed view at full resolution
+    x_, y_, z_ = heatmap_window(x, y, z, [10, -10], [-5, 5], max_size=256)
+    assert z_.shape == (y_.size, x_.size)
+    assert max(z_.shape) <= 256
+    i, j = np.where(y == y_[0])[0][0], np.where(x == x_[0])[0][0]
+    ny, nx = z_.shape
+    assert np.array_equal(z_, z[i:, j:][:ny, :nx])
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from ..scheduler import SimulationScheduler
+from ..scheduler import Superseded
+
+
+def test_latest_request_wins():
+    scheduler = SimulationScheduler(max_workers=2)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow(value, checkpoint=None):
+        started.set()
+        release.wait(5)
+        checkpoint()
+        calls.append(value)
+        return value
+
+    def fast(value, checkpoint=None):
+        calls.append(value)
+        return value
+
+    running = scheduler.submit("session", slow, 0)
+    started.wait(5)
+    queued = [scheduler.submit("session", fast, i) for i in range(1, 4)]
+    other = scheduler.submit("other", fast, "other")
+
+    # other sessions are not blocked by the busy session.
+    assert other.result(5) == "other"
+
+    release.set()
+    assert queued[-1].result(5) == 3
+    for future in [running, *queued[:-1]]:
+        with pytest.raises(Superseded):
+            future.result(5)
+
+    # the running request is interrupted and the queued requests are coalesced.
+    assert calls == ["other", 3]
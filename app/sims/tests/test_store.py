@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import csdmpy as cp
+import numpy as np
+import pytest
+
+from .. import store as store_module
+from ..encoding import csdm_dict
+from ..store import attach_experiments
+from ..store import detach_experiments
+from ..store import DiskBackend
+from ..store import KEEP_VERSIONS
+from ..store import MemoryBackend
+from ..store import pickled_size
+from ..store import SessionStore
+from ..store import store_from_environment
+
+
+def check_session_store(store):
+    session = store.new_session()
+    handle_1 = store.put(session, "simulator", {"methods": [1]})
+    handle_2 = store.put(session, "simulator", {"methods": [2]})
+
+    assert handle_1["session"] == session
+    assert handle_2["version"] == handle_1["version"] + 1
+    assert store.get(handle_1, "simulator") == {"methods": [1]}
+    assert store.get(handle_2, "simulator") == {"methods": [2]}
+    assert store.get(None, "simulator") is None
+
+    # entries are versioned per name
+    assert store.put(session, "processed", {})["version"] == 1
+
+    # only the latest versions are kept
+    for _ in range(KEEP_VERSIONS):
+        store.put(session, "simulator", {})
+    assert store.get(handle_1, "simulator") is None, "old version not removed"
+
+    # unversioned entries
+    assert store.load(session, "fit-checkpoint") is None
+    store.save(session, "fit-checkpoint", {"iteration": 1})
+    store.save(session, "fit-checkpoint", {"iteration": 2})
+    assert store.load(session, "fit-checkpoint") == {"iteration": 2}
+    assert store.load(None, "fit-checkpoint") is None
+    store.discard(session, "fit-checkpoint")
+    assert store.load(session, "fit-checkpoint") is None
+
+    # entries shared by the sessions
+    key = store.put_content("experiment", {"csdm": [1]})
+    assert store.put_content("experiment", {"csdm": [1]}) == key
+    assert store.get_content(key) == {"csdm": [1]}
+
+
+def test_memory_session_store():
+    check_session_store(SessionStore(MemoryBackend(maxsize=16)))
+
+
+def test_disk_session_store(tmp_path):
+    check_session_store(SessionStore(DiskBackend(str(tmp_path))))
+
+
+def test_memory_backend_maxbytes():
+    entry = {"spectrum": list(range(100))}
+    backend = MemoryBackend(maxsize=16, maxbytes=3 * pickled_size(entry))
+    for i in range(4):
+        backend.set(f"key-{i}", entry)
+
+    assert backend.get("key-0") is None, "least recently used entry not evicted"
+    assert all(backend.get(f"key-{i}") == entry for i in range(1, 4))
+
+
+def test_content_not_evicted_under_load():
+    store = SessionStore(MemoryBackend(maxsize=8), content=MemoryBackend(maxsize=None))
+    keys = [store.put_content("experiment", {"csdm": [i]}) for i in range(4)]
+
+    def work():
+        session = store.new_session()
+        for i in range(50):
+            store.put(session, "simulator", {"methods": [i]})
+            store.save(session, "fit-checkpoint", {"iteration": i})
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # the session entries are evicted, the measurements are kept.
+    assert len(store.backend._cache) <= 8
+    for i, key in enumerate(keys):
+        assert store.get_content(key) == {"csdm": [i]}
+
+
+def test_store_from_environment(monkeypatch, tmp_path):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.delenv("MRSIM_SESSION_STORE", raising=False)
+    monkeypatch.setenv("MRSIM_SESSION_MB", "1")
+    store = store_from_environment()
+    assert isinstance(store.backend, MemoryBackend)
+    assert store.backend._cache.maxbytes == 2 ** 20
+    assert store.content is not store.backend
+
+    monkeypatch.setenv("MRSIM_SESSION_STORE", "disk")
+    monkeypatch.setenv("MRSIM_SESSION_DIR", str(tmp_path))
+    store = store_from_environment()
+    assert isinstance(store.backend, DiskBackend)
+    assert store.content is store.backend
+
+
+def test_detach_experiments(monkeypatch):
+    monkeypatch.setattr(
+        store_module, "session_store", SessionStore(MemoryBackend(maxsize=16))
+    )
+    experiment = csdm_dict(cp.as_csdm(np.arange(64.0)))
+    mrsim_data = {"methods": [{"experiment": experiment}, {"experiment": None}]}
+
+    detach_experiments(mrsim_data)
+    reference = mrsim_data["methods"][0]["experiment"]
+    assert "reference" in reference
+    assert mrsim_data["methods"][1]["experiment"] is None
+
+    # the browser edits the noise standard deviation in the reference.
+    application = {"com.github.DeepanshS.mrsimulator": {"sigma": 2}}
+    reference["csdm"]["dependent_variables"][0]["application"] = application
+
+    restored = attach_experiments(mrsim_data)
+    assert mrsim_data["methods"][0]["experiment"] is reference
+    parsed = cp.parse_dict(restored["methods"][0]["experiment"])
+    assert np.allclose(parsed.y[0].components[0], np.arange(64.0))
+    assert parsed.y[0].application == application
+
+    # a detached experiment is kept as is.
+    assert detach_experiments(mrsim_data)["methods"][0]["experiment"] is reference
+
+    store_module.session_store.backend.delete(reference["reference"])
+    with pytest.raises(ValueError, match="expired"):
+        attach_experiments(mrsim_data)
@@ -9,7 +9,7 @@ from dash.dependencies import State
 from app import app
 from app.inv import mrinv
 from app.root import root_app
-from app.sims import mrsimulator_app
+from app.sims.page import mrsimulator_app
 
 __author__ = "Deepansh J. Srivastava"
 __email__ = "srivastava.89@osu.edu"